@@ -1,20 +1,30 @@
+import asyncio
 import json
 import logging
 import os
 import re
+import time
 import urllib.request
 from html.parser import HTMLParser
 
+import boto3
 from bedrock_agentcore import BedrockAgentCoreApp
+from botocore.config import Config
 from strands import Agent, tool
 from strands.models import BedrockModel
 from strands_tools import current_time
 
+from bedrock_governor import MAX_ATTEMPTS, BedrockGovernor, backoff_seconds, is_throttle
+from model_router import ModelRouter, is_retryable
+from tracing import emit_span, new_trace_id, set_trace_id, span
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 TAVILY_API_KEY = os.environ.get("TAVILY_API_KEY", "")
-MODEL_ID = "us.anthropic.claude-sonnet-4-6"
+# Scraper と共有する Bedrock の予算を置くテーブル（未設定なら予算の制御はしない）
+DYNAMODB_TABLE = os.environ.get("DYNAMODB_TABLE", "")
+CHAT_ESTIMATED_TOKENS = 8000  # /ask 1回分の見積もり（ツール呼び出しを含む。実績で補正する）
 
 # 現在処理中のセッションID（ツールからセッション操作するために使用）
 _current_session_id: str | None = None
@@ -117,7 +127,7 @@ def web_search(query: str) -> str:
         method="POST",
     )
 
-    with urllib.request.urlopen(req, timeout=30) as resp:
+    with span("tool.web_search"), urllib.request.urlopen(req, timeout=30) as resp:
         result = json.loads(resp.read().decode("utf-8"))
 
     parts = []
@@ -178,12 +188,14 @@ def fetch_race_info(url: str) -> str:
                 "Accept-Language": "ja,en;q=0.9",
             },
         )
-        with urllib.request.urlopen(req, timeout=15) as resp:
-            html = resp.read().decode("utf-8")
+        with span("tool.fetch_race_info", host=parsed.hostname) as attrs:
+            with urllib.request.urlopen(req, timeout=15) as resp:
+                html = resp.read().decode("utf-8")
+            attrs["bytes"] = len(html)
 
-        extractor = _HTMLTextExtractor()
-        extractor.feed(html)
-        text = extractor.get_text()
+            extractor = _HTMLTextExtractor()
+            extractor.feed(html)
+            text = extractor.get_text()
 
         # LLM コンテキストを圧迫しないよう上限を設ける
         if len(text) > 8000:
@@ -252,6 +264,31 @@ app = BedrockAgentCoreApp()
 # コンテナのアイドルタイムアウト（15分）で自動的にセッションが破棄される
 _agent_sessions: dict[str, Agent] = {}
 
+# コンテナ起動後の最初の呼び出しかどうか（コールドスタートの判定に使う）
+_is_cold = True
+
+# 軽い問い合わせは速いモデル、レース分析はフルモデル（model_router.py）
+_router = ModelRouter()
+_models: dict[str, BedrockModel] = {}
+
+# /ask は chat レーン（予想より先に予算の上限に当たる）。bedrock_governor.py
+_governor = BedrockGovernor(boto3.resource("dynamodb").Table(DYNAMODB_TABLE) if DYNAMODB_TABLE else None)
+
+
+def _get_model(model_id: str) -> BedrockModel:
+    """モデルIDごとの BedrockModel（セッション間で共有）"""
+    if model_id not in _models:
+        # SYSTEM_PROMPT とツール定義はセッションをまたいで変わらないので、キャッシュポイントを置いて
+        # 2ターン目以降（他セッションも5分以内なら）はキャッシュから読ませる
+        # スロットリングは botocore では呼び直さない（invoke_agent が governor に記録し、予算を取り直して呼び直す）
+        _models[model_id] = BedrockModel(
+            model_id=model_id,
+            cache_prompt="default",
+            cache_tools="default",
+            boto_client_config=Config(retries={"mode": "standard", "max_attempts": 1}),
+        )
+    return _models[model_id]
+
 
 def _get_or_create_agent(session_id: str | None) -> Agent:
     """セッションIDに対応するAgentを取得または作成"""
@@ -259,7 +296,7 @@ def _get_or_create_agent(session_id: str | None) -> Agent:
         return _agent_sessions[session_id]
 
     agent = Agent(
-        model=BedrockModel(model_id=MODEL_ID),
+        model=_get_model(_router.full_model_id),
         system_prompt=SYSTEM_PROMPT,
         tools=[current_time, web_search, fetch_race_info, clear_memory],
     )
@@ -270,17 +307,127 @@ def _get_or_create_agent(session_id: str | None) -> Agent:
     return agent
 
 
+def _usage_snapshot(agent: Agent) -> dict:
+    """エージェントの累積トークン使用量（Converse の usage と同じキー）のコピー"""
+    usage = getattr(getattr(agent, "event_loop_metrics", None), "accumulated_usage", None) or {}
+    return dict(usage)
+
+
+def _usage_delta(before: dict, after: dict) -> dict:
+    """呼び出し1回分のトークン使用量（キャッシュ読み出し・書き込みを含む）"""
+    keys = {
+        "inputTokens": "input_tokens",
+        "outputTokens": "output_tokens",
+        "cacheReadInputTokens": "cache_read_tokens",
+        "cacheWriteInputTokens": "cache_write_tokens",
+    }
+    return {name: after.get(key, 0) - before.get(key, 0) for key, name in keys.items()}
+
+
+def _attempt_tokens(before: dict, agent: Agent) -> int:
+    """1回の呼び出しで予算に計上するトークン数（入力 + キャッシュ書き込み + 出力）"""
+    usage = _usage_delta(before, _usage_snapshot(agent))
+    return usage["input_tokens"] + usage["cache_write_tokens"] + usage["output_tokens"]
+
+
+def _is_text_delta(event) -> bool:
+    """Bedrock Converse Stream 形式のテキストチャンクかどうか"""
+    if not isinstance(event, dict):
+        return False
+    inner = event.get("event")
+    if not isinstance(inner, dict):
+        return False
+    delta = inner.get("contentBlockDelta", {}).get("delta", {})
+    return bool(delta.get("text"))
+
+
 @app.entrypoint
 async def invoke_agent(payload, context):
-    global _current_session_id
+    global _current_session_id, _is_cold
     prompt = payload.get("prompt", "")
     session_id = payload.get("session_id")
     _current_session_id = session_id
 
+    # webhook から引き継いだ trace_id でエージェント側の span を紐付ける
+    set_trace_id(payload.get("trace_id") or new_trace_id())
+    cold = _is_cold
+    _is_cold = False
+
+    start = time.perf_counter()
+    first_token_seen = False
+
     agent = _get_or_create_agent(session_id)
+    usage_before = _usage_snapshot(agent)
+    model_id, request_class = _router.choose(prompt)
+    fallback = False
 
-    async for event in agent.stream_async(prompt):
-        yield event
+    try:
+        # まだテキストを返していなければやり直す: スロットリングは同じモデルでジッター付きの間隔を空け、
+        # chat レーンの予算を取り直して MAX_ATTEMPTS 回まで呼ぶ。それでも失敗するか、その他の一時的なエラーなら
+        # もう一方のモデルで同じようにやり直す
+        throttle_attempt = 0
+        while True:
+            agent.model = _get_model(model_id)
+            history_length = len(agent.messages)
+            call_start = time.perf_counter()
+            attempt_usage = _usage_snapshot(agent)
+            permit = None
+            try:
+                permit = await asyncio.to_thread(_governor.acquire, model_id, "chat", CHAT_ESTIMATED_TOKENS)
+                emit_span("bedrock_governor", permit.wait_ms, model=model_id, **permit.metrics())
+                async for event in agent.stream_async(prompt):
+                    if not first_token_seen and _is_text_delta(event):
+                        first_token_seen = True
+                        emit_span(
+                            "agent_first_token", (time.perf_counter() - start) * 1000, cold=cold, model=model_id
+                        )
+                    yield event
+                _router.record(model_id, (time.perf_counter() - call_start) * 1000, ok=True)
+                await asyncio.to_thread(_governor.settle, permit, _attempt_tokens(attempt_usage, agent))
+                break
+            except Exception as e:
+                _router.record(model_id, (time.perf_counter() - call_start) * 1000, ok=False)
+                if permit is not None:
+                    # 失敗した呼び出しの予約も実際に使った分（多くは 0）に精算する
+                    await asyncio.to_thread(_governor.settle, permit, _attempt_tokens(attempt_usage, agent))
+                    if is_throttle(e):
+                        await asyncio.to_thread(_governor.record_throttle, permit)
+                if first_token_seen or not is_retryable(e):
+                    raise
+                # 失敗したターンの履歴を取り消してからやり直す
+                del agent.messages[history_length:]
+                if is_throttle(e) and throttle_attempt < MAX_ATTEMPTS - 1:
+                    delay = backoff_seconds(throttle_attempt)
+                    throttle_attempt += 1
+                    logger.warning(f"Model {model_id} throttled (attempt {throttle_attempt}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                if fallback:
+                    raise
+                next_model_id = _router.fallback_for(model_id)
+                logger.warning(f"Model {model_id} failed ({type(e).__name__}), falling back to {next_model_id}")
+                emit_span(
+                    "model_fallback",
+                    (time.perf_counter() - call_start) * 1000,
+                    from_model=model_id,
+                    to_model=next_model_id,
+                    error=type(e).__name__,
+                )
+                model_id = next_model_id
+                fallback = True
+                throttle_attempt = 0
+    finally:
+        usage = _usage_delta(usage_before, _usage_snapshot(agent))
+        emit_span(
+            "agent_total",
+            (time.perf_counter() - start) * 1000,
+            cold=cold,
+            model=model_id,
+            request_class=request_class,
+            fallback=fallback,
+            **usage,
+            **_router.summary(model_id),
+        )
 
 
 if __name__ == "__main__":
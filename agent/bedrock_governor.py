@@ -0,0 +1,248 @@
+"""
+Bedrock 呼び出しの流量制御（リクエスト数・トークン数の分単位の予算とジッター付きリトライ）
+
+Scraper の予想と Agent の /ask は同じアカウント・同じモデルのクォータを取り合う。複数レース・複数チャンネルが
+重なると ThrottlingException になるので、呼び出しの前に DynamoDB の「1分ごとの使用量」アイテムへ
+条件付きで加算し、予算に空きがある場合だけ呼ぶ。空きがなければ少し待ってからやり直す。
+
+レーン（優先度）ごとに使ってよい予算の割合を変えて、締切が近い予想がチャットより先に枠を取れるようにする:
+  urgent  予定より遅れている予想  予算の 100% まで
+  race    予定どおりの予想     予算の 80% まで
+  chat    /ask               予算の 50% まで
+
+記録アイテム（PK は "bedrock"、SK は budget#{モデルID}#{yyyymmddHHMM}、expires_at で TTL 削除）:
+  requests   その分に開始した呼び出し数
+  tokens     見積もりトークン数（呼び出し後に実績との差を加算して補正）
+  throttles  その分に受けた ThrottlingException の数
+
+table を渡さない場合は予算の制御をせず、リトライだけ行う。
+このファイルは lambda/ と agent/ で同じ内容を置く。
+"""
+
+import logging
+import math
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+BEDROCK_RPM_LIMIT = int(os.environ.get("BEDROCK_RPM_LIMIT", "50"))
+BEDROCK_TPM_LIMIT = int(os.environ.get("BEDROCK_TPM_LIMIT", "200000"))
+
+GOVERNOR_PK = "bedrock"
+BUDGET_PREFIX = "budget#"
+WINDOW_TTL_SECONDS = 3600
+
+LANE_SHARES = {"urgent": 1.0, "race": 0.8, "chat": 0.5}
+LANE_MAX_WAIT_SECONDS = {"urgent": 30, "race": 90, "chat": 20}
+URGENT_LEAD_FRACTION = 0.5  # 計画した先行時間の半分を切ってから Bedrock を呼ぶ予想は urgent レーン
+URGENT_WITHIN_SECONDS = 120  # 先行時間が分からない予想の urgent の基準（先行時間の下限 3 分より短く）
+
+CHARS_PER_TOKEN = 2  # 日本語混じりのプロンプトのおおよその文字数/トークン
+POLL_SECONDS = 5  # 予算に空きがないときの再確認間隔（上限）
+MAX_ATTEMPTS = 3  # スロットリング時の呼び出し回数（初回を含む）
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 8.0
+
+# リトライする価値のあるスロットリング系のエラー（例外クラス名・ClientError のコード）
+THROTTLE_ERRORS = {"ThrottlingException", "ModelThrottledException", "TooManyRequestsException"}
+
+
+class BedrockBusyError(Exception):
+    """待ち時間の上限までに予算の空きがなかった"""
+
+
+class Permit:
+    """1回の呼び出しに割り当てた予算（メトリクス用に待ち時間・リトライ回数・その分の使用量を持つ）"""
+
+    def __init__(self, model_id: str, lane: str, window: str, tokens: int):
+        self.model_id = model_id
+        self.lane = lane
+        self.window = window
+        self.tokens = tokens
+        self.wait_ms = 0.0
+        self.retries = 0
+        self.window_requests = 0
+        self.window_tokens = 0
+
+    def metrics(self) -> dict:
+        """メトリクス・span に付ける値"""
+        return {
+            "lane": self.lane,
+            "wait_ms": round(self.wait_ms, 1),
+            "retries": self.retries,
+            "window_requests": self.window_requests,
+            "window_tokens": self.window_tokens,
+        }
+
+
+def estimate_tokens(text: str, max_tokens: int) -> int:
+    """入力の文字数と出力の上限から、1回の呼び出しで使うトークン数を見積もる"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) + max_tokens
+
+
+def lane_for_deadline(seconds_to_deadline: float | None, lead_seconds: float | None = None) -> str:
+    """予想のレーンを締切までの残り時間で決める（締切が不明なら race）
+
+    pre_race は処理時間の実測から決めた先行時間（lead_seconds）で発火するので、残り時間が常に短い。
+    絶対値で比べるとほとんどが urgent になるため、先行時間が分かるときはその割合で比べ、
+    予定より遅れている（取得や予算待ちで先行時間の半分以上を使った）ものだけを urgent にする。
+    """
+    if seconds_to_deadline is None:
+        return "race"
+    threshold = lead_seconds * URGENT_LEAD_FRACTION if lead_seconds else URGENT_WITHIN_SECONDS
+    return "urgent" if seconds_to_deadline <= threshold else "race"
+
+
+def is_throttle(error: BaseException) -> bool:
+    """スロットリング系のエラーか（原因の例外もたどる）"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        response = getattr(error, "response", None)
+        code = response.get("Error", {}).get("Code", "") if isinstance(response, dict) else ""
+        if type(error).__name__ in THROTTLE_ERRORS or code in THROTTLE_ERRORS:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def _is_condition_failure(error: Exception) -> bool:
+    response = getattr(error, "response", None)
+    code = response.get("Error", {}).get("Code", "") if isinstance(response, dict) else ""
+    return code == "ConditionalCheckFailedException" or type(error).__name__ == "ConditionalCheckFailedException"
+
+
+def backoff_seconds(attempt: int) -> float:
+    """フルジッター付きの指数バックオフ（attempt は 0 始まり）"""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2**attempt))
+
+
+class BedrockGovernor:
+    """分単位の予算で Bedrock 呼び出しを絞る（table を共有するすべての Lambda・コンテナで共通の予算）"""
+
+    def __init__(self, table=None, rpm_limit: int = BEDROCK_RPM_LIMIT, tpm_limit: int = BEDROCK_TPM_LIMIT):
+        self.table = table
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+
+    @staticmethod
+    def _window(now: float) -> str:
+        return datetime.fromtimestamp(now, timezone.utc).strftime("%Y%m%d%H%M")
+
+    def _key(self, model_id: str, window: str) -> dict:
+        return {"racer_no": GOVERNOR_PK, "date_type": f"{BUDGET_PREFIX}{model_id}#{window}"}
+
+    def _try_reserve(self, permit: Permit, now: float) -> bool:
+        """その分の使用量に条件付きで加算する（予算を超えるなら False）"""
+        share = LANE_SHARES.get(permit.lane, LANE_SHARES["chat"])
+        try:
+            response = self.table.update_item(
+                Key=self._key(permit.model_id, permit.window),
+                UpdateExpression="ADD requests :one, tokens :tokens SET expires_at = :expires",
+                ConditionExpression="attribute_not_exists(requests) OR (requests < :max_requests AND tokens <= :max_tokens)",
+                ExpressionAttributeValues={
+                    ":one": 1,
+                    ":tokens": permit.tokens,
+                    ":expires": int(now) + WINDOW_TTL_SECONDS,
+                    ":max_requests": max(1, math.floor(self.rpm_limit * share)),
+                    ":max_tokens": math.floor(self.tpm_limit * share) - permit.tokens,
+                },
+                ReturnValues="ALL_NEW",
+            )
+        except Exception as e:
+            if _is_condition_failure(e):
+                return False
+            # 予算の記録に失敗しても呼び出し自体は止めない
+            logger.warning(f"Bedrock governor unavailable ({type(e).__name__}: {e}), proceeding without budget")
+            return True
+        attributes = response.get("Attributes", {})
+        permit.window_requests = int(attributes.get("requests", 0))
+        permit.window_tokens = int(attributes.get("tokens", 0))
+        return True
+
+    def acquire(self, model_id: str, lane: str, estimated_tokens: int, max_wait: float | None = None) -> Permit:
+        """予算に空きができるまで待って Permit を返す。
+
+        max_wait（省略時はレーンごとの上限）を過ぎても空かない場合、urgent はそのまま呼び出しを許し、
+        それ以外は BedrockBusyError を送出する。
+        """
+        if max_wait is None:
+            max_wait = LANE_MAX_WAIT_SECONDS.get(lane, LANE_MAX_WAIT_SECONDS["chat"])
+        started = time.time()
+        permit = Permit(model_id, lane, self._window(started), estimated_tokens)
+        if self.table is None:
+            return permit
+
+        while True:
+            now = time.time()
+            permit.window = self._window(now)
+            if self._try_reserve(permit, now):
+                break
+            remaining = started + max_wait - now
+            if remaining <= 0:
+                if lane == "urgent":
+                    logger.warning(f"Bedrock budget exhausted for {model_id}, proceeding (lane={lane})")
+                    break
+                raise BedrockBusyError(f"Bedrock の予算に空きがありません（{model_id}, lane={lane}）")
+            # 次の分の開始か POLL_SECONDS の早い方まで待つ（同時に待っている呼び出しが揃わないようジッターを足す）
+            until_next_window = 60 - now % 60
+            time.sleep(min(remaining, until_next_window, POLL_SECONDS) + random.uniform(0, 0.5))
+
+        permit.wait_ms = (time.time() - started) * 1000
+        return permit
+
+    def settle(self, permit: Permit, actual_tokens: int) -> None:
+        """見積もりと実績のトークン数の差を、予約した分の使用量に反映する"""
+        delta = actual_tokens - permit.tokens
+        if self.table is None or not delta:
+            return
+        try:
+            self.table.update_item(
+                Key=self._key(permit.model_id, permit.window),
+                UpdateExpression="ADD tokens :delta",
+                ExpressionAttributeValues={":delta": delta},
+            )
+        except Exception as e:
+            logger.warning(f"Failed to settle Bedrock budget: {e}")
+
+    def record_throttle(self, permit: Permit) -> None:
+        """スロットリングを受けたことを記録する"""
+        permit.retries += 1
+        if self.table is None:
+            return
+        try:
+            self.table.update_item(
+                Key=self._key(permit.model_id, permit.window),
+                UpdateExpression="ADD throttles :one",
+                ExpressionAttributeValues={":one": 1},
+            )
+        except Exception as e:
+            logger.warning(f"Failed to record Bedrock throttle: {e}")
+
+    def call(self, fn, model_id: str, lane: str, estimated_tokens: int, max_wait: float | None = None):
+        """予算を確保して fn() を呼ぶ。スロットリングされたら予約を戻し、予算を取り直してジッター付きで呼び直す。
+
+        Returns:
+            (fn() の戻り値, Permit)
+        """
+        deadline = time.time() + (max_wait if max_wait is not None else LANE_MAX_WAIT_SECONDS.get(lane, 20))
+        permit = self.acquire(model_id, lane, estimated_tokens, max_wait)
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                return fn(), permit
+            except Exception as e:
+                # 失敗した呼び出しはトークンを使っていないので、見積もりの予約を戻す（取り直しで二重に計上しない）
+                self.settle(permit, 0)
+                if attempt == MAX_ATTEMPTS - 1 or not is_throttle(e):
+                    raise
+                self.record_throttle(permit)
+                delay = backoff_seconds(attempt)
+                logger.warning(f"Bedrock {model_id} throttled (attempt {attempt + 1}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                retries, wait_ms = permit.retries, permit.wait_ms
+                permit = self.acquire(model_id, lane, estimated_tokens, max(0.0, deadline - time.time()))
+                permit.retries = retries
+                permit.wait_ms += wait_ms + delay * 1000
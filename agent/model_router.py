@@ -0,0 +1,137 @@
+"""
+モデルの振り分けとフォールバック
+
+/ask のリクエストを内容で分類し、時刻・記憶クリア・あいさつのような軽い問い合わせは小さく速いモデル、
+レース予想・選手分析などデータ取得を伴うものはフルモデルに送る。判断がつかないものはフルモデル。
+
+スロットリング・タイムアウトなど一時的なエラーでは、まだテキストを返していなければもう一方のモデルで
+やり直す。モデルごとに直近の所要時間とエラー有無を保持し、エラー率が高いモデルは一時的に避ける。
+"""
+
+import os
+import re
+import statistics
+import threading
+import time
+from collections import deque
+
+FULL_MODEL_ID = os.environ.get("MODEL_ID", "us.anthropic.claude-sonnet-4-6")
+FAST_MODEL_ID = os.environ.get("FAST_MODEL_ID", "us.anthropic.claude-haiku-4-5-20251001-v1:0")
+
+FAST_MAX_LENGTH = 40  # これより長い質問はフルモデル
+STATS_WINDOW = 50  # モデルごとに保持する直近の呼び出し数
+UNHEALTHY_MIN_CALLS = 4
+UNHEALTHY_ERROR_RATE = 0.5
+HEALTH_WINDOW_SECONDS = 300  # 健全性の判定に使う期間（避けたモデルもこの時間が過ぎれば再び使う）
+
+VENUE_NAMES = (
+    "桐生", "戸田", "江戸川", "平和島", "多摩川", "浜名湖", "蒲郡", "常滑", "津", "三国", "びわこ", "住之江",
+    "尼崎", "鳴門", "丸亀", "児島", "宮島", "徳山", "下関", "若松", "芦屋", "福岡", "唐津", "大村",
+)
+
+# レースデータの取得・分析が要る（フルモデル）
+_FULL_PATTERN = re.compile(
+    r"予想|買い目|オッズ|出走|展開|展示|モーター|選手|成績|レース|勝率|\d+\s*[RＲ]|\d-\d|"
+    + "|".join(VENUE_NAMES)
+)
+# 軽い問い合わせ（速いモデル）
+_FAST_PATTERN = re.compile(
+    r"何時|時刻|何日|何曜|記憶|忘れて|リセット|こんにちは|こんばんは|おはよう|ありがとう|使い方|ヘルプ|help",
+    re.IGNORECASE,
+)
+
+# 別モデルでやり直す価値のある一時的なエラー（例外クラス名・ClientError のコード）
+RETRYABLE_ERRORS = {
+    "ModelThrottledException",
+    "ThrottlingException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+    "ReadTimeoutError",
+    "ConnectTimeoutError",
+    "EndpointConnectionError",
+    "TimeoutError",
+    "BedrockBusyError",  # bedrock_governor の予算待ちが上限を超えた（別モデルは別枠）
+}
+
+
+def classify(prompt: str) -> str:
+    """リクエストを "fast" / "full" に分類する"""
+    text = prompt.strip()
+    if len(text) > FAST_MAX_LENGTH or _FULL_PATTERN.search(text):
+        return "full"
+    return "fast" if _FAST_PATTERN.search(text) else "full"
+
+
+def is_retryable(error: BaseException) -> bool:
+    """スロットリング・タイムアウトなど、別モデルでのやり直しが有効なエラーか（原因の例外もたどる）"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        response = getattr(error, "response", None)
+        code = response.get("Error", {}).get("Code", "") if isinstance(response, dict) else ""
+        if type(error).__name__ in RETRYABLE_ERRORS or code in RETRYABLE_ERRORS:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class ModelStats:
+    """1モデル分の直近の呼び出し結果（所要時間 ms, 成功したか, 時刻）"""
+
+    def __init__(self):
+        self.calls: deque[tuple[float, bool, float]] = deque(maxlen=STATS_WINDOW)
+
+    def record(self, latency_ms: float, ok: bool) -> None:
+        self.calls.append((latency_ms, ok, time.monotonic()))
+
+    def error_rate(self) -> float:
+        return sum(1 for _, ok, _ in self.calls if not ok) / len(self.calls) if self.calls else 0.0
+
+    def p50_ms(self) -> float:
+        latencies = [ms for ms, ok, _ in self.calls if ok]
+        return statistics.median(latencies) if latencies else 0.0
+
+    def healthy(self) -> bool:
+        """直近 HEALTH_WINDOW_SECONDS のエラー率が UNHEALTHY_ERROR_RATE 未満か（呼び出しが少なければ健全扱い）"""
+        since = time.monotonic() - HEALTH_WINDOW_SECONDS
+        recent = [ok for _, ok, at in self.calls if at >= since]
+        if len(recent) < UNHEALTHY_MIN_CALLS:
+            return True
+        return recent.count(False) / len(recent) < UNHEALTHY_ERROR_RATE
+
+
+class ModelRouter:
+    """リクエストの分類とモデルの健全性からモデルを選ぶ（コンテナ内で共有）"""
+
+    def __init__(self, full_model_id: str = FULL_MODEL_ID, fast_model_id: str = FAST_MODEL_ID):
+        self.full_model_id = full_model_id
+        self.fast_model_id = fast_model_id
+        self.stats = {full_model_id: ModelStats(), fast_model_id: ModelStats()}
+        self._lock = threading.Lock()
+
+    def choose(self, prompt: str) -> tuple[str, str]:
+        """(モデルID, リクエスト分類) を返す。分類上のモデルが不調ならもう一方を使う"""
+        request_class = classify(prompt)
+        model_id = self.fast_model_id if request_class == "fast" else self.full_model_id
+        with self._lock:
+            if not self.stats[model_id].healthy() and self.stats[self.fallback_for(model_id)].healthy():
+                model_id = self.fallback_for(model_id)
+        return model_id, request_class
+
+    def fallback_for(self, model_id: str) -> str:
+        return self.fast_model_id if model_id == self.full_model_id else self.full_model_id
+
+    def record(self, model_id: str, latency_ms: float, ok: bool) -> None:
+        with self._lock:
+            self.stats.setdefault(model_id, ModelStats()).record(latency_ms, ok)
+
+    def summary(self, model_id: str) -> dict:
+        """span に付ける直近の統計"""
+        with self._lock:
+            stats = self.stats.get(model_id) or ModelStats()
+            return {
+                "model_calls": len(stats.calls),
+                "model_error_rate": round(stats.error_rate(), 3),
+                "model_p50_ms": round(stats.p50_ms(), 1),
+            }
@@ -0,0 +1,64 @@
+"""
+エージェント側のレイテンシトレース（lambda/tracing.py と同じレコード形式）
+
+webhook から invoke_agent_runtime のペイロードで渡された trace_id を引き継ぎ、
+モデルの初回トークン・各ツール実行などの区間を構造化 JSON として標準出力に書き出す。
+AgentCore Runtime のコンテナログに流れ、scripts/trace_report.py で webhook 側の
+span と trace_id 単位で突き合わせて集計できる。
+"""
+
+import json
+import time
+import uuid
+from contextlib import contextmanager
+
+SPAN_RECORD_TYPE = "span"
+
+# 現在処理中の trace_id（_current_session_id と同じくリクエスト開始時に設定する）
+_current_trace_id: str | None = None
+
+
+def new_trace_id() -> str:
+    """新しい trace_id を発行する"""
+    return uuid.uuid4().hex
+
+
+def set_trace_id(trace_id: str | None) -> None:
+    """以降の span に付与する trace_id を設定する"""
+    global _current_trace_id
+    _current_trace_id = trace_id
+
+
+def get_trace_id() -> str | None:
+    """現在の trace_id を返す"""
+    return _current_trace_id
+
+
+def emit_span(name: str, duration_ms: float, **attrs) -> None:
+    """計測済みの区間を1レコード出力する"""
+    record = {
+        "type": SPAN_RECORD_TYPE,
+        "trace_id": attrs.pop("trace_id", None) or _current_trace_id,
+        "span": name,
+        "duration_ms": round(duration_ms, 2),
+        "ts": round(time.time(), 3),
+    }
+    record.update(attrs)
+    print(json.dumps(record, ensure_ascii=False), flush=True)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """with ブロックの所要時間を span として出力する。
+
+    yield した dict に値を入れると span の属性として一緒に出力される。
+    例外発生時は error 属性に例外名を入れて再送出する。
+    """
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except Exception as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        emit_span(name, (time.perf_counter() - start) * 1000, **attrs)
@@ -0,0 +1,156 @@
+"""prediction_parser のファズテスト — 乱数で崩した LLM 出力に対して不変条件を確かめる
+
+ネットワークにも AWS にも接続しない。確かめる不変条件:
+  - 正しい予想を説明文（{…} や " を含む）・コードブロックで包んでも、同じ予想が取り出せる
+  - どこでチャンクに分けて feed() しても、一括で読んだ場合と同じオブジェクトが得られる
+  - 打ち切り・表記揺れ・金額の崩れ・ランダムな文字列に対しては、ValueError になるか、
+    validate() を通る（race_no 一致・100 円単位・合計が予算）予想を返す。それ以外の例外は出さない
+
+使い方:
+  python benchmarks/fuzz_prediction_parser.py                  # 2000 ケース
+  python benchmarks/fuzz_prediction_parser.py --iterations 20000 --seed 7
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import traceback
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda"))
+
+import prediction_parser  # noqa: E402
+
+BUDGET = 5000
+PROSE = [
+    "以下が予想です。",
+    "注: {展開次第} で変わります。",
+    '「"逃げ"」が本線です。',
+    "```json",
+    "```",
+    "{ 補足 }",
+    "買い目は {1-3-全} も検討しました",
+    "}]",
+    "[参考]",
+    "注: {未完の補足",
+    '{"引用',
+]
+DASHES = ["-", "－", "ー", "−", "–", " - ", ""]
+
+
+def random_prediction(rng: random.Random) -> dict:
+    combos = set()
+    while len(combos) < rng.randint(1, 6):
+        combos.add("-".join(str(n) for n in rng.sample(range(1, 7), 3)))
+    amounts = prediction_parser.allocate([rng.randint(1, 10) for _ in combos], BUDGET)
+    bets = [
+        {"combination": combo, "amount": amount, "reasoning": rng.choice(["本線", "押さえ", '"穴"', "{差し}"])}
+        for combo, amount in zip(sorted(combos), amounts)
+        if amount
+    ]
+    return {"race_no": rng.randint(1, 12), "analysis": rng.choice(["イン逃げ", "まくり {警戒}", 'a "b" c']), "bets": bets}
+
+
+def wrap(rng: random.Random, body: str) -> str:
+    before = "\n".join(rng.choices(PROSE, k=rng.randint(0, 3)))
+    after = "\n".join(rng.choices(PROSE, k=rng.randint(0, 3)))
+    return f"{before}\n{body}\n{after}"
+
+
+def mutate(rng: random.Random, prediction: dict) -> dict:
+    """表記揺れ・金額の崩れ・不正な買い目・重複を混ぜる"""
+    mutated = json.loads(json.dumps(prediction))
+    for bet in mutated["bets"]:
+        r = rng.random()
+        if r < 0.2:
+            digits = bet["combination"].split("-")
+            dash = rng.choice(DASHES)
+            bet["combination"] = dash.join(chr(ord(d) + 0xFEE0) if rng.random() < 0.5 else d for d in digits)
+        elif r < 0.3:
+            bet["combination"] = rng.choice(["1-1-2", "7-1-2", "1-2", "", None, 123])
+        r = rng.random()
+        if r < 0.2:
+            bet["amount"] = f"{bet['amount']:,}円"
+        elif r < 0.3:
+            bet["amount"] = rng.choice([0, -100, 150, 1234.5, None, "abc", True])
+    if rng.random() < 0.2 and mutated["bets"]:
+        mutated["bets"].append(dict(rng.choice(mutated["bets"])))
+    if rng.random() < 0.2:
+        mutated["race_no"] = rng.choice([str(mutated["race_no"]), None, 99])
+    return mutated
+
+
+def split_randomly(rng: random.Random, text: str) -> list[str]:
+    cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(0, 20)))) if len(text) > 1 else []
+    return [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+
+def check_result(text: str, race_no: int) -> None:
+    """ValueError か、検証を通る予想のどちらかであること"""
+    try:
+        prediction, _ = prediction_parser.parse_prediction(text, race_no, BUDGET)
+    except ValueError:
+        return
+    errors = prediction_parser.validate(prediction, race_no, BUDGET)
+    assert not errors, errors
+
+
+def run_case(rng: random.Random) -> str:
+    prediction = random_prediction(rng)
+    race_no = prediction["race_no"]
+    body = json.dumps(prediction, ensure_ascii=False, indent=rng.choice([None, 2]))
+    kind = rng.choice(["wrapped", "stream", "truncated", "mutated", "garbage"])
+
+    if kind == "wrapped":
+        parsed, repairs = prediction_parser.parse_prediction(wrap(rng, body), race_no, BUDGET)
+        assert parsed == prediction, (parsed, prediction)
+        assert not repairs, repairs
+    elif kind == "stream":
+        text = wrap(rng, body)
+        extractor = prediction_parser.ObjectExtractor()
+        streamed = []
+        for chunk in split_randomly(rng, text):
+            streamed += extractor.feed(chunk)
+        streamed += extractor.finish()
+        assert streamed == prediction_parser.extract_objects(text)
+    elif kind == "truncated":
+        text = wrap(rng, body)
+        check_result(text[: rng.randint(0, len(text))], race_no)
+    elif kind == "mutated":
+        check_result(wrap(rng, json.dumps(mutate(rng, prediction), ensure_ascii=False)), race_no)
+    else:
+        alphabet = '{}[]",:-0123456789 abc\\nあ'
+        check_result("".join(rng.choice(alphabet) for _ in range(rng.randint(0, 200))), race_no)
+    return kind
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="prediction_parser のファズテスト")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    counts: dict[str, int] = {}
+    failures = 0
+    for i in range(args.iterations):
+        rng = random.Random(args.seed * 1_000_003 + i)
+        try:
+            kind = run_case(rng)
+            counts[kind] = counts.get(kind, 0) + 1
+        except Exception:
+            failures += 1
+            print(f"case {i} (seed {args.seed}) failed:", file=sys.stderr)
+            traceback.print_exc()
+            if failures >= 5:
+                break
+
+    print(", ".join(f"{kind}: {n}" for kind, n in sorted(counts.items())))
+    if failures:
+        print(f"{failures} failure(s)")
+        sys.exit(1)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
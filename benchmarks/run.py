@@ -0,0 +1,590 @@
+"""オフラインベンチマーク — 記録済みフィクスチャでパーサー・SSE 処理・メッセージ組み立て・ハンドラを計測
+
+ネットワークにも AWS にも接続しない。boto3 / PyNaCl は scripts/offline.py のスタブに、
+HTTP（urllib.request.urlopen）は benchmarks/fixtures/ のページを返す偽物に差し替える。
+
+計測結果は benchmarks/baseline.json と比較し、許容幅を超えて劣化した項目があれば
+終了コード 1 で終わる（CI やリファクタリング前後の確認用）。マシンの速さの違いで全項目が
+劣化扱いにならないよう、同じ実行の中でリポジトリのコードに依存しない校正用の処理
+（標準ライブラリの HTML パース・JSON・正規表現）を各項目の前後に挟んで計測し（最大値を使う）、
+ベースライン記録時との速度比でベースラインを補正してから比べる（実時間で待つ schedule_sync は補正しない）。
+
+使い方:
+  python benchmarks/run.py                      # 計測して baseline.json と比較
+  python benchmarks/run.py --only parse         # 名前に parse を含む項目だけ計測
+  python benchmarks/run.py --tolerance 0.3      # 30% までの劣化は許容（デフォルト 25%）
+  python benchmarks/run.py --save-baseline      # 計測結果を baseline.json に保存
+"""
+
+import argparse
+import contextlib
+import gc
+import html.parser
+import json
+import logging
+import os
+import platform
+import re
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BENCH_DIR, "fixtures")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "scripts"))
+
+from offline import FakeSchedulerClient, install_stubs  # noqa: E402
+
+stubs = install_stubs()
+
+import item_codec  # noqa: E402
+import odds_delta  # noqa: E402
+import prediction_parser  # noqa: E402
+import scraper  # noqa: E402
+import webhook  # noqa: E402
+
+JST = timezone(timedelta(hours=9))
+
+# boatrace.jp のページ種別 → フィクスチャファイル
+PAGE_FIXTURES = {
+    "racelist": "boatrace_racelist.html",
+    "beforeinfo": "boatrace_beforeinfo.html",
+    "oddstf": "boatrace_oddstf.html",
+    "odds3t": "boatrace_odds3t.html",
+    "resultlist": "boatrace_resultlist.html",
+    "raceresult": "boatrace_raceresult.html",
+    "raceindex": "boatrace_raceindex.html",
+    "racer": "kyoteibiyori_racer.html",
+}
+
+
+def load_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+FIXTURES = {page_type: load_fixture(name) for page_type, name in PAGE_FIXTURES.items()}
+SSE_TRANSCRIPT = load_fixture("agentcore_sse.txt")
+
+
+# =============================================
+# HTTP / 出力の差し替え
+# =============================================
+class _FakeResponse:
+    def __init__(self, body: bytes, status: int = 200):
+        self._body = body
+        self.status = status
+        self.headers = {}
+
+    def read(self) -> bytes:
+        return self._body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def fake_urlopen(req, timeout=None):
+    """フィクスチャのページを返す。Discord への送信は 204 を返すだけ"""
+    url = req.full_url if hasattr(req, "full_url") else req
+    if "discord.com" in url:
+        return _FakeResponse(b"", status=204)
+    return _FakeResponse(FIXTURES[scraper.page_type_of(url)].encode("utf-8"))
+
+
+class _NullWriter:
+    """span / EMF の出力を捨てる（書き込みコスト自体は計測に含める）"""
+
+    def write(self, s: str) -> int:
+        return len(s)
+
+    def flush(self) -> None:
+        pass
+
+
+@contextlib.contextmanager
+def offline_io():
+    with (
+        mock.patch("urllib.request.urlopen", fake_urlopen),
+        mock.patch("time.sleep", lambda s: None),
+        contextlib.redirect_stdout(_NullWriter()),
+    ):
+        yield
+
+
+class _FakeSSEBody:
+    """AgentCore invoke_agent_runtime の StreamingBody 相当"""
+
+    def __init__(self, transcript: str):
+        self._lines = [line.encode("utf-8") for line in transcript.split("\n")]
+
+    def iter_lines(self, chunk_size=64):
+        return iter(self._lines)
+
+    def close(self) -> None:
+        pass
+
+
+# =============================================
+# 計測ヘルパー
+# =============================================
+def throughput(fn, min_seconds: float = 0.5) -> float:
+    """fn を min_seconds 以上繰り返し、1秒あたりの実行回数を返す"""
+    fn()  # ウォームアップ
+    count = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_seconds:
+        fn()
+        count += 1
+        elapsed = time.perf_counter() - start
+    return count / elapsed
+
+
+def latency_ms(fn, repeat: int = 30) -> float:
+    """fn を repeat 回実行し、最も速かった回の所要時間（ms）を返す
+
+    数 ms のハンドラは他の負荷で中央値でも 2〜3 割揺れるので、邪魔の入らなかった回（最小値）で比べる。
+    timeit と同じく計測中は GC を止める（それまでの項目で増えたオブジェクト数で GC の頻度が変わるため）。
+    """
+    fn()  # ウォームアップ
+    samples = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+    finally:
+        gc.enable()
+    return min(samples)
+
+
+_CALIBRATION_HTML = "".join(
+    f'<tr class="row{i}"><td>{i}</td><td><a href="/racer?no={4000 + i}">選手{i}</a></td><td>{i * 1.5:.2f}</td></tr>'
+    for i in range(60)
+)
+
+
+def calibrate() -> float:
+    """リポジトリのコードに依存しない標準ライブラリだけの処理の回数/秒（マシンの速さの目安）"""
+
+    def run():
+        parser = html.parser.HTMLParser()
+        parser.feed(_CALIBRATION_HTML)
+        parser.close()
+        rows = [{"no": m.group(1), "cells": m.group(0).count("<td>")} for m in re.finditer(r"no=(\d+)", _CALIBRATION_HTML)]
+        return json.loads(json.dumps(rows, ensure_ascii=False))
+
+    return throughput(run, min_seconds=0.2)
+
+
+# =============================================
+# ベンチマーク
+# =============================================
+def bench_parse_racer_page() -> float:
+    return throughput(lambda: scraper.parse_racer_page(FIXTURES["racer"]))
+
+
+def bench_parse_result_list() -> float:
+    return throughput(lambda: scraper.parse_result_list(FIXTURES["resultlist"]))
+
+
+def bench_parse_race_result() -> float:
+    return throughput(lambda: scraper.parse_race_result(FIXTURES["raceresult"]))
+
+
+def bench_parse_odds3t() -> float:
+    return throughput(lambda: scraper.parse_odds3t(FIXTURES["odds3t"]))
+
+
+def bench_odds_delta() -> float:
+    """スナップショットとの比較＋再配分の回数/秒（120 通りのオッズ、買い目 12 点）"""
+    old = item_codec.unpack_odds(item_codec.pack_odds(scraper.parse_odds3t(FIXTURES["odds3t"])))
+    new = [odds * (1.3 if i % 7 == 0 else 1.0) for i, odds in enumerate(old)]
+    bets = [{"combination": combo, "amount": 400} for combo in item_codec.COMBINATIONS[::10]]
+
+    def run():
+        delta = odds_delta.compare(old, new, [bet["combination"] for bet in bets])
+        odds_delta.reallocate(bets, old, new)
+        return delta
+
+    return throughput(run)
+
+
+def _extract(page_type: str):
+    def run():
+        extractor = scraper._HTMLTextExtractor()
+        extractor.feed(FIXTURES[page_type])
+        return extractor.get_text()
+
+    return run
+
+
+def bench_extract_racelist() -> float:
+    return throughput(_extract("racelist"))
+
+
+def bench_extract_beforeinfo() -> float:
+    return throughput(_extract("beforeinfo"))
+
+
+def bench_extract_oddstf() -> float:
+    return throughput(_extract("oddstf"))
+
+
+def bench_sse_events() -> float:
+    """process_sse_stream の処理イベント数/秒"""
+    events = sum(1 for line in SSE_TRANSCRIPT.split("\n") if line.startswith("data: "))
+
+    def run():
+        webhook.process_sse_stream("dummy-token", {"response": _FakeSSEBody(SSE_TRANSCRIPT)})
+
+    return throughput(run) * events
+
+
+_PREDICTION = stubs.bedrock._default_prediction({"prompt": "12Rの3連単予想"})
+_RESULTS = [
+    {
+        "race_no": 12,
+        "prediction": bet["combination"],
+        "bet_amount": bet["amount"],
+        "actual_result": "1-3-2",
+        "payout_per_100": 1560,
+        "hit": bet["combination"] == "1-3-2",
+        "return_amount": (bet["amount"] // 100) * 1560 if bet["combination"] == "1-3-2" else 0,
+    }
+    for bet in _PREDICTION["bets"]
+]
+_DAILY_SUMMARY = {
+    "total_bet": 60000,
+    "total_return": 48210,
+    "daily_pnl": -11790,
+    "hit_count": 3,
+    "total_bet_count": 48,
+    "cumulative": {"total_bet": 1_250_000, "total_return": 1_130_500, "cumulative_pnl": -119_500, "days_count": 25},
+}
+
+
+def bench_build_messages() -> float:
+    """予想・結果（日次まとめ付き）メッセージの組み立て回数/秒"""
+    schedule_data = scraper.parse_racer_page(FIXTURES["racer"])
+    races = [{"race_no": 3, "course": "4", "deadline": "11:42"}, {"race_no": 9, "course": "1", "deadline": "15:12"}]
+    prediction_times = {3: datetime(2030, 1, 1, 11, 36, tzinfo=JST), 9: datetime(2030, 1, 1, 15, 6, tzinfo=JST)}
+
+    def run():
+        scraper.build_schedule_message(schedule_data, races, prediction_times)
+        scraper.build_pre_race_message("池田浩二", "住之江", 12, _PREDICTION, 2, 2)
+        scraper.build_post_race_message("池田浩二", "住之江", 12, _RESULTS, 5000, 31200, 26200, 2, 2, _DAILY_SUMMARY)
+
+    return throughput(run)
+
+
+def bench_item_codec() -> float:
+    """予想・結果アイテムのエンコード＋デコード回数/秒"""
+
+    def run():
+        pred_item = {"race_no": 12, **item_codec.encode_prediction(_PREDICTION)}
+        item_codec.decode_prediction(pred_item)
+        result_item = {"race_no": 12, **item_codec.encode_results(_RESULTS)}
+        item_codec.decode_results(result_item)
+        item_codec.result_counts(result_item)
+
+    return throughput(run)
+
+
+# 説明文（{…} を含む）に挟まれた予想 JSON。旧実装の貪欲な正規表現では読めなかった形
+_PREDICTION_OUTPUT = (
+    "以下が予想です。注: {展開次第} で変わります。\n```json\n"
+    + json.dumps(_PREDICTION, ensure_ascii=False, indent=2)
+    + "\n```\n"
+    + "補足: {1-3-全} も検討しました。スタート展示では {3号艇} が好気配。\n" * 40
+)
+
+
+def bench_prediction_parse() -> float:
+    """説明文付きの予想出力の抽出＋検証＋修復の回数/秒"""
+    return throughput(lambda: prediction_parser.parse_prediction(_PREDICTION_OUTPUT, 12, scraper.RACE_BUDGET))
+
+
+def bench_prediction_stream() -> float:
+    """同じ出力を 16 文字ずつ feed() したときの回数/秒（ストリーミング応答）"""
+    chunks = [_PREDICTION_OUTPUT[i : i + 16] for i in range(0, len(_PREDICTION_OUTPUT), 16)]
+
+    def run():
+        extractor = prediction_parser.ObjectExtractor()
+        for chunk in chunks:
+            extractor.feed(chunk)
+        return extractor.finish()
+
+    return throughput(run)
+
+
+def _race_event(mode: str) -> dict:
+    return {
+        "mode": mode,
+        "race_no": 9,
+        "jcd": "12",
+        "venue_name": "住之江",
+        "date": datetime.now(JST).strftime("%Y%m%d"),
+        "player_name": "池田浩二",
+        "total_races": 2,
+        "race_index": 2,
+        "course_info": "1",
+    }
+
+
+def bench_handler_schedule() -> float:
+    return latency_ms(lambda: scraper.handler({"mode": "schedule"}, None))
+
+
+def bench_handler_pre_race() -> float:
+    """朝の schedule で出走カードを保存済みの状態での pre_race"""
+    scraper.handler({"mode": "schedule"}, None)
+    return latency_ms(lambda: scraper.handler(_race_event("pre_race"), None))
+
+
+def bench_handler_post_race() -> float:
+    """最終レース（日次まとめ・累計収支更新あり）の post_race"""
+    scraper.handler({"mode": "schedule"}, None)
+    scraper.handler(_race_event("pre_race"), None)
+    result_key = (scraper.RACER_NO, f"{_race_event('post_race')['date']}#result#9")
+
+    def run():
+        stubs.table.items.pop(result_key, None)  # 保存済みだと日次まとめを省くので毎回消す
+        scraper.handler(_race_event("post_race"), None)
+
+    return latency_ms(run)
+
+
+def bench_handler_venue_predict() -> float:
+    """会場モードで翌日の12R分（出走カード保存済み）をまとめて予想する時間"""
+    date = (datetime.now(JST) + timedelta(days=1)).strftime("%Y%m%d")
+    scraper.handler({"mode": "venue_schedule", "jcd": "12", "date": date}, None)
+    return latency_ms(lambda: scraper.handler({"mode": "venue_predict", "jcd": "12", "date": date}, None), repeat=10)
+
+
+def bench_handler_digest() -> float:
+    """全24会場の結果一覧を取得・集計する全場まとめ"""
+    return latency_ms(lambda: scraper.handler({"mode": "digest"}, None), repeat=10)
+
+
+def bench_handler_settle() -> float:
+    """会場モードで前日の12R分（予想済み・結果未保存）を結果一覧1ページで一括精算する時間"""
+    date = (datetime.now(JST) - timedelta(days=1)).strftime("%Y%m%d")
+    scraper.handler({"mode": "venue_schedule", "jcd": "12", "date": date}, None)
+    partition = f"{scraper.VENUE_PARTITION_PREFIX}12"
+    scraper.partition_key = partition
+    races = [
+        {"race_no": int(r["race_no"]), "race_index": i + 1, "deadline": scraper.parse_deadline_time(r["deadline"], date)}
+        for i, r in enumerate(scraper.get_schedule(date)["races"])
+    ]
+    scraper.predict_races(date, "12", "住之江", "住之江 全レース", races, len(races))
+
+    def run():
+        for race_no in range(1, 13):
+            stubs.table.items.pop((partition, f"{date}#result#{race_no}"), None)
+        scraper.handler({"mode": "settle", "scope": "venue", "jcd": "12", "date": date}, None)
+
+    return latency_ms(run)
+
+
+SCHEDULER_API_LATENCY = 0.02  # 秒（EventBridge Scheduler API 1 回あたりの想定往復時間）
+
+
+class _SlowSchedulerClient(FakeSchedulerClient):
+    """API 呼び出しごとに往復時間ぶん待つスケジューラ（time.sleep はパッチされるので Event.wait で待つ）"""
+
+    def __getattribute__(self, name):
+        attr = super().__getattribute__(name)
+        if name.endswith("_schedule") or name == "list_schedules":
+
+            def _slow(**kwargs):
+                threading.Event().wait(SCHEDULER_API_LATENCY)
+                return attr(**kwargs)
+
+            return _slow
+        return attr
+
+
+def bench_schedule_sync() -> float:
+    """API 往復 20ms のスケジューラに 12R 分（24 件）のスケジュールを新規作成する時間"""
+    fire_at = datetime(2030, 1, 1, 3, 0, tzinfo=timezone.utc)
+    desired = {
+        f"{mode}-race-20300101-{race_no}": scraper._schedule_params(fire_at, {"mode": mode, "race_no": race_no})
+        for mode in ("pre", "post")
+        for race_no in range(1, 13)
+    }
+
+    def run():
+        with mock.patch.object(scraper, "scheduler_client", _SlowSchedulerClient()):
+            scraper.sync_schedules(desired, prefixes=("pre-race-20300101-", "post-race-20300101-"))
+
+    return latency_ms(run, repeat=5)
+
+
+# マシンの速さで補正しない（実時間で待つ）項目
+UNSCALED = {"schedule_sync"}
+
+# ms の項目はこれより小さい差を劣化とみなさない（タイマーやスケジューリングの揺れ）
+MIN_LATENCY_DELTA_MS = 1.0
+
+# (名前, 関数, 単位, 大きいほど良いか)
+BENCHMARKS = [
+    ("parse_racer_page", bench_parse_racer_page, "pages/s", True),
+    ("parse_result_list", bench_parse_result_list, "pages/s", True),
+    ("parse_race_result", bench_parse_race_result, "pages/s", True),
+    ("extract_racelist", bench_extract_racelist, "pages/s", True),
+    ("extract_beforeinfo", bench_extract_beforeinfo, "pages/s", True),
+    ("extract_oddstf", bench_extract_oddstf, "pages/s", True),
+    ("parse_odds3t", bench_parse_odds3t, "pages/s", True),
+    ("odds_delta", bench_odds_delta, "sets/s", True),
+    ("sse_stream", bench_sse_events, "events/s", True),
+    ("build_messages", bench_build_messages, "sets/s", True),
+    ("item_codec", bench_item_codec, "sets/s", True),
+    ("prediction_parse", bench_prediction_parse, "outputs/s", True),
+    ("prediction_stream", bench_prediction_stream, "outputs/s", True),
+    ("handler_schedule", bench_handler_schedule, "ms", False),
+    ("schedule_sync", bench_schedule_sync, "ms", False),
+    ("handler_pre_race", bench_handler_pre_race, "ms", False),
+    ("handler_post_race", bench_handler_post_race, "ms", False),
+    ("handler_venue_predict", bench_handler_venue_predict, "ms", False),
+    ("handler_digest", bench_handler_digest, "ms", False),
+    ("handler_settle", bench_handler_settle, "ms", False),
+]
+
+
+def compare(
+    results: dict, baseline: dict, tolerance: float, speed: float = 1.0, latency_tolerance: float | None = None
+) -> list[str]:
+    """ベースラインと比較して表を表示し、劣化した項目名を返す
+
+    speed はこのマシンの速さ / ベースライン記録時の速さ（校正用の処理で測った比）。
+    ベースラインの値をこの比で補正してから比べる（UNSCALED の項目は補正しない）。
+    ms の項目は latency_tolerance（省略時は tolerance）で判定し、差が MIN_LATENCY_DELTA_MS 未満なら劣化にしない。
+    """
+    regressions = []
+    print(f"{'benchmark':<22} {'value':>12} {'baseline':>12} {'change':>8}  unit")
+    print("-" * 66)
+    for name, entry in results.items():
+        base = baseline.get(name)
+        value = entry["value"]
+        if not base:
+            print(f"{name:<22} {value:>12.1f} {'-':>12} {'-':>8}  {entry['unit']}")
+            continue
+        factor = 1.0 if name in UNSCALED else speed
+        expected = base["value"] * factor if entry["higher_is_better"] else base["value"] / factor
+        change = (value - expected) / expected
+        worse = -change if entry["higher_is_better"] else change
+        flag = ""
+        if entry["unit"] == "ms":
+            limit = tolerance if latency_tolerance is None else latency_tolerance
+            regressed = worse > limit and abs(value - expected) >= MIN_LATENCY_DELTA_MS
+        else:
+            regressed = worse > tolerance
+        if regressed:
+            regressions.append(name)
+            flag = "  ⚠️ regression"
+        print(f"{name:<22} {value:>12.1f} {expected:>12.1f} {change * 100:>+7.1f}%  {entry['unit']}{flag}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="オフラインベンチマーク")
+    parser.add_argument("--only", help="名前にこの文字列を含むベンチマークだけ実行")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="許容する劣化率（0.25 = 25%%）")
+    parser.add_argument(
+        "--latency-tolerance",
+        type=float,
+        default=0.5,
+        help="ms の項目（ハンドラ）の許容する劣化率。スレッドや DynamoDB スタブを含み、校正値で補正しきれない揺れが大きい",
+    )
+    parser.add_argument("--save-baseline", action="store_true", help="結果を baseline.json に保存")
+    parser.add_argument("--rounds", type=int, default=5, help="各項目を測る回数（校正値で換算した値の中央値を使う）")
+    args = parser.parse_args()
+
+    # 取りこぼし・スキップなどの想定どおりの警告（"Skipping pre_race..." など）で表が埋もれないようにする
+    logging.getLogger().setLevel(logging.ERROR)
+
+    # 各回の前後で校正用の処理を測り、その平均に対する比（マシンの速さで割った値）で回どうしを比べる。
+    # 他の負荷は数秒単位で変わるので、直前・直後の校正値で割ると 1 回ごとの揺れがほぼ打ち消される
+    previous = calibrate()
+    calibrations = [previous]
+    rounds: dict[str, list[tuple[float, float]]] = {}
+    entries = {}
+    for name, fn, unit, higher_is_better in BENCHMARKS:
+        if args.only and args.only not in name:
+            continue
+        entries[name] = {"unit": unit, "higher_is_better": higher_is_better}
+        rounds[name] = []
+        for _ in range(args.rounds):
+            with offline_io():
+                value = fn()
+            current = calibrate()
+            calibrations.append(current)
+            rounds[name].append((value, (previous + current) / 2))
+            previous = current
+    calibration = round(statistics.median(calibrations), 2)
+
+    # 各回の値をこの実行の校正値（中央値）のときの値に換算し、その中央値を使う
+    results = {}
+    for name, entry in entries.items():
+        values = []
+        for value, local in rounds[name]:
+            factor = 1.0 if name in UNSCALED else calibration / local
+            values.append(value * factor if entry["higher_is_better"] else value / factor)
+        results[name] = {"value": round(statistics.median(values), 2), **entry}
+
+    if args.save_baseline:
+        saved = {}
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH, encoding="utf-8") as f:
+                saved = json.load(f)
+        # 一部だけ保存し直す場合は、既存の項目を今回の校正値の尺度に換算してから上書きする
+        rescale = calibration / saved["calibration"] if saved.get("calibration") else 1.0
+        baseline = {}
+        for name, entry in saved.get("results", {}).items():
+            factor = 1.0 if name in UNSCALED else rescale
+            value = entry["value"] * factor if entry["higher_is_better"] else entry["value"] / factor
+            baseline[name] = {**entry, "value": round(value, 2)}
+        baseline.update(results)
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "calibration": calibration,
+                    "results": baseline,
+                },
+                f,
+                indent=2,
+                ensure_ascii=False,
+            )
+            f.write("\n")
+        print(f"Saved baseline: {BASELINE_PATH}")
+
+    saved = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            saved = json.load(f)
+    speed = calibration / saved["calibration"] if saved.get("calibration") else 1.0
+    print(f"calibration: {calibration:.1f} loops/s（ベースライン記録時比 x{speed:.2f}）")
+
+    regressions = compare(results, saved.get("results", {}), args.tolerance, speed, args.latency_tolerance)
+    if regressions:
+        print(
+            f"\n劣化: {', '.join(regressions)}"
+            f"（許容 {args.tolerance * 100:.0f}%、ms の項目は {args.latency_tolerance * 100:.0f}%）"
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
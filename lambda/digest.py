@@ -0,0 +1,92 @@
+"""
+全会場の当日結果のまとめ（digest モード）
+
+各会場の resultlist ページを parse_result_list したもの（{jcd: [{race_no, trifecta, payout}, ...]}）を
+列（会場・レース番号・1着艇・払戻金の配列）にまとめ、Python のループと statistics で集計する。
+Lambda のバンドルには numpy を入れていないので、列は標準ライブラリの array で持つ（ベクトル演算ではなく、
+1 日分の全会場でも 300 件に満たないのでループで足りる。array は値を詰めて持つためだけに使う）。
+
+集計するもの:
+  会場数・レース数
+  1号艇の1着率（全会場・会場別）
+  払戻金の平均・中央値、万舟（払戻 10,000 円以上）の件数
+  高配当レースの上位
+"""
+
+import statistics
+from array import array
+
+MANSHU_PAYOUT = 10000  # 万舟（100 円あたりの払戻）
+TOP_PAYOUTS = 5  # 高配当レースとして載せる件数
+
+
+class ResultColumns:
+    """全会場のレース結果を列ごとの配列で持つ"""
+
+    def __init__(self):
+        self.venues: list[str] = []
+        self.race_no = array("b")
+        self.winner = array("b")
+        self.payout = array("l")
+        self.trifecta: list[str] = []
+
+    @classmethod
+    def from_venues(cls, results_by_venue: dict[str, list[dict]]) -> "ResultColumns":
+        """会場ごとの結果から列を作る（3連単が読めないレースは除く）"""
+        columns = cls()
+        for jcd, races in sorted(results_by_venue.items()):
+            for race in races:
+                trifecta = race.get("trifecta") or ""
+                if not trifecta[:1].isdigit():
+                    continue
+                columns.venues.append(jcd)
+                columns.race_no.append(int(race["race_no"]))
+                columns.winner.append(int(trifecta[0]))
+                columns.payout.append(int(race.get("payout") or 0))
+                columns.trifecta.append(trifecta)
+        return columns
+
+    def __len__(self) -> int:
+        return len(self.payout)
+
+
+def summarize(results_by_venue: dict[str, list[dict]], top: int = TOP_PAYOUTS) -> dict:
+    """全会場の当日結果を集計する
+
+    Returns:
+        {venue_count, race_count, inside_wins, inside_rate, mean_payout, median_payout, manshu_count,
+         by_venue: {jcd: {races, inside_wins, inside_rate, max_payout}}, top_payouts: [{jcd, race_no, trifecta, payout}]}
+    """
+    columns = ResultColumns.from_venues(results_by_venue)
+    n = len(columns)
+    inside = [w == 1 for w in columns.winner]
+
+    by_venue: dict[str, dict] = {}
+    for i, jcd in enumerate(columns.venues):
+        venue = by_venue.setdefault(jcd, {"races": 0, "inside_wins": 0, "max_payout": 0})
+        venue["races"] += 1
+        venue["inside_wins"] += inside[i]
+        venue["max_payout"] = max(venue["max_payout"], columns.payout[i])
+    for venue in by_venue.values():
+        venue["inside_rate"] = venue["inside_wins"] / venue["races"]
+
+    order = sorted(range(n), key=lambda i: columns.payout[i], reverse=True)[:top]
+    return {
+        "venue_count": len(by_venue),
+        "race_count": n,
+        "inside_wins": sum(inside),
+        "inside_rate": sum(inside) / n if n else 0.0,
+        "mean_payout": statistics.fmean(columns.payout) if n else 0.0,
+        "median_payout": statistics.median(columns.payout) if n else 0,
+        "manshu_count": sum(1 for p in columns.payout if p >= MANSHU_PAYOUT),
+        "by_venue": by_venue,
+        "top_payouts": [
+            {
+                "jcd": columns.venues[i],
+                "race_no": columns.race_no[i],
+                "trifecta": columns.trifecta[i],
+                "payout": columns.payout[i],
+            }
+            for i in order
+        ],
+    }
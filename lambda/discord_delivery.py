@@ -0,0 +1,223 @@
+"""
+Discord Webhook への配信 — 行単位の分割・embed への詰め込み・レート制限への追従
+
+- 分割は行の切れ目で行う（1行が上限を超える場合だけ空白、なければ文字数で切る）
+- 2000 文字を超える本文は embed（description 最大 4096 文字、1メッセージ 10 個・合計 6000 文字まで）に
+  詰めて、content だけで送るよりメッセージ数を減らす
+- レスポンスヘッダーの X-RateLimit-Remaining / X-RateLimit-Reset-After を Webhook ごとに覚えておき、
+  残り 0 のときだけリセットまで待つ（固定間隔では待たない）
+- 429 は Retry-After（またはボディの retry_after）+ ジッター、5xx / 接続エラーは指数バックオフ + ジッターで再送
+- 配信の所要時間（待ち時間込み）と試行回数は EMF メトリクス（DiscordDuration / DiscordAttempts）で出力する
+"""
+
+import json
+import logging
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from metrics import emit
+
+logger = logging.getLogger()
+
+MAX_CONTENT = 2000
+MAX_EMBED_DESCRIPTION = 4096
+MAX_EMBEDS = 10
+MAX_EMBED_TOTAL = 6000
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5  # 秒
+USER_AGENT = "DiscordBot (https://github.com/agentcore-line-chatbot, 1.0)"
+
+
+# =============================================
+# 分割・詰め込み
+# =============================================
+def split_lines(text: str, limit: int) -> list[str]:
+    """行の切れ目で limit 文字以内のチャンクに分ける"""
+    chunks: list[str] = []
+    current = ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            # 1行が上限を超える場合は、上限内の最後の空白で切る（なければ上限で切る）
+            cut = line.rfind(" ", 0, limit)
+            cut = cut if cut > 0 else limit
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:cut])
+            line = line[cut:].lstrip(" ")
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            chunks.append(current)
+            current = line
+        else:
+            current = candidate
+    if current.strip():
+        chunks.append(current)
+    return [c for c in chunks if c.strip()]
+
+
+def pack_messages(text: str, use_embeds: bool = True) -> list[dict]:
+    """本文を Webhook に送るペイロードの列にする"""
+    text = text.strip()
+    if not text:
+        return []
+    if len(text) <= MAX_CONTENT:
+        return [{"content": text}]
+    if not use_embeds:
+        return [{"content": chunk} for chunk in split_lines(text, MAX_CONTENT)]
+
+    payloads: list[dict] = []
+    embeds: list[dict] = []
+    total = 0
+    for chunk in split_lines(text, MAX_EMBED_DESCRIPTION):
+        if embeds and (len(embeds) == MAX_EMBEDS or total + len(chunk) > MAX_EMBED_TOTAL):
+            payloads.append({"embeds": embeds})
+            embeds, total = [], 0
+        embeds.append({"description": chunk})
+        total += len(chunk)
+    if embeds:
+        payloads.append({"embeds": embeds})
+    return payloads
+
+
+# =============================================
+# レート制限
+# =============================================
+class RateLimitBucket:
+    """Webhook ごとのレート制限状態（ウォームスタート間で共有）"""
+
+    def __init__(self):
+        self.remaining: int | None = None
+        self.reset_at = 0.0  # time.monotonic() 基準
+        self.lock = threading.Lock()
+
+    def wait(self) -> float:
+        """残り 0 ならリセットまで待ち、待った秒数を返す"""
+        with self.lock:
+            delay = self.reset_at - time.monotonic() if self.remaining == 0 else 0.0
+        if delay > 0:
+            time.sleep(delay)
+            return delay
+        return 0.0
+
+    def update(self, headers) -> None:
+        if headers is None:
+            return
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset_after = headers.get("X-RateLimit-Reset-After")
+        with self.lock:
+            if remaining is not None:
+                self.remaining = int(remaining)
+            if reset_after is not None:
+                self.reset_at = time.monotonic() + float(reset_after)
+
+
+_buckets: dict[str, RateLimitBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def bucket_for(webhook_url: str) -> RateLimitBucket:
+    with _buckets_lock:
+        return _buckets.setdefault(webhook_url, RateLimitBucket())
+
+
+def _retry_after(error: urllib.error.HTTPError) -> float:
+    """429 の待ち秒数（Retry-After ヘッダー、なければボディの retry_after）"""
+    header = error.headers.get("Retry-After") if error.headers else None
+    if header:
+        return float(header)
+    try:
+        return float(json.loads(error.read().decode("utf-8")).get("retry_after", 1.0))
+    except Exception:
+        return 1.0
+
+
+# =============================================
+# 送信
+# =============================================
+def post_payload(webhook_url: str, payload: dict) -> dict:
+    """ペイロードを1件送る（レート制限待ち・再送込み）。{"ok", "attempts", "waited"} を返す"""
+    bucket = bucket_for(webhook_url)
+    data = json.dumps(payload).encode("utf-8")
+    waited = 0.0
+    for attempt in range(1, MAX_RETRIES + 2):
+        waited += bucket.wait()
+        req = urllib.request.Request(
+            webhook_url,
+            data=data,
+            headers={"Content-Type": "application/json", "User-Agent": USER_AGENT},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=10) as response:
+                bucket.update(response.headers)
+            return {"ok": True, "attempts": attempt, "waited": waited}
+        except urllib.error.HTTPError as e:
+            bucket.update(e.headers)
+            if e.code == 429:
+                delay = _retry_after(e) + random.uniform(0, 0.25)
+            elif e.code >= 500:
+                delay = random.uniform(0, BACKOFF_BASE * 2**attempt)
+            else:
+                logger.error(f"Discord webhook rejected message: HTTP {e.code}")
+                return {"ok": False, "attempts": attempt, "waited": waited}
+            logger.warning(f"Discord webhook HTTP {e.code} — retry in {delay:.2f}s ({attempt}/{MAX_RETRIES})")
+        except (urllib.error.URLError, TimeoutError) as e:
+            delay = random.uniform(0, BACKOFF_BASE * 2**attempt)
+            logger.warning(f"Discord webhook error {e} — retry in {delay:.2f}s ({attempt}/{MAX_RETRIES})")
+        if attempt > MAX_RETRIES:
+            break
+        time.sleep(delay)
+        waited += delay
+    logger.error(f"Failed to send Discord message after {MAX_RETRIES + 1} attempts")
+    return {"ok": False, "attempts": MAX_RETRIES + 1, "waited": waited}
+
+
+def payload_text(payload: dict) -> str:
+    """ペイロードの本文（embeds は description を改行でつなぐ）"""
+    if "content" in payload:
+        return payload["content"]
+    return "\n".join(embed["description"] for embed in payload.get("embeds", []))
+
+
+def deliver(webhook_url: str, text: str, use_embeds: bool = True) -> dict:
+    """本文を分割・詰め込みして先頭から順に送信し、配信結果を返す。
+
+    送信に失敗したペイロードがあればそこで止め、以降は送らない（順序を保ち、再送で重複させないため）。
+
+    Returns:
+        {"messages": メッセージ数, "delivered": 成功数, "undelivered": 送れなかった部分の本文,
+         "attempts": 試行回数合計, "latency_ms": 所要時間}
+    """
+    payloads = pack_messages(text, use_embeds)
+    started = time.perf_counter()
+    delivered = attempts = 0
+    waited = 0.0
+    for payload in payloads:
+        result = post_payload(webhook_url, payload)
+        attempts += result["attempts"]
+        waited += result["waited"]
+        if not result["ok"]:
+            break
+        delivered += 1
+    latency_ms = (time.perf_counter() - started) * 1000
+    undelivered = "\n".join(payload_text(payload) for payload in payloads[delivered:])
+
+    if payloads:
+        emit(
+            {
+                "DiscordDuration": (latency_ms, "Milliseconds"),
+                "DiscordAttempts": (attempts, "Count"),
+            },
+            properties={"messages": len(payloads), "delivered": delivered, "waited_ms": round(waited * 1000, 1)},
+        )
+    return {
+        "messages": len(payloads),
+        "delivered": delivered,
+        "undelivered": undelivered,
+        "attempts": attempts,
+        "latency_ms": latency_ms,
+    }
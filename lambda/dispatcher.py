@@ -0,0 +1,84 @@
+"""
+Discord 通知ディスパッチャ Lambda — アウトボックス（SQS）のメッセージをまとめて送信する
+
+SQS イベントソース（バッチウィンドウ数秒）で起動され、1バッチ分のメッセージを Webhook ごとに分けて
+積まれた順（enqueued_at）に並べ、2000 文字に収まる範囲で連続するメッセージを1通にまとめて送る。
+送信は discord_delivery.deliver() なので Webhook のレート制限に追従する。
+同時実行数はイベントソースの maxConcurrency で 2 に絞っているので、レート制限の状態は
+ほぼウォームコンテナ内で共有される（超えた分も 429 の Retry-After に従う）。
+
+何も送れなかったグループのメッセージは batchItemFailures で返し、SQS の再配信（上限を超えたら DLQ）に任せる。
+途中まで送れたグループは、送り残した部分だけを新しいメッセージとして積み直し、元のメッセージは成功扱いにする
+（送信済みの部分を再配信で二重に送らないため）。積み直せなければ従来どおり全体を失敗として返す。
+"""
+
+import json
+import logging
+import time
+from collections import defaultdict
+
+import discord_delivery
+import outbox
+from metrics import emit, set_dimensions
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+MERGE_SEPARATOR = "\n\n"
+
+
+def merge_groups(messages: list[dict]) -> list[list[dict]]:
+    """連続するメッセージを合計 MAX_CONTENT 文字以内のグループにまとめる（長文は単独のグループ）"""
+    groups: list[list[dict]] = []
+    current: list[dict] = []
+    length = 0
+    for message in messages:
+        size = len(message["text"])
+        if current and length + len(MERGE_SEPARATOR) + size > discord_delivery.MAX_CONTENT:
+            groups.append(current)
+            current, length = [], 0
+        current.append(message)
+        length += (len(MERGE_SEPARATOR) if length else 0) + size
+    if current:
+        groups.append(current)
+    return groups
+
+
+def handler(event, context):
+    """SQS バッチを処理し、失敗したメッセージの ID を返す（ReportBatchItemFailures）"""
+    set_dimensions(Mode="dispatch")
+    by_webhook: dict[str, list[dict]] = defaultdict(list)
+    failures: list[dict] = []
+
+    for record in event.get("Records", []):
+        try:
+            body = json.loads(record["body"])
+            by_webhook[body["webhook_url"]].append({**body, "message_id": record["messageId"]})
+        except (KeyError, json.JSONDecodeError) as e:
+            # 壊れたメッセージは再送しても直らないので捨てる
+            logger.error(f"Dropping malformed outbox message {record.get('messageId')}: {e}")
+
+    sent = merged = 0
+    for webhook_url, messages in by_webhook.items():
+        messages.sort(key=lambda m: m.get("enqueued_at", 0))
+        for group in merge_groups(messages):
+            text = MERGE_SEPARATOR.join(m["text"].strip() for m in group)
+            result = discord_delivery.deliver(webhook_url, text)
+            if result["delivered"] < result["messages"]:
+                enqueued_at = min(m.get("enqueued_at", time.time()) for m in group)
+                if not result["delivered"] or not outbox.requeue(
+                    webhook_url, result["undelivered"], group[0].get("kind", ""), enqueued_at
+                ):
+                    failures.extend({"itemIdentifier": m["message_id"]} for m in group)
+                    continue
+                logger.warning(
+                    f"Delivered {result['delivered']}/{result['messages']} payloads; requeued the rest of "
+                    f"{len(group)} outbox messages"
+                )
+            sent += result["delivered"]
+            merged += len(group)
+            lag_ms = (time.time() - min(m.get("enqueued_at", time.time()) for m in group)) * 1000
+            emit({"OutboxLag": (lag_ms, "Milliseconds")}, properties={"merged": len(group)})
+
+    logger.info(f"Dispatched {merged} outbox messages as {sent} Discord messages ({len(failures)} failed)")
+    return {"batchItemFailures": failures}
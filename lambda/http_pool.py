@@ -0,0 +1,118 @@
+"""
+ホスト単位のレート制限付き並列 HTTP 取得
+
+同じホストへのリクエスト開始間隔を min_interval 秒以上空けつつ、
+最大 max_workers 本のスレッドで並列に取得する。boatrace.jp に負荷をかけずに
+多数のページ（会場 × 日付など）を取りに行くためのもの。
+
+  pool = HttpPool(fetch_page, max_workers=4, min_interval=1.0)
+  for url, body, error in pool.map(urls):
+      ...
+
+取得関数（fetch）は URL を受け取って本文を返す callable（scraper.fetch_page など）。
+"""
+
+import logging
+import threading
+import time
+import urllib.error
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator
+from urllib.parse import urlsplit
+
+logger = logging.getLogger()
+
+# リトライするステータスコード
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class HostRateLimiter:
+    """ホストごとにリクエスト開始間隔を min_interval 秒以上空ける（スレッドセーフ）"""
+
+    def __init__(self, min_interval: float = 1.0, per_host: dict[str, float] | None = None):
+        self.min_interval = min_interval
+        self.per_host = per_host or {}
+        self._next_slot: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str) -> float:
+        """次に送ってよい時刻まで待ち、待った秒数を返す"""
+        host = urlsplit(url).hostname or ""
+        interval = self.per_host.get(host, self.min_interval)
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+class HttpPool:
+    """レート制限・リトライ付きの並列取得プール
+
+    Args:
+        fetch: URL → 本文 を返す関数
+        max_workers: 同時に実行するリクエスト数の上限
+        min_interval: 同一ホストへのリクエスト開始間隔（秒）
+        retries: 一時的なエラー（接続エラー・429・5xx）のリトライ回数
+        backoff: リトライ待ちの初期値（秒）。リトライごとに2倍
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], str],
+        max_workers: int = 4,
+        min_interval: float = 1.0,
+        retries: int = 2,
+        backoff: float = 2.0,
+        limiter: HostRateLimiter | None = None,
+    ):
+        self._fetch = fetch
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.limiter = limiter or HostRateLimiter(min_interval)
+
+    def fetch(self, url: str) -> str:
+        """1件取得する（レート制限・リトライ込み）"""
+        for attempt in range(self.retries + 1):
+            self.limiter.wait(url)
+            try:
+                return self._fetch(url)
+            except urllib.error.HTTPError as e:
+                if e.code not in RETRY_STATUS or attempt == self.retries:
+                    raise
+                logger.warning(f"HTTP {e.code} for {url} — retry {attempt + 1}/{self.retries}")
+            except urllib.error.URLError as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"{e.reason} for {url} — retry {attempt + 1}/{self.retries}")
+            time.sleep(self.backoff * (2**attempt))
+        raise AssertionError("unreachable")
+
+    def map(self, urls: Iterable[str]) -> Iterator[tuple[str, str | None, Exception | None]]:
+        """URL を並列に取得し、完了した順に (url, 本文, 例外) を返す。
+
+        未完了のリクエストは max_workers * 2 件までしか積まないので、
+        urls が巨大なジェネレータでもメモリを食わない。
+        """
+        urls = iter(urls)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {}
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < self.max_workers * 2:
+                    url = next(urls, None)
+                    if url is None:
+                        exhausted = True
+                        break
+                    pending[executor.submit(self.fetch, url)] = url
+                if not pending:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url = pending.pop(future)
+                    error = future.exception()
+                    yield url, (None if error else future.result()), error
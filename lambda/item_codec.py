@@ -0,0 +1,160 @@
+"""
+予想・結果アイテムのコンパクトなエンコード（schema_version 2）
+
+3連単の組み合わせは 6P3 = 120 通りなので 0〜119 のインデックスで表せる。
+買い目は (組み合わせインデックス 1 バイト + 金額 4 バイト) を並べた Binary 属性 1 つに詰め、
+レース単位で共通の値（着順・払戻金）はアイテム直下に1回だけ持つ。
+
+  v1（従来）: results = [{race_no, prediction, bet_amount, actual_result, payout_per_100, hit, return_amount}, ...]
+  v2        : schema_version=2, bets=<Binary>, actual_result, payout_per_100, hit_count, bet_count
+
+予想アイテムには odds_refresh 用に3連単オッズのスナップショット（odds3t = float32 × 120 の Binary）も持てる。
+朝に取得した出走表のテキスト（出走カード）は zlib で圧縮した Binary（pack_text）で持つ。
+
+読み出し側は decode_prediction() / decode_results() を通せば v1 / v2 のどちらでも従来と同じ形の
+dict / list が得られる。組み合わせとして解釈できない買い目を含む場合は v1 のまま保存する。
+"""
+
+import struct
+import zlib
+from decimal import Decimal
+from itertools import permutations
+
+SCHEMA_VERSION = 2
+
+# "1-2-3" ... "6-5-4" の 120 通り（辞書順）
+COMBINATIONS = ["-".join(str(b) for b in p) for p in permutations(range(1, 7), 3)]
+COMBINATION_INDEX = {combo: i for i, combo in enumerate(COMBINATIONS)}
+
+_BET = struct.Struct(">BI")  # 組み合わせインデックス, 金額（円）
+_ODDS = struct.Struct(f">{len(COMBINATIONS)}f")  # COMBINATIONS 順の3連単オッズ
+
+
+def to_dynamodb_value(value):
+    """float → Decimal を再帰的に変換する（JSON を経由しない）"""
+    if isinstance(value, float):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {k: to_dynamodb_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_dynamodb_value(v) for v in value]
+    return value
+
+
+# =============================================
+# 買い目のパック
+# =============================================
+def pack_bets(bets: list[tuple[str, int]]) -> bytes | None:
+    """(組み合わせ, 金額) の列を Binary に詰める。組み合わせとして解釈できなければ None"""
+    try:
+        return b"".join(_BET.pack(COMBINATION_INDEX[combo], int(amount)) for combo, amount in bets)
+    except (KeyError, struct.error):
+        return None
+
+
+def unpack_bets(data) -> list[tuple[str, int]]:
+    """pack_bets() の逆変換（boto3 の Binary 型もそのまま受け付ける）"""
+    raw = bytes(getattr(data, "value", data))
+    return [(COMBINATIONS[index], amount) for index, amount in _BET.iter_unpack(raw)]
+
+
+def pack_odds(odds: dict[str, float]) -> bytes:
+    """3連単オッズ（組み合わせ → 倍率）を COMBINATIONS 順に詰める（欠場・未発売は 0）"""
+    return _ODDS.pack(*(odds.get(combo, 0.0) for combo in COMBINATIONS))
+
+
+def unpack_odds(data) -> list[float]:
+    """pack_odds() の逆変換。COMBINATIONS と同じ順のリストを返す（オッズは小数1桁なので float32 の誤差を丸める）"""
+    return [round(v, 1) for v in _ODDS.unpack(bytes(getattr(data, "value", data)))]
+
+
+def pack_text(text: str) -> bytes:
+    """テキストを zlib で圧縮した Binary にする（出走カードなど）"""
+    return zlib.compress(text.encode("utf-8"), 9)
+
+
+def unpack_text(data) -> str:
+    """pack_text() の逆変換"""
+    return zlib.decompress(bytes(getattr(data, "value", data))).decode("utf-8")
+
+
+# =============================================
+# 予想アイテム
+# =============================================
+def encode_prediction(prediction: dict) -> dict:
+    """予想アイテムの属性（prediction 部分）を返す。v2 にできなければ従来の prediction マップ"""
+    bets = prediction.get("bets", [])
+    packed = pack_bets([(bet.get("combination", ""), bet.get("amount", 0)) for bet in bets])
+    if packed is None:
+        return {"prediction": to_dynamodb_value(prediction)}
+    return {
+        "schema_version": SCHEMA_VERSION,
+        "analysis": prediction.get("analysis", ""),
+        "bets": packed,
+        "reasonings": [bet.get("reasoning", "") for bet in bets],
+    }
+
+
+def decode_prediction(item: dict) -> dict:
+    """予想アイテムから従来形式の prediction（race_no / analysis / bets）を返す"""
+    if item.get("schema_version", 1) < 2:
+        return item["prediction"]
+    reasonings = item.get("reasonings", [])
+    return {
+        "race_no": int(item["race_no"]),
+        "analysis": item.get("analysis", ""),
+        "bets": [
+            {"combination": combo, "amount": amount, "reasoning": reasonings[i] if i < len(reasonings) else ""}
+            for i, (combo, amount) in enumerate(unpack_bets(item["bets"]))
+        ],
+    }
+
+
+# =============================================
+# 結果アイテム
+# =============================================
+def encode_results(results: list[dict]) -> dict:
+    """結果アイテムの属性（results 部分）を返す。v2 にできなければ従来の results リスト"""
+    packed = pack_bets([(r["prediction"], r["bet_amount"]) for r in results])
+    if packed is None or not results:
+        return {"results": to_dynamodb_value(results)}
+    return {
+        "schema_version": SCHEMA_VERSION,
+        "bets": packed,
+        "actual_result": results[0]["actual_result"],
+        "payout_per_100": results[0]["payout_per_100"],
+        "hit_count": sum(1 for r in results if r["hit"]),
+        "bet_count": len(results),
+    }
+
+
+def decode_results(item: dict) -> list[dict]:
+    """結果アイテムから従来形式の results リストを返す（的中・払戻額は着順と払戻金から復元）"""
+    if item.get("schema_version", 1) < 2:
+        return item.get("results", [])
+    race_no = int(item["race_no"])
+    actual = item["actual_result"]
+    payout = int(item["payout_per_100"])
+    results = []
+    for combo, amount in unpack_bets(item["bets"]):
+        hit = combo == actual
+        results.append(
+            {
+                "race_no": race_no,
+                "prediction": combo,
+                "bet_amount": amount,
+                "actual_result": actual,
+                "payout_per_100": payout,
+                "hit": hit,
+                "return_amount": (amount // 100) * payout if hit else 0,
+            }
+        )
+    return results
+
+
+def result_counts(item: dict) -> tuple[int, int]:
+    """結果アイテムの (的中数, 買い目数) を返す（v2 は買い目を展開せずに読める）"""
+    if item.get("schema_version", 1) >= 2:
+        return int(item["hit_count"]), int(item["bet_count"])
+    results = item.get("results", [])
+    return sum(1 for bet in results if bet["hit"]), len(results)
@@ -0,0 +1,68 @@
+"""
+pre_race の発火タイミングを実測の処理時間から決める
+
+pre_race / odds_refresh は処理時間（ページ取得 → 予想 → 通知）をハンドラの最後に記録する。
+朝の schedule はその p95 + 安全マージンを締切からの先行時間として使い、締切のぎりぎりまで
+直前情報・オッズの更新を待つ。サンプルが少ないうちは従来どおり締切10分前に発火する。
+
+記録アイテム（PK は選手番号、SK は latency#{mode}）:
+  samples       処理時間（ミリ秒）の配列。古い順、最大 MAX_SAMPLES 件
+  last_updated  最後に記録した日付
+"""
+
+import math
+
+LATENCY_PREFIX = "latency#"
+MIN_SAMPLES = 10  # これより少ない間は DEFAULT_LEAD_SECONDS を使う
+MAX_SAMPLES = 100  # 保持するサンプル数（超えた分は schedule で古い順に捨てる）
+PERCENTILE = 95
+DEFAULT_LEAD_SECONDS = 600  # 締切10分前（従来の固定値）
+MIN_LEAD_SECONDS = 180
+MAX_LEAD_SECONDS = 900
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """線形補間でパーセンタイルを求める"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def lead_seconds(samples: list[float], margin_seconds: float) -> int | None:
+    """締切の何秒前に発火すべきか（p95 + マージンを分単位に切り上げ、上下限で丸める）。
+
+    サンプルが MIN_SAMPLES 件に満たない場合は None を返す。
+    """
+    if len(samples) < MIN_SAMPLES:
+        return None
+    lead = percentile(samples, PERCENTILE) / 1000 + margin_seconds
+    lead = math.ceil(lead / 60) * 60
+    return max(MIN_LEAD_SECONDS, min(MAX_LEAD_SECONDS, lead))
+
+
+def record_sample(table, racer_no: str, mode: str, elapsed_ms: float, date: str) -> None:
+    """処理時間のサンプルを1件追記する"""
+    table.update_item(
+        Key={"racer_no": racer_no, "date_type": f"{LATENCY_PREFIX}{mode}"},
+        UpdateExpression="SET samples = list_append(if_not_exists(samples, :empty), :sample), last_updated = :date",
+        ExpressionAttributeValues={":empty": [], ":sample": [round(elapsed_ms)], ":date": date},
+    )
+
+
+def load_samples(table, racer_no: str, mode: str) -> list[float]:
+    """処理時間のサンプルを読み出す（MAX_SAMPLES を超えていれば古い分を削って書き戻す）"""
+    key = {"racer_no": racer_no, "date_type": f"{LATENCY_PREFIX}{mode}"}
+    item = table.get_item(Key=key).get("Item") or {}
+    samples = [float(v) for v in item.get("samples", [])]
+    if len(samples) > MAX_SAMPLES:
+        samples = samples[-MAX_SAMPLES:]
+        table.update_item(
+            Key=key,
+            UpdateExpression="SET samples = :samples",
+            ExpressionAttributeValues={":samples": [int(v) for v in samples]},
+        )
+    return samples
@@ -0,0 +1,89 @@
+"""
+CloudWatch Embedded Metric Format (EMF) によるメトリクス出力
+
+標準出力に EMF 形式の JSON を1行書くだけで、CloudWatch Logs 側でメトリクスに変換される
+（PutMetricData の API 呼び出しは不要）。
+
+ハンドラ開始時に set_dimensions(Mode=..., Venue=...) で呼び出し単位のディメンションを設定し、
+各ステージは timed() / emit() で出力する。ステージ別の集計は scripts/stage_report.py で行う。
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "BoatRaceScraper")
+
+# 呼び出し単位のディメンション（Mode / Venue）
+_dimensions: dict[str, str] = {}
+
+
+def set_dimensions(**dimensions: str) -> None:
+    """呼び出し単位のディメンションを設定する（既存の値は置き換える）"""
+    _dimensions.clear()
+    update_dimensions(**dimensions)
+
+
+def update_dimensions(**dimensions: str) -> None:
+    """呼び出し単位のディメンションを追加・更新する（会場名が途中で判明した場合など）"""
+    _dimensions.update({k: str(v) for k, v in dimensions.items() if v is not None})
+
+
+def get_dimension(name: str, default: str = "") -> str:
+    """呼び出し単位のディメンションの現在値を返す"""
+    return _dimensions.get(name, default)
+
+
+def emit(metrics: dict[str, tuple[float, str]], properties: dict | None = None, **dimensions: str) -> None:
+    """メトリクスを EMF レコードとして1行出力する。
+
+    Args:
+        metrics: メトリクス名 → (値, 単位)。単位は Milliseconds / Bytes / Count など
+        properties: メトリクスにしない付加情報（ログ検索用）
+        dimensions: このレコードだけに付けるディメンション（PageType など）
+    """
+    dims = {**_dimensions, **{k: str(v) for k, v in dimensions.items() if v is not None}}
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [sorted(dims)],
+                    "Metrics": [{"Name": name, "Unit": unit} for name, (_, unit) in metrics.items()],
+                }
+            ],
+        },
+        **dims,
+        **(properties or {}),
+    }
+    for name, (value, _) in metrics.items():
+        record[name] = value
+    print(json.dumps(record, ensure_ascii=False), flush=True)
+
+
+@contextmanager
+def timed(metric_name: str, **dimensions: str):
+    """with ブロックの所要時間を metric_name (Milliseconds) として出力する。
+
+    yield した dict に値を入れるとプロパティとして一緒に出力される。
+    数値を (値, 単位) のタプルで入れた場合は追加のメトリクスとして出力される。
+    """
+    extra: dict = {}
+    start = time.perf_counter()
+    try:
+        yield extra
+    except Exception as e:
+        extra["error"] = type(e).__name__
+        raise
+    finally:
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+        metrics = {metric_name: (elapsed_ms, "Milliseconds")}
+        properties = {}
+        for key, value in extra.items():
+            if isinstance(value, tuple):
+                metrics[key] = value
+            else:
+                properties[key] = value
+        emit(metrics, properties, **dimensions)
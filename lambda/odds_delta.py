@@ -0,0 +1,80 @@
+"""
+締切直前のオッズ変動の判定と買い目の再配分（odds_refresh 用、LLM は呼ばない）
+
+pre_race で保存した3連単オッズのスナップショット（item_codec.pack_odds）と、odds_refresh で
+取り直したオッズを COMBINATIONS 順のリストで受け取り、120 通り・買い目ごとに Python のループで比較する
+（numpy は Lambda のバンドルに入れておらず、この件数ならループで足りる）。
+
+- 買い目のオッズが ODDS_CHANGE_THRESHOLD 以上動いた、または
+- 120 通り全体の支持率（1/オッズを正規化したもの）の総変動距離が SHIFT_THRESHOLD 以上
+のときだけ「大きく動いた」とみなし、買い目はそのままで金額だけを配分し直す。
+"""
+
+from item_codec import COMBINATION_INDEX
+
+ODDS_CHANGE_THRESHOLD = 0.25  # 買い目のオッズの変化率
+SHIFT_THRESHOLD = 0.08  # 支持率分布の総変動距離（0〜1）
+BET_UNIT = 100  # 円
+
+
+def implied_distribution(odds: list[float]) -> list[float]:
+    """オッズの配列を支持率（1/オッズ を合計 1 に正規化）に変換する。0 は発売なし扱い"""
+    inverse = [1.0 / o if o > 0 else 0.0 for o in odds]
+    total = sum(inverse)
+    return [v / total for v in inverse] if total else inverse
+
+
+def compare(old: list[float], new: list[float], combinations: list[str]) -> dict:
+    """スナップショットと最新オッズを比較する。
+
+    Returns:
+        {"shift": 支持率分布の総変動距離, "max_change": 買い目の最大変化率,
+         "moved": [(組み合わせ, 旧オッズ, 新オッズ), ...], "material": 予想を更新すべきか}
+    """
+    shift = 0.5 * sum(abs(a - b) for a, b in zip(implied_distribution(old), implied_distribution(new)))
+    moved = []
+    max_change = 0.0
+    for combo in combinations:
+        index = COMBINATION_INDEX.get(combo)
+        if index is None:
+            continue
+        before, after = old[index], new[index]
+        if before > 0 and after > 0:
+            change = abs(after - before) / before
+        else:
+            change = 0.0 if before == after else 1.0  # 欠場・発売中止
+        max_change = max(max_change, change)
+        if change >= ODDS_CHANGE_THRESHOLD:
+            moved.append((combo, before, after))
+    return {
+        "shift": shift,
+        "max_change": max_change,
+        "moved": moved,
+        "material": bool(moved) or shift >= SHIFT_THRESHOLD,
+    }
+
+
+def reallocate(bets: list[dict], old: list[float], new: list[float]) -> list[dict]:
+    """元の配分で想定していた払戻（金額 × 旧オッズ）を新オッズでも保つように金額を配分し直す。
+
+    合計金額は元と同じで 100 円単位（最大剰余方式）。新オッズが 0（欠場など）や
+    配分が 100 円に満たない買い目は外す。
+    """
+    total_units = sum(int(bet["amount"]) for bet in bets) // BET_UNIT
+    weights = []
+    for bet in bets:
+        index = COMBINATION_INDEX.get(bet["combination"])
+        if index is None or old[index] <= 0 or new[index] <= 0:
+            weights.append(0.0)
+        else:
+            weights.append(int(bet["amount"]) * old[index] / new[index])
+    weight_sum = sum(weights)
+    if not weight_sum or not total_units:
+        return bets
+
+    shares = [total_units * w / weight_sum for w in weights]
+    units = [int(share) for share in shares]
+    by_remainder = sorted(range(len(bets)), key=lambda i: shares[i] - units[i], reverse=True)
+    for i in by_remainder[: total_units - sum(units)]:
+        units[i] += 1
+    return [{**bet, "amount": n * BET_UNIT} for bet, n in zip(bets, units) if n > 0]
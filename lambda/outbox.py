@@ -0,0 +1,66 @@
+"""
+Discord 通知のアウトボックス — ハンドラは SQS に積むだけにして、送信は dispatcher.py に任せる
+
+OUTBOX_QUEUE_URL が設定されていればメッセージを SQS に送信して即座に戻る
+（Discord の応答待ちでハンドラの実行時間が延びない）。未設定ならその場で直接送信する。
+"""
+
+import json
+import logging
+import os
+import time
+
+import boto3
+
+import discord_delivery
+from metrics import timed
+
+logger = logging.getLogger()
+
+OUTBOX_QUEUE_URL = os.environ.get("OUTBOX_QUEUE_URL", "")
+
+_sqs_client = None
+
+
+def _sqs():
+    global _sqs_client
+    if _sqs_client is None:
+        _sqs_client = boto3.client("sqs")
+    return _sqs_client
+
+
+def requeue(webhook_url: str, text: str, kind: str = "", enqueued_at: float | None = None) -> bool:
+    """送り残した部分だけを積み直す（dispatcher 用。直接送信はせず、積めなければ False）"""
+    if not OUTBOX_QUEUE_URL:
+        return False
+    body = json.dumps(
+        {"webhook_url": webhook_url, "text": text, "kind": kind, "enqueued_at": enqueued_at or time.time()}
+    )
+    with timed("OutboxEnqueueDuration") as m:
+        m["kind"] = kind
+        m["requeue"] = True
+        try:
+            _sqs().send_message(QueueUrl=OUTBOX_QUEUE_URL, MessageBody=body)
+            return True
+        except Exception as e:
+            m["error"] = type(e).__name__
+            logger.error(f"Failed to requeue undelivered Discord message: {e}")
+            return False
+
+
+def enqueue(webhook_url: str, text: str, kind: str = "") -> None:
+    """メッセージをアウトボックスに積む（キュー未設定・送信失敗時は直接送信する）"""
+    if not OUTBOX_QUEUE_URL:
+        discord_delivery.deliver(webhook_url, text)
+        return
+
+    body = json.dumps({"webhook_url": webhook_url, "text": text, "kind": kind, "enqueued_at": time.time()})
+    with timed("OutboxEnqueueDuration") as m:
+        m["kind"] = kind
+        try:
+            _sqs().send_message(QueueUrl=OUTBOX_QUEUE_URL, MessageBody=body)
+            return
+        except Exception as e:
+            m["error"] = type(e).__name__
+            logger.error(f"Failed to enqueue Discord message, sending directly: {e}")
+    discord_delivery.deliver(webhook_url, text)
@@ -0,0 +1,255 @@
+"""
+LLM の予想出力から JSON オブジェクトを取り出し、スキーマを検証・修復する
+
+モデルの出力は JSON だけとは限らない（```json のコードブロック、前後の説明文、説明文中の {…}、
+max_tokens での打ち切りなど）。ObjectExtractor は文字列を先頭から1回だけ走査し、文字列リテラルと
+括弧の深さを追ってトップレベルの {…} が閉じるたびに json.loads する。チャンク単位で feed() できるので
+ストリーミング応答にもそのまま使える。閉じないまま終わったオブジェクトは finish() で、直前の区切り
+（, や閉じ括弧）まで戻して括弧を補って読めるところまで復元する。読めなかった候補（説明文中の { や
+閉じない " に本物のオブジェクトが飲み込まれた場合など）は、その { の次の文字から読み直す。
+
+検証するスキーマ:
+  race_no   整数（期待するレース番号と一致）
+  bets      1件以上。combination は "X-Y-Z"（1〜6 の異なる数字）、amount は 100 円単位の正の整数
+  合計金額   予算と一致
+
+repair() は組み合わせの表記揺れ（全角数字・全角ハイフン・"132" など）を直し、不正な買い目を外し、
+重複をまとめ、金額を予算に合わせて 100 円単位で按分し直す（最大剰余方式）。
+"""
+
+import json
+import math
+import re
+import unicodedata
+
+BET_UNIT = 100  # 円
+REPAIR_LOOKBACK = 64  # 打ち切られたオブジェクトの復元で試す区切りの数（新しい順）
+
+_CLOSERS = {"{": "}", "[": "]"}
+_COMBINATION_PATTERN = re.compile(r"([1-6])\s*[-‐‑‒–—―−ー]?\s*([1-6])\s*[-‐‑‒–—―−ー]?\s*([1-6])")
+_AMOUNT_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+
+class ObjectExtractor:
+    """文字列を少しずつ受け取り、トップレベルの JSON オブジェクトが閉じるたびに dict を返す"""
+
+    def __init__(self):
+        self.recovered = False  # finish() が括弧を補って復元したか
+        self._reset()
+
+    def feed(self, chunk: str) -> list[dict]:
+        """チャンクを追加し、このチャンクで閉じたオブジェクトを返す"""
+        found = []
+        text = chunk
+        while text is not None:
+            text = self._scan(text, found)
+        return found
+
+    def finish(self) -> list[dict]:
+        """入力の終わりで閉じていないオブジェクトを、読める範囲まで括弧を補って返す"""
+        found = []
+        while self._stack:
+            candidate = "".join(self._parts)
+            attempts = [(len(candidate), tuple(self._stack))] if not self._in_string else []
+            attempts += self._safe_points[::-1][:REPAIR_LOOKBACK]
+            self._reset()
+            for end, stack in attempts:
+                obj = self._decode(candidate[:end].rstrip().rstrip(",") + "".join(_CLOSERS[b] for b in reversed(stack)))
+                if isinstance(obj, dict):
+                    self.recovered = True
+                    return found + [obj]
+            # 説明文の閉じない { だった。その次の文字から読み直す
+            found += self.feed(candidate[1:])
+        return found
+
+    def _scan(self, text: str, found: list[dict]) -> str | None:
+        """text を読み進める。候補が読めなかったときは、その { の次の文字から読み直す残りの文字列を返す"""
+        start = 0  # text のうち現在の候補にまだ追加していない部分の先頭
+        for i, ch in enumerate(text):
+            if not self._stack:
+                if ch == "{":
+                    self._stack.append(ch)
+                    start = i
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch in _CLOSERS:
+                self._stack.append(ch)
+            elif ch in "}]":
+                if _CLOSERS[self._stack[-1]] == ch:
+                    self._stack.pop()
+                    if self._stack:
+                        self._safe_points.append((self._length + i - start + 1, tuple(self._stack)))
+                        continue
+                    candidate = "".join(self._parts) + text[start : i + 1]
+                    obj = self._decode(candidate)
+                    if isinstance(obj, dict):
+                        found.append(obj)
+                        self._reset()
+                        continue
+                else:
+                    candidate = "".join(self._parts) + text[start : i + 1]
+                # 括弧の対応が崩れたか JSON として読めない（説明文中の { など）
+                self._reset()
+                return candidate[1:] + text[i + 1 :]
+            elif ch == ",":
+                self._safe_points.append((self._length + i - start, tuple(self._stack)))
+        if self._stack:
+            self._parts.append(text[start:])
+            self._length += len(text) - start
+        return None
+
+    def _reset(self) -> None:
+        self._parts: list[str] = []  # 現在のオブジェクト候補（先頭の { から）
+        self._length = 0
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escape = False
+        # 打ち切られたときに戻れる位置（候補内の位置, その時点の括弧スタック）
+        self._safe_points: list[tuple[int, tuple[str, ...]]] = []
+
+    @staticmethod
+    def _decode(text: str):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return None
+
+
+def extract_objects(text: str) -> list[dict]:
+    """テキスト中のトップレベルの JSON オブジェクトを出現順に返す（最後の打ち切られたものも含む）"""
+    extractor = ObjectExtractor()
+    return extractor.feed(text) + extractor.finish()
+
+
+def normalize_combination(value) -> str | None:
+    """組み合わせを "X-Y-Z" に揃える（1〜6 の異なる3つの数字でなければ None）"""
+    text = unicodedata.normalize("NFKC", str(value)).strip()
+    m = _COMBINATION_PATTERN.fullmatch(text)
+    if not m or len(set(m.groups())) != 3:
+        return None
+    return "-".join(m.groups())
+
+
+def _to_amount(value) -> int | None:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value) if math.isfinite(value) and value > 0 else None
+    m = _AMOUNT_PATTERN.search(unicodedata.normalize("NFKC", str(value)).replace(",", ""))
+    return int(float(m.group())) if m and float(m.group()) > 0 else None
+
+
+def validate(prediction: dict, race_no: int | None = None, budget: int | None = None) -> list[str]:
+    """スキーマ違反を列挙する（空なら正しい）"""
+    errors = []
+    if not isinstance(prediction.get("race_no"), int) or isinstance(prediction.get("race_no"), bool):
+        errors.append("race_no is not an integer")
+    elif race_no is not None and prediction["race_no"] != race_no:
+        errors.append(f"race_no {prediction['race_no']} != {race_no}")
+    bets = prediction.get("bets")
+    if not isinstance(bets, list) or not bets:
+        return errors + ["bets is empty"]
+    total = 0
+    for i, bet in enumerate(bets):
+        if not isinstance(bet, dict):
+            errors.append(f"bets[{i}] is not an object")
+            continue
+        if normalize_combination(bet.get("combination", "")) != bet.get("combination"):
+            errors.append(f"bets[{i}].combination {bet.get('combination')!r} is invalid")
+        amount = bet.get("amount")
+        if not isinstance(amount, int) or isinstance(amount, bool) or amount <= 0 or amount % BET_UNIT:
+            errors.append(f"bets[{i}].amount {amount!r} is not a positive multiple of {BET_UNIT}")
+        else:
+            total += amount
+    if budget is not None and not errors and total != budget:
+        errors.append(f"total {total} != budget {budget}")
+    return errors
+
+
+def allocate(weights: list[float], budget: int) -> list[int]:
+    """予算を重みに比例して 100 円単位で配分する（最大剰余方式、合計は予算の 100 円未満切り捨て）"""
+    total_units = budget // BET_UNIT
+    weight_sum = sum(weights)
+    if not weight_sum:
+        weights, weight_sum = [1.0] * len(weights), float(len(weights))
+    shares = [total_units * w / weight_sum for w in weights]
+    units = [int(share) for share in shares]
+    by_remainder = sorted(range(len(weights)), key=lambda i: shares[i] - units[i], reverse=True)
+    for i in by_remainder[: total_units - sum(units)]:
+        units[i] += 1
+    return [n * BET_UNIT for n in units]
+
+
+def repair(prediction: dict, race_no: int, budget: int) -> tuple[dict, list[str]]:
+    """スキーマに合うように直した予想と、行った修復の一覧を返す（有効な買い目がなければ ValueError）"""
+    repairs = []
+    if prediction.get("race_no") != race_no or isinstance(prediction.get("race_no"), bool):
+        repairs.append(f"race_no {prediction.get('race_no')!r} -> {race_no}")
+
+    merged: dict[str, dict] = {}
+    bets = prediction.get("bets")
+    for bet in bets if isinstance(bets, list) else []:
+        if not isinstance(bet, dict):
+            repairs.append("dropped non-object bet")
+            continue
+        combination = normalize_combination(bet.get("combination", ""))
+        if combination is None:
+            repairs.append(f"dropped bet {bet.get('combination')!r}")
+            continue
+        if combination != bet.get("combination"):
+            repairs.append(f"combination {bet.get('combination')!r} -> {combination}")
+        amount = _to_amount(bet.get("amount"))
+        if combination in merged:
+            repairs.append(f"merged duplicate {combination}")
+            merged[combination]["amount"] += amount or 0
+            continue
+        merged[combination] = {
+            "combination": combination,
+            "amount": amount or 0,
+            "reasoning": str(bet.get("reasoning") or ""),
+        }
+    if not merged:
+        raise ValueError("Bedrock応答に有効な買い目がありません")
+
+    bets = list(merged.values())
+    amounts = [bet["amount"] for bet in bets]
+    if sum(amounts) != budget or any(a % BET_UNIT for a in amounts) or not all(amounts):
+        repairs.append(f"amounts {amounts} rescaled to {budget}")
+        for bet, amount in zip(bets, allocate([float(a) for a in amounts], budget)):
+            bet["amount"] = amount
+        bets = [bet for bet in bets if bet["amount"] > 0]
+
+    return {"race_no": race_no, "analysis": str(prediction.get("analysis") or ""), "bets": bets}, repairs
+
+
+def parse_prediction(text: str, race_no: int, budget: int) -> tuple[dict, list[str]]:
+    """モデルの出力から予想を取り出す。bets を持つ最初のオブジェクトを修復して返す
+
+    Returns:
+        (予想, 行った修復の一覧)
+    """
+    extractor = ObjectExtractor()
+    complete = extractor.feed(text)
+    truncated = extractor.finish()
+    errors = []
+    for obj in complete + truncated:
+        if "bets" not in obj:
+            continue
+        try:
+            prediction, repairs = repair(obj, race_no, budget)
+        except ValueError as e:
+            errors.append(str(e))
+            continue
+        if extractor.recovered and obj in truncated:
+            repairs.insert(0, "recovered truncated object")
+        return prediction, repairs
+    raise ValueError(f"Bedrock応答のJSON解析に失敗しました: {'; '.join(errors) or 'no object with bets'}")
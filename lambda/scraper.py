@@ -4,26 +4,60 @@
 schedule  (JST 8:00): kyoteibiyori.com で出走予定取得
                       → 出走情報を Discord 通知
                       → レースごとに EventBridge Scheduler で pre_race / post_race を動的作成
-pre_race  (締切10分前): boatrace.jp で出走表・直前情報・オッズ取得
+                      → 全レースの出走表を並列に取得し、出走カードとして DynamoDB に保存
+pre_race  (締切10分前、処理時間の実測があれば p95 + マージン前):
+                       保存済みの出走カード（なければ出走表を取得）＋ boatrace.jp で直前情報・オッズ取得
                        → Bedrock Claude で3連単予想＋資金配分生成
-                       → DynamoDB 保存 → Discord 通知
-post_race (締切20分後): boatrace.jp で個別レース結果取得
+                       → DynamoDB 保存 → Discord 通知 → 処理時間を記録（latency_model.py）
+odds_refresh (ODDS_REFRESH_ENABLED 時、締切直前): 3連単オッズだけ取り直して pre_race 時点と比較
+                       → 大きく動いていれば金額を配分し直して Discord 通知（LLM は呼ばない）
+post_race (締切5分後): boatrace.jp で個別レース結果取得（条件付き GET）
+                       → 結果がまだなら 15秒・30秒後に取り直し、それでもなければ間隔を倍々にして自分を予約し直す
                        → 的中判定＋収支計算
                        → DynamoDB 保存 → Discord 通知
+                       → 日・月・会場・コース別の集計アイテムに加算（stats.py）
                        → 最終レースなら累計収支更新
+
+venue_schedule (VENUE_CODES の会場ごとに JST 8:05): boatrace.jp の会場別レース一覧から全レースの締切を取得
+                       → 会場で名前空間を分けた pre_race / post_race を作成（PK は venue#{jcd}）
+                       → 発火時刻を過ぎたレースはその場でまとめて予想（predict_races）
+venue_predict (手動): 会場の締切前の全レースを、並列取得＋上限付きの並列 Bedrock 呼び出しでまとめて予想
+digest   (JST 21:30): 全24会場の結果一覧を並列取得 → 1号艇の1着率・高配当などを集計（digest.py）→ Discord 通知
+settle   (JST 23:30): 結果一覧1ページで、その日の未精算の予想をまとめて照合・保存 → Discord 通知
+                       （post_race の取りこぼしを回収する。会場モードは scope=venue）
+
+その日の間変わらないデータ（スケジュール・出走表）はウォームコンテナで使い回す（warm_cache.py）。
+
+各ステージ（ページ取得・パース・Bedrock・DynamoDB・Discord）の所要時間は
+metrics.py 経由で CloudWatch EMF として出力する（ディメンション: Mode / Venue / PageType）。
 """
 
+import hashlib
 import json
 import logging
 import os
 import re
 import time
+import urllib.error
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone, timedelta
-from decimal import Decimal
 from html.parser import HTMLParser
 
 import boto3
+from botocore.config import Config
+
+import bedrock_governor
+import digest
+import http_pool
+import item_codec
+import latency_model
+import odds_delta
+import outbox
+import prediction_parser
+import stats
+import warm_cache
+from metrics import emit, get_dimension, set_dimensions, timed, update_dimensions
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -34,6 +68,23 @@ RACER_NO = os.environ.get("RACER_NO", "3941")
 DYNAMODB_TABLE = os.environ.get("DYNAMODB_TABLE", "BoatRacePredictions")
 SCHEDULER_ROLE_ARN = os.environ.get("SCHEDULER_ROLE_ARN", "")
 SCHEDULER_GROUP_NAME = os.environ.get("SCHEDULER_GROUP_NAME", "boat-race-schedules")
+SCHEDULER_MAX_WORKERS = 8  # スケジュール作成・更新・削除の並列数
+CARD_PREFETCH_WORKERS = 4  # 朝の出走表取得の並列数
+CARD_PREFETCH_INTERVAL = 0.5  # 朝の出走表取得で boatrace.jp へのリクエスト開始間隔（秒）
+CARD_TTL_SECONDS = 2 * 86400  # 出走カードはその日しか使わないので TTL で消す
+VENUE_BEDROCK_WORKERS = int(os.environ.get("VENUE_BEDROCK_WORKERS", "3"))  # 会場モードで同時に走らせる予想の数
+VENUE_PARTITION_PREFIX = "venue#"  # 会場モードの DynamoDB パーティションキー（venue#{jcd}）
+# pre_race の発火タイミング: 実測処理時間の p95 にこの秒数を足した分だけ締切より前に発火する
+PRE_RACE_SAFETY_MARGIN = int(os.environ.get("PRE_RACE_SAFETY_MARGIN", "120"))
+# true なら締切直前にもう一度オッズを取り直す odds_refresh スケジュールも作る
+ODDS_REFRESH_ENABLED = os.environ.get("ODDS_REFRESH_ENABLED", "false").lower() == "true"
+ODDS_REFRESH_MIN_GAP = 60  # odds_refresh は pre_race よりこの秒数以上遅い場合だけ作る
+# post_race は締切のこの分数後に発火し、結果がまだなければ間隔を倍々にして取り直す
+RESULT_FIRST_POLL_MINUTES = 5
+RESULT_INLINE_POLL_DELAYS = (15, 30)  # 同じ呼び出しの中で取り直すまでの待ち（秒）
+RESULT_RETRY_BASE_SECONDS = 120  # 呼び出しをやり直すときの最初の間隔（以降2倍）
+RESULT_RETRY_MAX_SECONDS = 1800
+RESULT_MAX_RETRIES = 8  # これを超えても結果が出なければ諦めて通知する（おおよそ締切から2.5時間）
 # SCRAPER_FUNCTION_ARN は handler() で context.invoked_function_arn から設定される
 # (CDK で自身の ARN を環境変数に入れると CloudFormation の循環参照になるため)
 SCRAPER_FUNCTION_ARN = ""
@@ -41,7 +92,20 @@ SCRAPER_FUNCTION_ARN = ""
 # --- 定数 ---
 RACE_BUDGET = 5000  # 1レースあたりの予算（円）
 JST = timezone(timedelta(hours=9))
-MODEL_ID = "us.anthropic.claude-sonnet-4-6"
+MODEL_ID = os.environ.get("MODEL_ID", "us.anthropic.claude-sonnet-4-6")
+# MODEL_ID がスロットリング・タイムアウトで失敗したときに使うモデル（空ならフォールバックしない）
+FALLBACK_MODEL_ID = os.environ.get("FALLBACK_MODEL_ID", "us.anthropic.claude-haiku-4-5-20251001-v1:0")
+# フォールバックする一時的なエラー（例外クラス名・ClientError のコード）
+RETRYABLE_BEDROCK_ERRORS = {
+    "ThrottlingException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+    "ReadTimeoutError",
+    "ConnectTimeoutError",
+    "EndpointConnectionError",
+    "BedrockBusyError",  # bedrock_governor の予算待ちが上限を超えた（別モデルは別枠）
+}
 KYOTEIBIYORI_BASE = "https://kyoteibiyori.com/racer/racer_no"
 BOATRACE_BASE = "https://www.boatrace.jp/owpc/pc/race"
 _USER_AGENT = (
@@ -75,11 +139,26 @@ VENUE_CODE_MAP = {
     "大村": "24",
 }
 
+VENUE_NAME_BY_CODE = {jcd: name for name, jcd in VENUE_CODE_MAP.items()}
+
 # --- AWS クライアント ---
 dynamodb = boto3.resource("dynamodb")
 db_table = dynamodb.Table(DYNAMODB_TABLE)
-bedrock = boto3.client("bedrock-runtime", region_name="us-east-1")
+# スロットリングのリトライは bedrock_governor がジッター付きで行うので、boto3 側では呼び直さない
+bedrock = boto3.client(
+    "bedrock-runtime", region_name="us-east-1", config=Config(retries={"mode": "standard", "max_attempts": 1})
+)
 scheduler_client = boto3.client("scheduler", region_name="us-east-1")
+# Agent と共有する Bedrock の分単位の予算（bedrock_governor.py）
+governor = bedrock_governor.BedrockGovernor(db_table)
+# ウォームコンテナで使い回すその日の静的データ（warm_cache.py）
+cache = warm_cache.WarmCache()
+# boatrace.jp へのリクエスト開始間隔を、同じ呼び出しの中のすべての並列取得で共有する（handler() が呼び出しごとに作り直す）
+boatrace_limiter = http_pool.HostRateLimiter(CARD_PREFETCH_INTERVAL)
+
+# 予想・結果・スケジュールを保存する DynamoDB のパーティションキー。
+# 選手モードは RACER_NO、会場モード（scope: "venue"）は venue#{jcd}。handler() が呼び出しごとに設定する
+partition_key = RACER_NO
 
 
 # =============================================
@@ -498,9 +577,141 @@ class RaceResultParser(HTMLParser):
                     pass
 
 
+# =============================================
+# HTML Parser — boatrace.jp 3連単オッズページ
+# =============================================
+class Odds3tParser(HTMLParser):
+    """boatrace.jp の odds3t ページから3連単120通りのオッズを抽出する。
+
+    対象URL: /owpc/pc/race/odds3t?rno={rno}&jcd={jcd}&hd={YYYYMMDD}
+
+    HTML構造:
+    列は1着艇（1〜6）ごとに3セル。各 <tr> で1着艇ごとに
+    - <td rowspan="4">N</td> → 2着艇（4行ごとの先頭行のみ）
+    - <td class="is-boatColorN">N</td> → 3着艇
+    - <td class="oddsPoint">XX.X</td> → オッズ（欠場などは数値以外）
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._in_tbody = False
+        self._cell: dict | None = None
+        self._cells: list[dict] = []
+        self._seconds: dict[int, str] = {}
+
+        self.odds: dict[str, float] = {}
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "tbody":
+            self._in_tbody = True
+        elif tag == "tr" and self._in_tbody:
+            self._cells = []
+        elif tag == "td" and self._in_tbody:
+            attr_dict = dict(attrs)
+            self._cell = {"class": attr_dict.get("class") or "", "rowspan": "rowspan" in attr_dict, "text": ""}
+
+    def handle_endtag(self, tag):
+        if tag == "td" and self._cell is not None:
+            self._cells.append(self._cell)
+            self._cell = None
+        elif tag == "tr" and self._in_tbody:
+            self._read_row()
+        elif tag == "tbody":
+            self._in_tbody = False
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell["text"] += data.strip()
+
+    def _read_row(self):
+        if not any("oddsPoint" in c["class"] for c in self._cells):
+            return
+        first, i = 1, 0
+        while i + 1 < len(self._cells) and first <= 6:
+            if self._cells[i]["rowspan"]:
+                self._seconds[first] = self._cells[i]["text"]
+                i += 1
+                continue
+            third, point = self._cells[i]["text"], self._cells[i + 1]
+            i += 2
+            if "oddsPoint" not in point["class"]:
+                break
+            try:
+                value = float(point["text"].replace(",", ""))
+            except ValueError:
+                value = 0.0
+            self.odds[f"{first}-{self._seconds.get(first, '')}-{third}"] = value
+            first += 1
+
+
+# =============================================
+# HTML Parser — boatrace.jp 会場別レース一覧ページ
+# =============================================
+class RaceIndexParser(HTMLParser):
+    """boatrace.jp の raceindex ページから、その日の全レースの番号と締切予定時刻を抽出する。
+
+    対象URL: /owpc/pc/race/raceindex?jcd={jcd}&hd={YYYYMMDD}
+
+    HTML構造:
+    - <div class="heading2_title"><h2>大会名</h2> → 大会タイトル
+    - 各レースの <tr> に <a href="...?rno=N&..."> と締切予定時刻のセル（"10:52"）
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._in_title = False
+        self._in_h2 = False
+        self._in_tr = False
+        self._row_rno: int | None = None
+        self._row_texts: list[str] = []
+
+        self.race_title = ""
+        self.races: list[dict] = []
+
+    def handle_starttag(self, tag, attrs):
+        attr_dict = dict(attrs)
+        if tag == "div" and "heading2_title" in (attr_dict.get("class") or ""):
+            self._in_title = True
+        elif tag == "h2" and self._in_title:
+            self._in_h2 = True
+        elif tag == "tr":
+            self._in_tr = True
+            self._row_rno = None
+            self._row_texts = []
+        elif tag == "a" and self._in_tr and self._row_rno is None:
+            m = re.search(r"[?&]rno=(\d{1,2})", attr_dict.get("href") or "")
+            if m:
+                self._row_rno = int(m.group(1))
+
+    def handle_endtag(self, tag):
+        if tag == "h2" and self._in_h2:
+            self._in_h2 = False
+            self._in_title = False
+        elif tag == "tr" and self._in_tr:
+            self._in_tr = False
+            deadline = next((t for t in self._row_texts if re.fullmatch(r"\d{1,2}:\d{2}", t)), None)
+            if self._row_rno is not None and deadline and all(r["race_no"] != self._row_rno for r in self.races):
+                self.races.append({"race_no": self._row_rno, "deadline": deadline})
+
+    def handle_data(self, data):
+        text = data.strip()
+        if self._in_h2:
+            self.race_title += text
+        elif self._in_tr and text:
+            self._row_texts.append(text)
+
+
 # =============================================
 # HTTP ユーティリティ
 # =============================================
+def page_type_of(url: str) -> str:
+    """URLからメトリクス用のページ種別を返す (racelist / beforeinfo / oddstf / raceresult / racer ...)"""
+    if url.startswith(KYOTEIBIYORI_BASE):
+        return "racer"
+    path = url.split("?", 1)[0]
+    return path.rstrip("/").rsplit("/", 1)[-1] or "unknown"
+
+
 def fetch_page(url: str) -> str:
     """任意のURLからHTMLを取得する"""
     req = urllib.request.Request(
@@ -511,8 +722,48 @@ def fetch_page(url: str) -> str:
             "Accept-Language": "ja,en;q=0.9",
         },
     )
-    with urllib.request.urlopen(req, timeout=20) as response:
-        return response.read().decode("utf-8")
+    with timed("FetchDuration", PageType=page_type_of(url)) as m:
+        with urllib.request.urlopen(req, timeout=20) as response:
+            body = response.read()
+        m["BytesFetched"] = (len(body), "Bytes")
+        m["url"] = url
+    return body.decode("utf-8")
+
+
+def fetch_page_if_modified(url: str, validators: dict | None = None) -> tuple[str | None, dict]:
+    """条件付き GET で取得する。前回から変わっていなければ (None, validators) を返す。
+
+    validators は前回のレスポンスの {"etag": ..., "last_modified": ...}（なければ通常の GET）。
+    """
+    validators = validators or {}
+    headers = {
+        "User-Agent": _USER_AGENT,
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": "ja,en;q=0.9",
+    }
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    req = urllib.request.Request(url, headers=headers)
+    with timed("FetchDuration", PageType=page_type_of(url)) as m:
+        m["url"] = url
+        try:
+            with urllib.request.urlopen(req, timeout=20) as response:
+                body = response.read()
+                response_headers = response.headers
+        except urllib.error.HTTPError as e:
+            if e.code != 304:
+                raise
+            m["not_modified"] = True
+            m["BytesFetched"] = (0, "Bytes")
+            return None, validators
+        m["BytesFetched"] = (len(body), "Bytes")
+    new_validators = {
+        "etag": response_headers.get("ETag") or "",
+        "last_modified": response_headers.get("Last-Modified") or "",
+    }
+    return body.decode("utf-8"), new_validators
 
 
 def fetch_racer_page(racer_no: str) -> str:
@@ -522,10 +773,15 @@ def fetch_racer_page(racer_no: str) -> str:
 
 def fetch_and_extract_text(url: str, max_length: int = 6000) -> str:
     """URLのHTMLを取得してテキストに変換する"""
-    html = fetch_page(url)
-    extractor = _HTMLTextExtractor()
-    extractor.feed(html)
-    text = extractor.get_text()
+    return extract_text(fetch_page(url), url, max_length)
+
+
+def extract_text(html: str, url: str, max_length: int = 6000) -> str:
+    """取得済みのHTMLをテキストに変換する（url はメトリクスのページ種別用）"""
+    with timed("ParseDuration", PageType=page_type_of(url)):
+        extractor = _HTMLTextExtractor()
+        extractor.feed(html)
+        text = extractor.get_text()
     if len(text) > max_length:
         text = text[:max_length] + "\n...(以下省略)"
     return text
@@ -577,12 +833,56 @@ def parse_race_result(html: str) -> dict:
     }
 
 
+def parse_odds3t(html: str) -> dict[str, float]:
+    """boatrace.jp 3連単オッズHTMLをパースして {組み合わせ: オッズ} を返す（組み合わせとして不正な行は除く）"""
+    parser = Odds3tParser()
+    parser.feed(html)
+    return {combo: odds for combo, odds in parser.odds.items() if combo in item_codec.COMBINATION_INDEX}
+
+
+def parse_race_index(html: str) -> dict:
+    """boatrace.jp 会場別レース一覧HTMLをパースして大会タイトルと全レースの締切予定時刻を返す"""
+    parser = RaceIndexParser()
+    parser.feed(html)
+    return {
+        "race_title": parser.race_title,
+        "races": sorted(parser.races, key=lambda r: r["race_no"]),
+    }
+
+
+def fetch_result_lists(date: str, jcds: list[str]) -> dict[str, list[dict]]:
+    """複数会場の結果一覧を並列に取得してパースする（開催のない会場・取得に失敗した会場は含めない）"""
+    urls = {f"{BOATRACE_BASE}/resultlist?jcd={jcd}&hd={date}": jcd for jcd in jcds}
+    pool = http_pool.HttpPool(fetch_page, max_workers=CARD_PREFETCH_WORKERS, limiter=boatrace_limiter)
+    results: dict[str, list[dict]] = {}
+    for url, html, error in pool.map(urls):
+        jcd = urls[url]
+        if error:
+            logger.warning(f"Failed to fetch resultlist for jcd={jcd}: {error}")
+            continue
+        with timed("ParseDuration", PageType="resultlist"):
+            races = parse_result_list(html)
+        if races:
+            results[jcd] = races
+    return results
+
+
+def fetch_odds3t(race_no: int, jcd: str, date: str) -> dict[str, float]:
+    """3連単オッズを取得する"""
+    html = fetch_page(f"{BOATRACE_BASE}/odds3t?rno={race_no}&jcd={jcd}&hd={date}")
+    with timed("ParseDuration", PageType="odds3t"):
+        return parse_odds3t(html)
+
+
+_DEADLINE_RE = re.compile(r"(\d{1,2}):(\d{2})")
+
+
 def parse_deadline_time(deadline_str: str, today: str) -> datetime | None:
     """締切時刻文字列 (例: "14:12") をJST datetimeに変換する。
 
     kyoteibiyoriのrace_rowsの3列目は "14:12" のような締切時刻。
     """
-    m = re.search(r"(\d{1,2}):(\d{2})", deadline_str)
+    m = _DEADLINE_RE.search(deadline_str)
     if not m:
         return None
     hour, minute = int(m.group(1)), int(m.group(2))
@@ -595,68 +895,238 @@ def parse_deadline_time(deadline_str: str, today: str) -> datetime | None:
 # =============================================
 # EventBridge Scheduler 操作
 # =============================================
+def _schedule_params(fire_at_utc: datetime, payload: dict) -> dict:
+    """one-time スケジュールの作成・更新パラメータ（完了後に自動削除: ActionAfterCompletion: DELETE）"""
+    # at() 式: at(yyyy-mm-ddThh:mm:ss)
+    return {
+        "ScheduleExpression": f"at({fire_at_utc.strftime('%Y-%m-%dT%H:%M:%S')})",
+        "ScheduleExpressionTimezone": "UTC",
+        "FlexibleTimeWindow": {"Mode": "OFF"},
+        "Target": {
+            "Arn": SCRAPER_FUNCTION_ARN,
+            "RoleArn": SCHEDULER_ROLE_ARN,
+            "Input": json.dumps(payload),
+        },
+        "ActionAfterCompletion": "DELETE",
+    }
+
+
 def create_one_time_schedule(
     schedule_name: str,
     fire_at_utc: datetime,
     payload: dict,
 ) -> None:
-    """EventBridge Scheduler で one-time スケジュールを作成する。
+    """EventBridge Scheduler で one-time スケジュールを作成する（既に存在する場合は更新）。"""
+    params = _schedule_params(fire_at_utc, payload)
+    try:
+        scheduler_client.create_schedule(Name=schedule_name, GroupName=SCHEDULER_GROUP_NAME, **params)
+        logger.info(f"Created schedule: {schedule_name} at {params['ScheduleExpression']}")
+    except scheduler_client.exceptions.ConflictException:
+        scheduler_client.update_schedule(Name=schedule_name, GroupName=SCHEDULER_GROUP_NAME, **params)
+        logger.info(f"Updated existing schedule: {schedule_name} at {params['ScheduleExpression']}")
+
+
+def list_existing_schedules(prefixes: tuple[str, ...]) -> dict[str, dict]:
+    """グループ内で prefixes のいずれかで始まるスケジュールを取得する（GetSchedule は並列）"""
+    names: list[str] = []
+    token = None
+    while True:
+        kwargs = {"GroupName": SCHEDULER_GROUP_NAME, "MaxResults": 100}
+        if token:
+            kwargs["NextToken"] = token
+        response = scheduler_client.list_schedules(**kwargs)
+        names += [s["Name"] for s in response.get("Schedules", []) if s["Name"].startswith(prefixes)]
+        token = response.get("NextToken")
+        if not token:
+            break
+    if not names:
+        return {}
+
+    def _get(name: str) -> dict:
+        return scheduler_client.get_schedule(Name=name, GroupName=SCHEDULER_GROUP_NAME)
+
+    with ThreadPoolExecutor(max_workers=min(SCHEDULER_MAX_WORKERS, len(names))) as pool:
+        return dict(zip(names, pool.map(_get, names)))
+
+
+def _schedule_matches(existing: dict, params: dict) -> bool:
+    """既存スケジュールが作りたい内容と同じか（Input は JSON として比較）"""
+    target = existing.get("Target", {})
+    try:
+        same_input = json.loads(target.get("Input", "null")) == json.loads(params["Target"]["Input"])
+    except json.JSONDecodeError:
+        same_input = False
+    return (
+        same_input
+        and existing.get("State", "ENABLED") == "ENABLED"
+        and existing.get("ScheduleExpression") == params["ScheduleExpression"]
+        and target.get("Arn") == params["Target"]["Arn"]
+        and target.get("RoleArn") == params["Target"]["RoleArn"]
+    )
+
+
+def _apply_schedule_op(op: str, name: str, params: dict | None) -> str:
+    """create / update / delete を1件実行し、実際に行った操作を返す"""
+    if op == "delete":
+        try:
+            scheduler_client.delete_schedule(Name=name, GroupName=SCHEDULER_GROUP_NAME)
+        except scheduler_client.exceptions.ResourceNotFoundException:
+            pass  # 発火して自動削除済み
+        return op
+    if op == "create":
+        try:
+            scheduler_client.create_schedule(Name=name, GroupName=SCHEDULER_GROUP_NAME, **params)
+            return op
+        except scheduler_client.exceptions.ConflictException:
+            op = "update"  # list 後に別の実行が作った
+    scheduler_client.update_schedule(Name=name, GroupName=SCHEDULER_GROUP_NAME, **params)
+    return op
+
 
-    完了後に自動削除される (ActionAfterCompletion: DELETE)。
+def sync_schedules(desired: dict[str, dict], prefixes: tuple[str, ...]) -> dict[str, int]:
+    """スケジュールを desired（名前 → _schedule_params()）に揃える。
+
+    prefixes で始まる既存スケジュールと差分を取り、足りないものは作成、内容が違うものは更新、
+    desired にないものは削除する。同じ内容で再実行した場合は List / Get だけで終わる。
     """
-    # at() 式: at(yyyy-mm-ddThh:mm:ss)
-    schedule_expression = f"at({fire_at_utc.strftime('%Y-%m-%dT%H:%M:%S')})"
+    counts = {"created": 0, "updated": 0, "deleted": 0, "unchanged": 0, "failed": 0}
+    with timed("SchedulerDuration") as m:
+        existing = list_existing_schedules(prefixes)
+        ops: list[tuple[str, str, dict | None]] = []
+        for name, params in desired.items():
+            if name not in existing:
+                ops.append(("create", name, params))
+            elif _schedule_matches(existing[name], params):
+                counts["unchanged"] += 1
+            else:
+                ops.append(("update", name, params))
+        ops += [("delete", name, None) for name in existing if name not in desired]
+
+        if ops:
+            with ThreadPoolExecutor(max_workers=min(SCHEDULER_MAX_WORKERS, len(ops))) as pool:
+                futures = {pool.submit(_apply_schedule_op, *op): op for op in ops}
+                for future in as_completed(futures):
+                    op, name, _ = futures[future]
+                    try:
+                        counts[future.result() + "d"] += 1
+                    except Exception as e:
+                        counts["failed"] += 1
+                        logger.error(f"Failed to {op} schedule {name}: {e}")
+        m.update(counts)
+    logger.info(f"Schedules synced: {counts}")
+    return counts
 
-    try:
-        scheduler_client.create_schedule(
-            Name=schedule_name,
-            GroupName=SCHEDULER_GROUP_NAME,
-            ScheduleExpression=schedule_expression,
-            ScheduleExpressionTimezone="UTC",
-            FlexibleTimeWindow={"Mode": "OFF"},
-            Target={
-                "Arn": SCRAPER_FUNCTION_ARN,
-                "RoleArn": SCHEDULER_ROLE_ARN,
-                "Input": json.dumps(payload),
-            },
-            ActionAfterCompletion="DELETE",
-        )
-        logger.info(f"Created schedule: {schedule_name} at {schedule_expression}")
-    except scheduler_client.exceptions.ConflictException:
-        # 既に存在する場合は更新
-        scheduler_client.update_schedule(
-            Name=schedule_name,
-            GroupName=SCHEDULER_GROUP_NAME,
-            ScheduleExpression=schedule_expression,
-            ScheduleExpressionTimezone="UTC",
-            FlexibleTimeWindow={"Mode": "OFF"},
-            Target={
-                "Arn": SCRAPER_FUNCTION_ARN,
-                "RoleArn": SCHEDULER_ROLE_ARN,
-                "Input": json.dumps(payload),
-            },
-            ActionAfterCompletion="DELETE",
-        )
-        logger.info(f"Updated existing schedule: {schedule_name} at {schedule_expression}")
+
+# =============================================
+# レース単位のスケジュール組み立て
+# =============================================
+def schedule_prefixes(today: str, name_prefix: str = "") -> tuple[str, ...]:
+    """その日のレース単位スケジュールの名前の接頭辞（sync_schedules の管理範囲）
+
+    post_race のやり直し（post-race-retry-）は schedule が作るものではないので含めない。
+    """
+    return tuple(f"{name_prefix}{kind}-{today}-" for kind in ("pre-race", "post-race", "odds-refresh"))
+
+
+def plan_race_schedules(
+    today: str, races: list[dict], common: dict, name_prefix: str = ""
+) -> tuple[dict[str, dict], dict[int, datetime]]:
+    """各レースの pre_race / post_race（/ odds_refresh）スケジュールを組み立てる。
+
+    Args:
+        races: [{race_no, course, deadline}, ...]（レース順）
+        common: 全レースのペイロードに入れる値（jcd / venue_name / date / player_name / schedule_version、会場モードは scope も）
+        name_prefix: スケジュール名の接頭辞（会場モードは venue-{jcd}-）
+
+    Returns:
+        (スケジュール名 → _schedule_params() のパラメータ, レース番号 → pre_race の発火時刻（JST）)
+    """
+    now_jst = datetime.now(JST)
+    desired: dict[str, dict] = {}
+    pre_race_times: dict[int, datetime] = {}
+    total_races = len(races)
+
+    # 実測処理時間の p95 + マージンだけ締切より前に発火する（サンプル不足の間は10分前）。
+    # odds_refresh が有効なら pre_race は10分前のまま、締切ぎりぎりの発火は odds_refresh が受け持つ
+    measured_lead = get_lead_seconds("pre_race")
+    refresh_lead = None
+    if ODDS_REFRESH_ENABLED:
+        refresh_lead = get_lead_seconds("odds_refresh") or measured_lead
+        if refresh_lead and refresh_lead > latency_model.DEFAULT_LEAD_SECONDS - ODDS_REFRESH_MIN_GAP:
+            refresh_lead = None
+    if refresh_lead or not measured_lead:
+        pre_race_lead = latency_model.DEFAULT_LEAD_SECONDS
+    else:
+        pre_race_lead = measured_lead
+    logger.info(f"Lead time: pre_race={pre_race_lead}s, odds_refresh={refresh_lead}s")
+
+    for idx, race in enumerate(races):
+        race_no = race["race_no"]
+        deadline_dt = parse_deadline_time(race["deadline"], today)
+        if not deadline_dt:
+            logger.warning(f"Could not parse deadline for race {race_no}: {race['deadline']}")
+            continue
+
+        race_index = idx + 1  # 1-based
+
+        # 共通ペイロード
+        base_payload = {
+            **common,
+            "race_no": race_no,
+            "total_races": total_races,
+            "race_index": race_index,
+            "course_info": race["course"],
+            "deadline": deadline_dt.isoformat(),
+        }
+
+        # pre_race: 締切 pre_race_lead 秒前
+        pre_race_time = deadline_dt - timedelta(seconds=pre_race_lead)
+        if pre_race_time > now_jst:
+            pre_race_utc = pre_race_time.astimezone(timezone.utc)
+            desired[f"{name_prefix}pre-race-{today}-{race_no}"] = _schedule_params(
+                pre_race_utc, {**base_payload, "mode": "pre_race", "lead_seconds": pre_race_lead}
+            )
+            pre_race_times[race_no] = pre_race_time
+            logger.info(f"Scheduled pre_race for {race_no}R at {pre_race_time.strftime('%H:%M')} JST")
+        else:
+            logger.warning(f"Skipping pre_race for {race_no}R — time already passed ({pre_race_time.strftime('%H:%M')} JST)")
+
+        # odds_refresh: 締切 refresh_lead 秒前（有効な場合のみ）
+        if refresh_lead:
+            refresh_time = deadline_dt - timedelta(seconds=refresh_lead)
+            if refresh_time > now_jst:
+                refresh_utc = refresh_time.astimezone(timezone.utc)
+                desired[f"{name_prefix}odds-refresh-{today}-{race_no}"] = _schedule_params(
+                    refresh_utc, {**base_payload, "mode": "odds_refresh"}
+                )
+
+        # post_race: 締切 RESULT_FIRST_POLL_MINUTES 分後（結果がまだなら post_race が自分で取り直しを予約する）
+        post_race_time = deadline_dt + timedelta(minutes=RESULT_FIRST_POLL_MINUTES)
+        if post_race_time > now_jst:
+            post_race_utc = post_race_time.astimezone(timezone.utc)
+            desired[f"{name_prefix}post-race-{today}-{race_no}"] = _schedule_params(
+                post_race_utc, {**base_payload, "mode": "post_race"}
+            )
+            logger.info(f"Scheduled post_race for {race_no}R at {post_race_time.strftime('%H:%M')} JST")
+        else:
+            logger.warning(f"Skipping post_race for {race_no}R — time already passed ({post_race_time.strftime('%H:%M')} JST)")
+
+    return desired, pre_race_times
 
 
 # =============================================
 # Bedrock Claude 予想生成（1レース単位）
 # =============================================
-def invoke_bedrock_prediction(
-    player_name: str,
-    venue_name: str,
-    date: str,
-    race_no: int,
-    course_info: str,
-    racelist_text: str,
-    beforeinfo_text: str,
-    odds_text: str,
-) -> dict:
-    """Bedrock Claude に出走表・直前情報・オッズを送り1レース分の3連単予想を生成する"""
+def _is_retryable_bedrock_error(error: Exception) -> bool:
+    """スロットリング・タイムアウトなど、別モデルで呼び直す価値のあるエラーか"""
+    response = getattr(error, "response", None)
+    code = response.get("Error", {}).get("Code", "") if isinstance(response, dict) else ""
+    return type(error).__name__ in RETRYABLE_BEDROCK_ERRORS or code in RETRYABLE_BEDROCK_ERRORS
 
-    prompt = f"""あなたは競艇（ボートレース）の予想AIです。
-以下の出走表・直前情報・オッズデータに基づいて、{race_no}Rの3連単予想と資金配分を行ってください。
+
+# 全レース共通の指示（system ブロック）。レースごとに変わる値を入れるとプロンプトキャッシュが効かなくなる
+PREDICTION_SYSTEM_PROMPT = f"""あなたは競艇（ボートレース）の予想AIです。
+与えられた出走表・直前情報・オッズデータに基づいて、指定されたレースの3連単予想と資金配分を行ってください。
 
 【条件】
 - 舟券の種類: 3連単のみ
@@ -671,14 +1141,51 @@ def invoke_bedrock_prediction(
 - スタートタイミング（ST）が早い選手は有利
 - モーター2連率・展示タイムも判断材料
 - 直前情報の展示タイム・スタート展示を重視
-- {player_name}の枠番・コースを特に注目
-- {player_name}は {course_info}
+- 【注目選手】の枠番・コースを特に注目
+
+以下のJSON形式で回答してください。JSON以外のテキストは含めないでください:
+{{
+  "race_no": レース番号(整数),
+  "analysis": "簡潔な展開予想（50文字以内）",
+  "bets": [
+    {{
+      "combination": "X-Y-Z",
+      "amount": 金額(整数、100円単位),
+      "reasoning": "この買い目の根拠（30文字以内）"
+    }}
+  ]
+}}"""
+
+
+def invoke_bedrock_prediction(
+    player_name: str,
+    venue_name: str,
+    date: str,
+    race_no: int,
+    course_info: str,
+    racelist_text: str,
+    beforeinfo_text: str,
+    odds_text: str,
+    lane: str = "race",
+) -> dict:
+    """Bedrock Claude に出走表・直前情報・オッズを送り1レース分の3連単予想を生成する。
+
+    共通の指示は cache_control 付きの system ブロックにして、2レース目以降はキャッシュから読ませる。
+    呼び出しは governor の lane（urgent / race）の予算内で行い、スロットリングはジッター付きで呼び直す。
+    会場モードでは注目選手がいない（course_info が空）ので「なし」として全艇を同じ重みで見る。
+    """
+
+    focus = f"{player_name}は {course_info}" if course_info else "なし（全艇を同じ重みで評価）"
+    prompt = f"""{race_no}Rの3連単予想と資金配分を行ってください。
 
 【レース情報】
 会場: {venue_name}
 日付: {date}
 レース: {race_no}R
 
+【注目選手】
+{focus}
+
 【出走表】
 {racelist_text}
 
@@ -686,48 +1193,77 @@ def invoke_bedrock_prediction(
 {beforeinfo_text}
 
 【オッズ（3連単）】
-{odds_text}
-
-以下のJSON形式で回答してください。JSON以外のテキストは含めないでください:
-{{
-  "race_no": {race_no},
-  "analysis": "簡潔な展開予想（50文字以内）",
-  "bets": [
-    {{
-      "combination": "X-Y-Z",
-      "amount": 金額(整数、100円単位),
-      "reasoning": "この買い目の根拠（30文字以内）"
-    }}
-  ]
-}}"""
+{odds_text}"""
 
+    max_tokens = 2048
     body = json.dumps(
         {
             "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 2048,
+            "max_tokens": max_tokens,
+            "system": [{"type": "text", "text": PREDICTION_SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}],
             "messages": [{"role": "user", "content": prompt}],
             "temperature": 0.7,
         }
     )
 
-    response = bedrock.invoke_model(
-        modelId=MODEL_ID,
-        contentType="application/json",
-        accept="application/json",
-        body=body,
+    estimated_tokens = bedrock_governor.estimate_tokens(PREDICTION_SYSTEM_PROMPT + prompt, max_tokens)
+    model_ids = [MODEL_ID] + ([FALLBACK_MODEL_ID] if FALLBACK_MODEL_ID and FALLBACK_MODEL_ID != MODEL_ID else [])
+    for attempt, model_id in enumerate(model_ids):
+        try:
+            with timed("BedrockDuration") as m:
+                m["model_id"] = model_id
+                m["fallback"] = attempt > 0
+                m["lane"] = lane
+                response, permit = governor.call(
+                    lambda: bedrock.invoke_model(
+                        modelId=model_id,
+                        contentType="application/json",
+                        accept="application/json",
+                        body=body,
+                    ),
+                    model_id,
+                    lane,
+                    estimated_tokens,
+                )
+                result = json.loads(response["body"].read().decode("utf-8"))
+                usage = result.get("usage", {})
+                governor.settle(
+                    permit,
+                    usage.get("input_tokens", 0)
+                    + usage.get("cache_creation_input_tokens", 0)
+                    + usage.get("output_tokens", 0),
+                )
+                m["BedrockGovernorWait"] = (permit.metrics()["wait_ms"], "Milliseconds")
+                m["BedrockThrottleRetries"] = (permit.retries, "Count")
+                m["BedrockWindowRequests"] = (permit.window_requests, "Count")
+                m["BedrockWindowTokens"] = (permit.window_tokens, "Count")
+                m["BedrockInputTokens"] = (usage.get("input_tokens", 0), "Count")
+                m["BedrockOutputTokens"] = (usage.get("output_tokens", 0), "Count")
+                m["BedrockCacheReadTokens"] = (usage.get("cache_read_input_tokens", 0), "Count")
+                m["BedrockCacheWriteTokens"] = (usage.get("cache_creation_input_tokens", 0), "Count")
+            break
+        except Exception as e:
+            if attempt == len(model_ids) - 1 or not _is_retryable_bedrock_error(e):
+                raise
+            logger.warning(f"Bedrock {model_id} failed ({type(e).__name__}: {e}), falling back to {model_ids[attempt + 1]}")
+    logger.info(
+        f"Bedrock usage: input={usage.get('input_tokens', 0)}, output={usage.get('output_tokens', 0)}, "
+        f"cache_read={usage.get('cache_read_input_tokens', 0)}, cache_write={usage.get('cache_creation_input_tokens', 0)}"
     )
 
-    result = json.loads(response["body"].read().decode("utf-8"))
     text = result["content"][0]["text"]
 
-    try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        m = re.search(r"\{.*\}", text, re.DOTALL)
-        if m:
-            return json.loads(m.group())
-        logger.error(f"Failed to parse Bedrock response: {text[:500]}")
-        raise ValueError("Bedrock応答のJSON解析に失敗しました")
+    # 前後の説明文・打ち切り・表記揺れ・金額の崩れは prediction_parser で直す（直せなければ ValueError）
+    with timed("ParseDuration", PageType="prediction") as m:
+        try:
+            prediction, repairs = prediction_parser.parse_prediction(text, race_no, RACE_BUDGET)
+        except ValueError:
+            logger.error(f"Failed to parse Bedrock response: {text[:500]}")
+            raise
+        m["PredictionRepairs"] = (len(repairs), "Count")
+    if repairs:
+        logger.warning(f"Repaired Bedrock prediction ({race_no}R): {repairs}")
+    return prediction
 
 
 # =============================================
@@ -735,14 +1271,24 @@ def invoke_bedrock_prediction(
 # =============================================
 def _to_dynamodb_item(data: dict) -> dict:
     """DynamoDB用にfloat→Decimalに変換する"""
-    return json.loads(json.dumps(data), parse_float=Decimal)
+    return item_codec.to_dynamodb_value(data)
+
+
+def schedule_version(races: list[dict]) -> str:
+    """レース一覧の内容から決まるスケジュールの版（同じ内容なら同じ値）
+
+    pre_race / post_race のペイロードに入れ、ウォームキャッシュのキーに使う。schedule を再実行して
+    レース一覧が変わると版が変わるので、古い版をキャッシュしたコンテナでも新しいイベントは読み直す。
+    """
+    return hashlib.sha1(json.dumps(races, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
 
 
 def save_schedule(today: str, data: dict, venue_name: str, jcd: str, races: list[dict]) -> None:
     """朝のスケジュール情報をDynamoDBに保存する"""
+    version = schedule_version(races)
     item = _to_dynamodb_item(
         {
-            "racer_no": RACER_NO,
+            "racer_no": partition_key,
             "date_type": f"{today}#schedule",
             "date": today,
             "player_name": data["player_name"],
@@ -751,22 +1297,45 @@ def save_schedule(today: str, data: dict, venue_name: str, jcd: str, races: list
             "race_title": data["race_title"],
             "races": races,  # [{race_no, course, deadline}, ...]
             "total_races": len(races),
+            "version": version,
         }
     )
-    db_table.put_item(Item=item)
+    with timed("DynamoDBWriteDuration", Operation="save_schedule"):
+        db_table.put_item(Item=item)
+    cache.put(today, "schedule", f"{partition_key}#{version}", item)
 
 
-def get_schedule(today: str) -> dict | None:
-    """DynamoDBからスケジュール情報を読み出す"""
-    response = db_table.get_item(Key={"racer_no": RACER_NO, "date_type": f"{today}#schedule"})
-    return response.get("Item")
-
+def get_schedule(today: str, version: str | None = None) -> dict | None:
+    """DynamoDBからスケジュール情報を読み出す
 
-def save_prediction(today: str, race_no: int, prediction: dict, venue_name: str, jcd: str, player_name: str) -> None:
-    """レース予想をDynamoDBに保存する"""
+    version（イベントの schedule_version）が分かるときだけ、同じ版をウォームコンテナのキャッシュから返す。
+    版を持たないイベント（settle・venue_predict や、版を入れる前に作ったスケジュール）は毎回読み出す。
+    """
+    if version:
+        item = cache.get(today, "schedule", f"{partition_key}#{version}")
+        if item is not None:
+            return item
+    with timed("DynamoDBReadDuration", Operation="get_schedule"):
+        response = db_table.get_item(Key={"racer_no": partition_key, "date_type": f"{today}#schedule"})
+    item = response.get("Item")
+    if item and item.get("version"):
+        cache.put(today, "schedule", f"{partition_key}#{item['version']}", item)
+    return item
+
+
+def save_prediction(
+    today: str,
+    race_no: int,
+    prediction: dict,
+    venue_name: str,
+    jcd: str,
+    player_name: str,
+    odds: dict[str, float] | None = None,
+) -> None:
+    """レース予想をDynamoDBに保存する（odds を渡すと3連単オッズのスナップショットも持つ）"""
     item = _to_dynamodb_item(
         {
-            "racer_no": RACER_NO,
+            "racer_no": partition_key,
             "date_type": f"{today}#prediction#{race_no}",
             "date": today,
             "race_no": race_no,
@@ -774,88 +1343,278 @@ def save_prediction(today: str, race_no: int, prediction: dict, venue_name: str,
             "venue_code": jcd,
             "player_name": player_name,
             "race_budget": RACE_BUDGET,
-            "prediction": prediction,
+            **item_codec.encode_prediction(prediction),
         }
     )
-    db_table.put_item(Item=item)
+    if odds:
+        item["odds3t"] = item_codec.pack_odds(odds)
+        item["odds_captured_at"] = datetime.now(JST).isoformat(timespec="seconds")
+    with timed("DynamoDBWriteDuration", Operation="save_prediction"):
+        db_table.put_item(Item=item)
+
+
+def prefetch_race_cards(today: str, jcd: str, race_nos: list[int]) -> int:
+    """全レースの出走表を並列に取得してテキストにし、出走カードとして保存する（保存できた件数を返す）。
+
+    pre_race の締切前の処理から出走表の取得・パースを外すためのもの。失敗したレースは pre_race がその場で取得する。
+    """
+    urls = {f"{BOATRACE_BASE}/racelist?rno={race_no}&jcd={jcd}&hd={today}": race_no for race_no in race_nos}
+    pool = http_pool.HttpPool(fetch_page, max_workers=CARD_PREFETCH_WORKERS, limiter=boatrace_limiter)
+    saved = 0
+    with timed("CardPrefetchDuration") as m:
+        for url, html, error in pool.map(urls):
+            race_no = urls[url]
+            if error:
+                logger.warning(f"Failed to prefetch racelist for {race_no}R: {error}")
+                continue
+            text = extract_text(html, url)
+            cache.put(today, "racelist", f"{partition_key}#{race_no}", text)
+            item = {
+                "racer_no": partition_key,
+                "date_type": f"{today}#card#{race_no}",
+                "date": today,
+                "race_no": race_no,
+                "venue_code": jcd,
+                "racelist": item_codec.pack_text(text),
+                "fetched_at": datetime.now(JST).isoformat(timespec="seconds"),
+                "expires_at": int(time.time()) + CARD_TTL_SECONDS,
+            }
+            try:
+                with timed("DynamoDBWriteDuration", Operation="save_race_card"):
+                    db_table.put_item(Item=item)
+                saved += 1
+            except Exception as e:
+                logger.warning(f"Failed to save race card for {race_no}R: {e}")
+        m["CardsPrefetched"] = (saved, "Count")
+        m["CardsFailed"] = (len(urls) - saved, "Count")
+    logger.info(f"Prefetched {saved}/{len(urls)} race cards")
+    return saved
+
+
+def get_race_card(today: str, race_no: int) -> str | None:
+    """朝に保存した出走表のテキストを返す（なければ None。ウォームコンテナではキャッシュから返す）"""
+    cached = cache.get(today, "racelist", f"{partition_key}#{race_no}")
+    if cached is not None:
+        return cached
+    try:
+        with timed("DynamoDBReadDuration", Operation="get_race_card"):
+            response = db_table.get_item(Key={"racer_no": partition_key, "date_type": f"{today}#card#{race_no}"})
+    except Exception as e:
+        logger.warning(f"Failed to read race card for {race_no}R: {e}")
+        return None
+    item = response.get("Item")
+    if not item:
+        return None
+    text = item_codec.unpack_text(item["racelist"])
+    cache.put(today, "racelist", f"{partition_key}#{race_no}", text)
+    return text
 
 
 def get_prediction(today: str, race_no: int) -> dict | None:
-    """DynamoDBからレース予想を読み出す"""
-    response = db_table.get_item(Key={"racer_no": RACER_NO, "date_type": f"{today}#prediction#{race_no}"})
-    return response.get("Item")
+    """DynamoDBからレース予想を読み出す（prediction は保存形式によらず従来の形に復元する）"""
+    response = db_table.get_item(Key={"racer_no": partition_key, "date_type": f"{today}#prediction#{race_no}"})
+    item = response.get("Item")
+    if item is not None:
+        item["prediction"] = item_codec.decode_prediction(item)
+    return item
 
 
-def save_result(today: str, race_no: int, results: list, total_bet: int, total_return: int, race_pnl: int) -> None:
-    """レース結果をDynamoDBに保存する"""
-    item = _to_dynamodb_item(
+def _result_item(today: str, race_no: int, results: list, total_bet: int, total_return: int, race_pnl: int) -> dict:
+    return _to_dynamodb_item(
         {
-            "racer_no": RACER_NO,
+            "racer_no": partition_key,
             "date_type": f"{today}#result#{race_no}",
             "date": today,
             "race_no": race_no,
-            "results": results,
+            **item_codec.encode_results(results),
             "total_bet": total_bet,
             "total_return": total_return,
             "race_pnl": race_pnl,
         }
     )
-    db_table.put_item(Item=item)
+
+
+def save_result(today: str, race_no: int, results: list, total_bet: int, total_return: int, race_pnl: int) -> bool:
+    """レース結果をDynamoDBに保存する。新規作成なら True、既存の結果を上書きした場合は False を返す"""
+    item = _result_item(today, race_no, results, total_bet, total_return, race_pnl)
+    with timed("DynamoDBWriteDuration", Operation="save_result"):
+        response = db_table.put_item(Item=item, ReturnValues="ALL_OLD")
+    return "Attributes" not in response
+
+
+def get_result(today: str, race_no: int) -> dict | None:
+    """DynamoDBからレース結果を読み出す（なければ None）"""
+    with timed("DynamoDBReadDuration", Operation="get_result"):
+        response = db_table.get_item(Key={"racer_no": partition_key, "date_type": f"{today}#result#{race_no}"})
+    return response.get("Item")
+
+
+def get_predictions_for_day(today: str) -> dict[int, dict]:
+    """その日の全レース予想を Query 1 回で読み出す（race_no → 予想アイテム。prediction は従来の形に復元する）"""
+    items: dict[int, dict] = {}
+    kwargs = {
+        "KeyConditionExpression": "racer_no = :pk AND begins_with(date_type, :prefix)",
+        "ExpressionAttributeValues": {":pk": partition_key, ":prefix": f"{today}#prediction#"},
+    }
+    with timed("DynamoDBReadDuration", Operation="get_predictions_for_day"):
+        while True:
+            response = db_table.query(**kwargs)
+            for item in response.get("Items", []):
+                item["prediction"] = item_codec.decode_prediction(item)
+                items[int(item["race_no"])] = item
+            if "LastEvaluatedKey" not in response:
+                break
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    return items
+
+
+def add_result_to_aggregates(today: str, jcd: str, venue_name: str, course: str | None, results: list) -> None:
+    """レース結果を日・月・会場・コース別の集計アイテムに加算する"""
+    with timed("DynamoDBWriteDuration", Operation="add_result_to_aggregates"):
+        stats.add_race(db_table, partition_key, today, jcd, venue_name, course, results)
 
 
 def get_all_results_for_day(today: str, race_nos: list[int]) -> list[dict]:
-    """その日の全レース結果をDynamoDBから読み出す"""
-    results = []
-    for rno in race_nos:
-        response = db_table.get_item(Key={"racer_no": RACER_NO, "date_type": f"{today}#result#{rno}"})
-        item = response.get("Item")
-        if item:
-            results.append(item)
-    return results
+    """その日の全レース結果をDynamoDBから読み出す。
+
+    SK が "{today}#result#" で始まる項目を1回の Query でまとめて取得し、
+    race_nos に含まれるレースだけを race_nos の順で返す。
+    """
+    items: dict[int, dict] = {}
+    kwargs = {
+        "KeyConditionExpression": "racer_no = :pk AND begins_with(date_type, :prefix)",
+        "ExpressionAttributeValues": {":pk": partition_key, ":prefix": f"{today}#result#"},
+    }
+    with timed("DynamoDBReadDuration", Operation="get_all_results_for_day"):
+        while True:
+            response = db_table.query(**kwargs)
+            for item in response.get("Items", []):
+                items[int(item["race_no"])] = item
+            if "LastEvaluatedKey" not in response:
+                break
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    return [items[rno] for rno in race_nos if rno in items]
 
 
-def update_cumulative(today: str, total_bet: int, total_return: int, daily_pnl: int) -> dict:
-    """累計収支を更新して返す"""
-    response = db_table.get_item(Key={"racer_no": RACER_NO, "date_type": "cumulative"})
-    cumulative = response.get(
-        "Item",
-        {
-            "racer_no": RACER_NO,
-            "date_type": "cumulative",
-            "total_bet": 0,
-            "total_return": 0,
-            "cumulative_pnl": 0,
-            "days_count": 0,
-        },
-    )
+def _get_cumulative() -> dict:
+    with timed("DynamoDBReadDuration", Operation="get_cumulative"):
+        response = db_table.get_item(Key={"racer_no": partition_key, "date_type": "cumulative"}, ConsistentRead=True)
+    return response.get("Item") or {}
 
-    cumulative["total_bet"] = int(cumulative["total_bet"]) + total_bet
-    cumulative["total_return"] = int(cumulative["total_return"]) + total_return
-    cumulative["cumulative_pnl"] = int(cumulative["cumulative_pnl"]) + daily_pnl
-    cumulative["days_count"] = int(cumulative.get("days_count", 0)) + 1
-    cumulative["last_updated"] = today
 
-    db_table.put_item(Item=_to_dynamodb_item(cumulative))
+def is_day_closed(today: str) -> bool:
+    """その日の収支がすでに累計収支に反映されているか（最終レースの精算後）"""
+    return f"day_{today}" in _get_cumulative()
+
+
+def reconcile_cumulative(today: str, day_bet: int, day_return: int, race_count: int) -> dict:
+    """その日の合計を累計収支に反映し、更新後の累計を返す。
+
+    累計アイテムに日ごとの反映済みの値（day_{YYYYMMDD}: {bet, ret, races}）を持ち、前回反映した値との差だけを
+    ADD する。最終レースより後に精算されたレースがあっても取りこぼさず、同じ日に何度呼んでも二重に加算しない。
+    反映済みの値と差分の加算は条件付きの UpdateItem 1 回で行い、競合したら読み直す。
+    反映済みより少ないレース数で呼ばれた場合（古い読み出し）は何もしない。
+    """
+    attr = f"day_{today}"
+    cumulative: dict = {}
+    for _ in range(3):
+        cumulative = _get_cumulative()
+        old = cumulative.get(attr)
+        old_bet, old_ret, old_races = (int(old["bet"]), int(old["ret"]), int(old["races"])) if old else (0, 0, 0)
+        if old and (race_count < old_races or (day_bet, day_return, race_count) == (old_bet, old_ret, old_races)):
+            return cumulative
+        values = {
+            ":bet": day_bet - old_bet,
+            ":ret": day_return - old_ret,
+            ":pnl": (day_return - old_ret) - (day_bet - old_bet),
+            ":new_day": 0 if old else 1,
+            ":today": today,
+            ":day": {"bet": day_bet, "ret": day_return, "races": race_count},
+        }
+        if old:
+            condition = f"{attr}.bet = :old_bet AND {attr}.ret = :old_ret AND {attr}.races = :old_races"
+            values.update({":old_bet": old_bet, ":old_ret": old_ret, ":old_races": old_races})
+        else:
+            condition = f"attribute_not_exists({attr})"
+        try:
+            with timed("DynamoDBWriteDuration", Operation="reconcile_cumulative"):
+                response = db_table.update_item(
+                    Key={"racer_no": partition_key, "date_type": "cumulative"},
+                    UpdateExpression=(
+                        "ADD total_bet :bet, total_return :ret, cumulative_pnl :pnl, days_count :new_day "
+                        f"SET last_updated = :today, {attr} = :day"
+                    ),
+                    ConditionExpression=condition,
+                    ExpressionAttributeValues=values,
+                    ReturnValues="ALL_NEW",
+                )
+            return response["Attributes"]
+        except db_table.meta.client.exceptions.ConditionalCheckFailedException:
+            logger.info(f"Cumulative for {today} changed concurrently — re-reading")
+    logger.warning(f"Could not reconcile cumulative for {today} after retries")
     return cumulative
 
 
+def record_latency_sample(mode: str, today: str, elapsed_ms: float) -> None:
+    """pre_race / odds_refresh の処理時間を記録する（失敗してもハンドラは止めない）"""
+    try:
+        with timed("DynamoDBWriteDuration", Operation="record_latency_sample"):
+            latency_model.record_sample(db_table, RACER_NO, mode, elapsed_ms, today)
+    except Exception as e:
+        logger.warning(f"Failed to record latency sample ({mode}): {e}")
+
+
+def get_lead_seconds(mode: str) -> int | None:
+    """記録済みの処理時間から、締切の何秒前に mode を発火すべきかを返す（サンプル不足なら None）"""
+    with timed("DynamoDBReadDuration", Operation="get_latency_samples"):
+        samples = latency_model.load_samples(db_table, RACER_NO, mode)
+    lead = latency_model.lead_seconds(samples, PRE_RACE_SAFETY_MARGIN)
+    if samples:
+        p95 = latency_model.percentile(samples, latency_model.PERCENTILE) / 1000
+        logger.info(f"Latency model ({mode}): {len(samples)} samples, p95={p95:.1f}s, lead={lead}s")
+    return lead
+
+
 # =============================================
 # Discord メッセージ組み立て
 # =============================================
-def build_schedule_message(data: dict, races: list[dict]) -> str:
-    """朝のスケジュール通知メッセージを組み立てる（予想なし、出走情報のみ）"""
-    name = data["player_name"] or f"選手{RACER_NO}"
-    lines = [f"🌅 {name}（{RACER_NO}）本日の出走予定"]
+def _subject(player_name: str) -> str:
+    """メッセージ見出しの対象（選手モードは「選手名（登録番号）」、会場モードは「住之江 全レース」のようなラベル）"""
+    if partition_key.startswith(VENUE_PARTITION_PREFIX):
+        return f"{player_name} "
+    return f"{player_name or f'選手{RACER_NO}'}（{RACER_NO}）"
+
+
+def build_schedule_message(data: dict, races: list[dict], prediction_times: dict[int, datetime]) -> str:
+    """朝のスケジュール通知メッセージを組み立てる（予想なし、出走情報と予想の配信予定時刻のみ）
+
+    prediction_times はレース番号 → 予想を配信する時刻（JST）。pre_race の先行時間は実測から決まるので、
+    計画した時刻をそのまま載せる（ないレースは予想しない）。
+    """
+    lines = [f"🌅 {_subject(data['player_name'])}本日の出走予定"]
     if data["race_title"]:
         lines.append(f"📍 {data['race_title']}")
     lines.append(f"💰 1レースあたりの予算: {RACE_BUDGET:,}円（{len(races)}レース合計: {RACE_BUDGET * len(races):,}円）")
     lines.append("")
 
     for race in races:
-        lines.append(f"  {race['race_no']}R ｜ {race['course']} ｜ 締切 {race['deadline']}")
+        course = f" ｜ {race['course']}" if race["course"] else ""
+        predict_at = prediction_times.get(int(race["race_no"]))
+        if predict_at is None:
+            timing = "予想なし"
+        else:
+            # 締切は "HH:MM" なので、日付つきの datetime を組み立てずに分単位で差を取る
+            timing = f"予想 {predict_at.hour:02d}:{predict_at.minute:02d}"
+            m = _DEADLINE_RE.search(race["deadline"])
+            if m:
+                lead_seconds = (int(m.group(1)) * 60 + int(m.group(2))) * 60 - (
+                    predict_at.hour * 3600 + predict_at.minute * 60 + predict_at.second
+                )
+                timing += f"（締切{round(lead_seconds / 60)}分前）"
+        lines.append(f"  {race['race_no']}R{course} ｜ 締切 {race['deadline']} ｜ {timing}")
 
     lines.append("")
-    lines.append("各レースの締切10分前にAI予想を配信します 🤖")
+    lines.append("各レースの予想時刻にAI予想を配信します 🤖")
 
     return "\n".join(lines)
 
@@ -864,8 +1623,7 @@ def build_pre_race_message(
     player_name: str, venue_name: str, race_no: int, prediction: dict, race_index: int, total_races: int
 ) -> str:
     """レース予想メッセージを組み立てる"""
-    name = player_name or f"選手{RACER_NO}"
-    lines = [f"🏁 {name}（{RACER_NO}）{race_no}R 予想 [{race_index}/{total_races}]"]
+    lines = [f"🏁 {_subject(player_name)}{race_no}R 予想 [{race_index}/{total_races}]"]
     lines.append(f"📍 {venue_name}")
     lines.append(f"💰 予算: {RACE_BUDGET:,}円")
     lines.append("")
@@ -888,6 +1646,31 @@ def build_pre_race_message(
     return "\n".join(lines)
 
 
+def build_odds_refresh_message(
+    player_name: str, venue_name: str, race_no: int, bets: list[dict], delta: dict, race_index: int, total_races: int
+) -> str:
+    """締切直前のオッズ変動による買い目金額の更新メッセージを組み立てる"""
+    lines = [f"🔄 {_subject(player_name)}{race_no}R 直前オッズで配分更新 [{race_index}/{total_races}]"]
+    lines.append(f"📍 {venue_name}")
+    lines.append("")
+
+    if delta["moved"]:
+        lines.append("【オッズ変動】")
+        for combo, before, after in delta["moved"]:
+            lines.append(f"  {combo}  {before:.1f} → {after:.1f}倍")
+    else:
+        lines.append(f"【オッズ変動】全体の支持率が {delta['shift'] * 100:.0f}% 動きました")
+    lines.append("")
+
+    lines.append("【更新後の買い目（3連単）】")
+    for bet in bets:
+        lines.append(f"  🎯 {bet['combination']}  {int(bet['amount']):,}円")
+    lines.append("")
+    lines.append(f"📊 投資合計: {sum(int(bet['amount']) for bet in bets):,}円")
+
+    return "\n".join(lines)
+
+
 def build_post_race_message(
     player_name: str,
     venue_name: str,
@@ -901,8 +1684,7 @@ def build_post_race_message(
     daily_summary: dict | None = None,
 ) -> str:
     """レース結果メッセージを組み立てる。最終レースなら日次まとめも含む。"""
-    name = player_name or f"選手{RACER_NO}"
-    lines = [f"📋 {name}（{RACER_NO}）{race_no}R 結果 [{race_index}/{total_races}]"]
+    lines = [f"📋 {_subject(player_name)}{race_no}R 結果 [{race_index}/{total_races}]"]
     lines.append(f"📍 {venue_name}")
     lines.append("")
 
@@ -926,6 +1708,14 @@ def build_post_race_message(
     lines.append(f"  的中: {hit_count}/{len(results)}本")
 
     # 最終レースの場合、日次まとめ + 累計収支を追加
+    lines += _daily_summary_lines(daily_summary)
+
+    return "\n".join(lines)
+
+
+def _daily_summary_lines(daily_summary: dict | None) -> list[str]:
+    """日次まとめ + 累計収支の行（daily_summary がなければ空）"""
+    lines: list[str] = []
     if daily_summary:
         day_bet = daily_summary["total_bet"]
         day_return = daily_summary["total_return"]
@@ -959,6 +1749,64 @@ def build_post_race_message(
                 roi = (cum_return / cum_bet) * 100
                 lines.append(f"  回収率: {roi:.1f}%")
 
+    return lines
+
+
+def build_settlement_message(
+    player_name: str, venue_name: str, date: str, settled: list[dict], daily_summary: dict | None = None
+) -> str:
+    """一括精算（settle）の結果メッセージを組み立てる。最終レースを含めば日次まとめも含む。"""
+    lines = [f"🧾 {_subject(player_name)}{date[4:6]}/{date[6:]} 結果まとめ（{len(settled)}R）"]
+    lines.append(f"📍 {venue_name}")
+    lines.append("")
+
+    for race in settled:
+        mark = "✅" if race["total_return"] else "❌"
+        actual_result = race["results"][0]["actual_result"] if race["results"] else "不明"
+        pnl_sign = "+" if race["race_pnl"] >= 0 else ""
+        lines.append(
+            f"  {mark} {race['race_no']}R {actual_result} ｜ 投資 {race['total_bet']:,}円 → "
+            f"回収 {race['total_return']:,}円（{pnl_sign}{race['race_pnl']:,}円）"
+        )
+
+    total_pnl = sum(race["race_pnl"] for race in settled)
+    lines.append("")
+    lines.append(f"📊 精算分の損益: {'+' if total_pnl >= 0 else ''}{total_pnl:,}円")
+
+    lines += _daily_summary_lines(daily_summary)
+    return "\n".join(lines)
+
+
+def build_digest_message(date: str, summary: dict) -> str:
+    """全会場の当日結果のまとめメッセージを組み立てる"""
+    lines = [f"📰 {date[:4]}/{date[4:6]}/{date[6:]} 全場まとめ（{summary['venue_count']}場 {summary['race_count']}R）"]
+    if not summary["race_count"]:
+        lines.append("")
+        lines.append("結果が確定したレースはありません。")
+        return "\n".join(lines)
+
+    lines.append(
+        f"🥇 1号艇の1着率: {summary['inside_rate'] * 100:.1f}%（{summary['inside_wins']}/{summary['race_count']}R）"
+    )
+    lines.append(
+        f"💴 3連単払戻: 平均 {summary['mean_payout']:,.0f}円 ｜ 中央値 {summary['median_payout']:,.0f}円 ｜ "
+        f"万舟 {summary['manshu_count']}本"
+    )
+    lines.append("")
+
+    lines.append("【高配当】")
+    for rank, race in enumerate(summary["top_payouts"], 1):
+        venue_name = VENUE_NAME_BY_CODE.get(race["jcd"], race["jcd"])
+        lines.append(f"  {rank}. {venue_name} {race['race_no']}R  {race['trifecta']}  {race['payout']:,}円")
+    lines.append("")
+
+    lines.append("【会場別 1号艇の1着率】")
+    for jcd, venue in sorted(summary["by_venue"].items()):
+        lines.append(
+            f"  {VENUE_NAME_BY_CODE.get(jcd, jcd)} {venue['inside_wins']}/{venue['races']}R "
+            f"({venue['inside_rate'] * 100:.0f}%) ｜ 最高 {venue['max_payout']:,}円"
+        )
+
     return "\n".join(lines)
 
 
@@ -966,27 +1814,14 @@ def build_post_race_message(
 # Discord 送信
 # =============================================
 def send_discord_message(text: str) -> None:
-    """Discord Webhook でメッセージを送信する（2000文字上限を自動分割）"""
+    """Discord Webhook でメッセージを送信する。
+
+    OUTBOX_QUEUE_URL が設定されていればアウトボックス（SQS）に積んで戻り、送信は dispatcher.py が行う。
+    未設定なら discord_delivery でその場で送信する（行単位で分割、長文は embed に詰める。レート制限に追従）。
+    """
     if not text.strip():
         return
-    text = text.strip()
-    # Discord メッセージ上限は 2000 文字。超える場合は分割送信
-    chunks = [text[i : i + 2000] for i in range(0, len(text), 2000)]
-    for chunk in chunks:
-        data = json.dumps({"content": chunk}).encode("utf-8")
-        req = urllib.request.Request(
-            DISCORD_WEBHOOK_URL,
-            data=data,
-            headers={
-                "Content-Type": "application/json",
-                "User-Agent": "DiscordBot (https://github.com/agentcore-line-chatbot, 1.0)",
-            },
-            method="POST",
-        )
-        try:
-            urllib.request.urlopen(req, timeout=10)
-        except Exception as e:
-            logger.error(f"Failed to send Discord message: {e}")
+    outbox.enqueue(DISCORD_WEBHOOK_URL, text, kind=get_dimension("Mode"))
 
 
 # =============================================
@@ -997,9 +1832,10 @@ def schedule_handler(event, context):
     today = datetime.now(JST).strftime("%Y%m%d")
     logger.info(f"Schedule handler: RACER_NO={RACER_NO}, date={today}")
 
-    # 1. 競艇日和から出走予定を取得
+    # 1. 競艇日和から出走予定を取得（欠場・差し替えを拾うための再実行もあるので、キャッシュは使わず毎回取得する）
     html = fetch_racer_page(RACER_NO)
-    data = parse_racer_page(html)
+    with timed("ParseDuration", PageType="racer"):
+        data = parse_racer_page(html)
     logger.info(
         f"Schedule: has_schedule={data['has_schedule']}, race_title={data['race_title']}, rows={len(data['race_rows'])}"
     )
@@ -1018,6 +1854,7 @@ def schedule_handler(event, context):
         return {"statusCode": 200, "body": msg}
 
     jcd = VENUE_CODE_MAP[venue_name]
+    update_dimensions(Venue=jcd)
     logger.info(f"Venue: {venue_name} (jcd={jcd})")
 
     # 3. レース情報を整理
@@ -1036,72 +1873,37 @@ def schedule_handler(event, context):
     total_races = len(races)
     logger.info(f"Found {total_races} races")
 
-    # 4. EventBridge Scheduler で各レースの pre_race / post_race スケジュールを作成
-    now_jst = datetime.now(JST)
-    schedules_created = 0
-
-    for idx, race in enumerate(races):
-        race_no = race["race_no"]
-        deadline_dt = parse_deadline_time(race["deadline"], today)
-        if not deadline_dt:
-            logger.warning(f"Could not parse deadline for race {race_no}: {race['deadline']}")
-            continue
-
-        race_index = idx + 1  # 1-based
-
-        # 共通ペイロード
-        base_payload = {
-            "race_no": race_no,
-            "jcd": jcd,
-            "venue_name": venue_name,
-            "date": today,
-            "player_name": data["player_name"],
-            "total_races": total_races,
-            "race_index": race_index,
-            "course_info": race["course"],
-        }
-
-        # pre_race: 締切10分前
-        pre_race_time = deadline_dt - timedelta(minutes=10)
-        if pre_race_time > now_jst:
-            pre_race_utc = pre_race_time.astimezone(timezone.utc)
-            create_one_time_schedule(
-                schedule_name=f"pre-race-{today}-{race_no}",
-                fire_at_utc=pre_race_utc,
-                payload={**base_payload, "mode": "pre_race"},
-            )
-            schedules_created += 1
-            logger.info(f"Scheduled pre_race for {race_no}R at {pre_race_time.strftime('%H:%M')} JST")
-        else:
-            logger.warning(f"Skipping pre_race for {race_no}R — time already passed ({pre_race_time.strftime('%H:%M')} JST)")
-
-        # post_race: 締切20分後
-        post_race_time = deadline_dt + timedelta(minutes=20)
-        if post_race_time > now_jst:
-            post_race_utc = post_race_time.astimezone(timezone.utc)
-            create_one_time_schedule(
-                schedule_name=f"post-race-{today}-{race_no}",
-                fire_at_utc=post_race_utc,
-                payload={**base_payload, "mode": "post_race"},
-            )
-            schedules_created += 1
-            logger.info(f"Scheduled post_race for {race_no}R at {post_race_time.strftime('%H:%M')} JST")
-        else:
-            logger.warning(f"Skipping post_race for {race_no}R — time already passed ({post_race_time.strftime('%H:%M')} JST)")
+    # 4. 各レースの pre_race / post_race（/ odds_refresh）スケジュールを組み立て、既存のスケジュールとの差分だけ反映する
+    common = {
+        "jcd": jcd,
+        "venue_name": venue_name,
+        "date": today,
+        "player_name": data["player_name"],
+        "schedule_version": schedule_version(races),
+    }
+    desired, prediction_times = plan_race_schedules(today, races, common)
+    counts = sync_schedules(desired, prefixes=schedule_prefixes(today))
 
     # 5. DynamoDB に保存
     save_schedule(today, data, venue_name, jcd, races)
 
-    # 6. Discord通知
-    msg = build_schedule_message(data, races)
+    # 6. 全レースの出走表を先に取得しておく（pre_race は直前情報・オッズだけ取ればよくなる）
+    prefetch_race_cards(today, jcd, [race["race_no"] for race in races])
+
+    # 7. Discord通知
+    msg = build_schedule_message(data, races, prediction_times)
     send_discord_message(msg)
-    logger.info(f"Schedule handler completed. {schedules_created} schedules created.")
+    logger.info(
+        f"Schedule handler completed. {len(desired)} schedules "
+        f"({counts['created']} created, {counts['updated']} updated, {counts['deleted']} deleted)."
+    )
 
     return {"statusCode": 200, "body": msg}
 
 
 def pre_race_handler(event, context):
     """レース予想ハンドラ: 出走表・直前情報・オッズ取得 → AI予想生成 → Discord通知"""
+    started = time.perf_counter()
     race_no = event["race_no"]
     jcd = event["jcd"]
     venue_name = event["venue_name"]
@@ -1110,29 +1912,46 @@ def pre_race_handler(event, context):
     total_races = event["total_races"]
     race_index = event["race_index"]
     course_info = event.get("course_info", "")
+    deadline = datetime.fromisoformat(event["deadline"]) if event.get("deadline") else None
 
     logger.info(f"Pre-race handler: race_no={race_no}, venue={venue_name}, date={date}")
 
-    # 1. boatrace.jp から3つのページを取得
-    # 出走表
-    racelist_url = f"{BOATRACE_BASE}/racelist?rno={race_no}&jcd={jcd}&hd={date}"
-    logger.info(f"Fetching racelist: {racelist_url}")
-    racelist_text = fetch_and_extract_text(racelist_url)
-    time.sleep(1)
-
-    # 直前情報
-    beforeinfo_url = f"{BOATRACE_BASE}/beforeinfo?rno={race_no}&jcd={jcd}&hd={date}"
-    logger.info(f"Fetching beforeinfo: {beforeinfo_url}")
-    beforeinfo_text = fetch_and_extract_text(beforeinfo_url)
-    time.sleep(1)
-
-    # オッズ（3連単）
-    odds_url = f"{BOATRACE_BASE}/oddstf?rno={race_no}&jcd={jcd}&hd={date}"
-    logger.info(f"Fetching odds: {odds_url}")
-    odds_text = fetch_and_extract_text(odds_url, max_length=8000)
-
-    # 2. Bedrock Claude で予想を生成
-    logger.info(f"Invoking Bedrock for prediction (race {race_no}R)...")
+    # 1. 出走表は朝に保存した出走カードを使い、直前情報・オッズ（odds_refresh 用の3連単スナップショットも）
+    #    だけ boatrace.jp から取得する。ページは呼び出し内共有のレート制限で並列に取る
+    racelist_text = get_race_card(date, race_no)
+    emit({"RaceCardHit": (int(racelist_text is not None), "Count")})
+    page_types = ["beforeinfo", "oddstf"] + (["odds3t"] if ODDS_REFRESH_ENABLED else [])
+    if racelist_text is None:
+        logger.info(f"No race card for {race_no}R, fetching racelist")
+        page_types.insert(0, "racelist")
+    urls = {f"{BOATRACE_BASE}/{page_type}?rno={race_no}&jcd={jcd}&hd={date}": page_type for page_type in page_types}
+
+    texts: dict[str, str] = {}
+    odds_snapshot = None
+    pool = http_pool.HttpPool(fetch_page, max_workers=CARD_PREFETCH_WORKERS, limiter=boatrace_limiter)
+    for url, html, error in pool.map(urls):
+        page_type = urls[url]
+        if page_type == "odds3t":
+            # odds_refresh で比較するスナップショット（取れなくても予想は続ける）
+            if error:
+                logger.warning(f"Failed to fetch odds3t for {race_no}R: {error}")
+                continue
+            with timed("ParseDuration", PageType="odds3t"):
+                odds_snapshot = parse_odds3t(html)
+        elif error:
+            raise error
+        else:
+            texts[page_type] = extract_text(html, url, max_length=8000 if page_type == "oddstf" else 6000)
+    if racelist_text is None:
+        racelist_text = texts["racelist"]
+        cache.put(date, "racelist", f"{partition_key}#{race_no}", racelist_text)
+    beforeinfo_text = texts["beforeinfo"]
+    odds_text = texts["oddstf"]
+
+    # 2. Bedrock Claude で予想を生成（計画した先行時間より遅れているほど優先レーンで予算を取る）
+    seconds_to_deadline = (deadline - datetime.now(JST)).total_seconds() if deadline else None
+    lane = bedrock_governor.lane_for_deadline(seconds_to_deadline, event.get("lead_seconds"))
+    logger.info(f"Invoking Bedrock for prediction (race {race_no}R, lane={lane})...")
     prediction = invoke_bedrock_prediction(
         player_name=player_name,
         venue_name=venue_name,
@@ -1142,54 +1961,115 @@ def pre_race_handler(event, context):
         racelist_text=racelist_text,
         beforeinfo_text=beforeinfo_text,
         odds_text=odds_text,
+        lane=lane,
     )
     logger.info(f"Prediction: {json.dumps(prediction, ensure_ascii=False)[:500]}")
 
     # 3. DynamoDB に保存
-    save_prediction(date, race_no, prediction, venue_name, jcd, player_name)
+    save_prediction(date, race_no, prediction, venue_name, jcd, player_name, odds=odds_snapshot)
 
     # 4. Discord通知
     msg = build_pre_race_message(player_name, venue_name, race_no, prediction, race_index, total_races)
     send_discord_message(msg)
+
+    # 5. 処理時間を記録（翌日以降の発火タイミングに使う）
+    record_latency_sample("pre_race", date, (time.perf_counter() - started) * 1000)
     logger.info(f"Pre-race handler completed for {race_no}R")
 
     return {"statusCode": 200, "body": msg}
 
 
-def post_race_handler(event, context):
-    """レース結果ハンドラ: 結果取得 → 的中判定 → 収支計算 → Discord通知"""
+def odds_refresh_handler(event, context):
+    """直前オッズハンドラ: 3連単オッズ取得 → pre_race 時点との比較 → 大きく動いていれば配分更新・Discord通知"""
+    started = time.perf_counter()
     race_no = event["race_no"]
     jcd = event["jcd"]
-    venue_name = event["venue_name"]
     date = event["date"]
-    player_name = event["player_name"]
-    total_races = event["total_races"]
-    race_index = event["race_index"]
 
-    logger.info(f"Post-race handler: race_no={race_no}, venue={venue_name}, date={date}")
+    item = get_prediction(date, race_no)
+    if not item or "odds3t" not in item:
+        logger.warning(f"No odds snapshot for {race_no}R — skipping odds refresh")
+        return {"statusCode": 200, "body": "no snapshot"}
 
-    # 1. DynamoDB から予想を読み出し
-    pred_item = get_prediction(date, race_no)
-    if not pred_item:
-        msg = f"⚠️ {race_no}R の予想データがありません"
+    odds = fetch_odds3t(race_no, jcd, date)
+    if not odds:
+        logger.warning(f"Could not parse odds3t for {race_no}R")
+        return {"statusCode": 200, "body": "no odds"}
+
+    prediction = item["prediction"]
+    old = item_codec.unpack_odds(item["odds3t"])
+    new = item_codec.unpack_odds(item_codec.pack_odds(odds))
+    delta = odds_delta.compare(old, new, [bet["combination"] for bet in prediction.get("bets", [])])
+    logger.info(
+        f"Odds delta {race_no}R: shift={delta['shift']:.3f}, max_change={delta['max_change']:.2f}, "
+        f"moved={len(delta['moved'])}, material={delta['material']}"
+    )
+
+    msg = "odds unchanged"
+    if delta["material"]:
+        venue_name = event["venue_name"]
+        player_name = event["player_name"]
+        bets = odds_delta.reallocate(prediction.get("bets", []), old, new)
+        save_prediction(date, race_no, {**prediction, "bets": bets}, venue_name, jcd, player_name, odds=odds)
+        msg = build_odds_refresh_message(
+            player_name, venue_name, race_no, bets, delta, event["race_index"], event["total_races"]
+        )
         send_discord_message(msg)
-        return {"statusCode": 200, "body": msg}
 
-    prediction = pred_item["prediction"]
+    record_latency_sample("odds_refresh", date, (time.perf_counter() - started) * 1000)
+    logger.info(f"Odds refresh handler completed for {race_no}R (updated={delta['material']})")
+    return {"statusCode": 200, "body": msg}
 
-    # 2. boatrace.jp から個別レース結果を取得
-    result_url = f"{BOATRACE_BASE}/raceresult?rno={race_no}&jcd={jcd}&hd={date}"
-    logger.info(f"Fetching raceresult: {result_url}")
-    html = fetch_page(result_url)
-    race_result = parse_race_result(html)
-    logger.info(f"Race result: trifecta={race_result['trifecta']}, payout={race_result['payout']}")
 
-    if not race_result["trifecta"]:
-        msg = f"⚠️ {race_no}R の結果を取得できませんでした（レース中止またはデータ未反映の可能性）"
-        send_discord_message(msg)
-        return {"statusCode": 200, "body": msg}
+def poll_race_result(race_no: int, jcd: str, date: str, event: dict) -> tuple[dict | None, dict]:
+    """個別レース結果を取得する。3連単が出ていなければ RESULT_INLINE_POLL_DELAYS の間隔で取り直す。
 
-    # 3. 予想と結果を照合
+    条件付き GET で、前回から変わっていないページは読み直さない（検証子は event["validators"] で引き継ぐ）。
+
+    Returns:
+        (結果。まだ出ていなければ None, 最後に受け取った検証子)
+    """
+    result_url = f"{BOATRACE_BASE}/raceresult?rno={race_no}&jcd={jcd}&hd={date}"
+    validators = event.get("validators") or {}
+    deadline = datetime.fromisoformat(event["deadline"]) if event.get("deadline") else None
+    polls = 0
+    for delay in (0, *RESULT_INLINE_POLL_DELAYS):
+        if delay:
+            time.sleep(delay)
+        polls += 1
+        logger.info(f"Fetching raceresult: {result_url} (retry={event.get('retry', 0)}, poll={polls})")
+        html, validators = fetch_page_if_modified(result_url, validators)
+        if html is None:
+            continue
+        with timed("ParseDuration", PageType="raceresult"):
+            race_result = parse_race_result(html)
+        if race_result["trifecta"]:
+            metrics = {"ResultPolls": (polls, "Count"), "ResultRetries": (event.get("retry", 0), "Count")}
+            if deadline:
+                metrics["ResultDelay"] = ((datetime.now(JST) - deadline).total_seconds(), "Seconds")
+            emit(metrics)
+            return race_result, validators
+    return None, validators
+
+
+def reschedule_post_race(event: dict, retry: int, validators: dict) -> None:
+    """結果が出ていない post_race を、間隔を倍々にして（上限 RESULT_RETRY_MAX_SECONDS）予約し直す"""
+    delay = min(RESULT_RETRY_MAX_SECONDS, RESULT_RETRY_BASE_SECONDS * 2 ** (retry - 1))
+    fire_at = datetime.now(JST) + timedelta(seconds=delay)
+    name_prefix = f"venue-{event['jcd']}-" if event.get("scope") == "venue" else ""
+    # post-race-{date}- は schedule の再実行時に sync_schedules が desired にないものを消す範囲なので、別の種類にする
+    name = f"{name_prefix}post-race-retry-{event['date']}-{event['race_no']}-r{retry}"
+    payload = {**event, "retry": retry, "validators": validators}
+    create_one_time_schedule(name, fire_at.astimezone(timezone.utc), payload)
+    logger.info(f"Result for {event['race_no']}R not posted yet — retry {retry} at {fire_at.strftime('%H:%M:%S')} JST")
+
+
+def settle_bets(race_no: int, prediction: dict, race_result: dict) -> tuple[list[dict], int, int]:
+    """予想の買い目をレース結果と照合する
+
+    Returns:
+        (買い目ごとの結果, 投資合計, 回収合計)
+    """
     total_bet = 0
     total_return = 0
     results = []
@@ -1216,39 +2096,97 @@ def post_race_handler(event, context):
             }
         )
 
+    return results, total_bet, total_return
+
+
+def compute_daily_summary(date: str, schedule_version: str | None = None) -> dict | None:
+    """その日の全レース結果から日次収支を集計し、累計収支に反映する（スケジュールがなければ None）
+
+    累計への反映は reconcile_cumulative で差分だけ行うので、何度呼んでも、どのレースの後に呼んでもよい。
+    schedule_version はイベントのペイロードの版（なければスケジュールを DynamoDB から読み直す）。
+    """
+    schedule = get_schedule(date, schedule_version)
+    if not schedule:
+        return None
+    race_nos = [int(r["race_no"]) for r in schedule["races"]]
+    all_results = get_all_results_for_day(date, race_nos)
+
+    day_total_bet = sum(int(r["total_bet"]) for r in all_results)
+    day_total_return = sum(int(r["total_return"]) for r in all_results)
+    day_pnl = day_total_return - day_total_bet
+    counts = [item_codec.result_counts(r) for r in all_results]
+    day_hit_count = sum(hits for hits, _ in counts)
+    day_total_bet_count = sum(bet_count for _, bet_count in counts)
+
+    cumulative = reconcile_cumulative(date, day_total_bet, day_total_return, len(all_results))
+
+    return {
+        "total_bet": day_total_bet,
+        "total_return": day_total_return,
+        "daily_pnl": day_pnl,
+        "hit_count": day_hit_count,
+        "total_bet_count": day_total_bet_count,
+        "cumulative": cumulative,
+    }
+
+
+def post_race_handler(event, context):
+    """レース結果ハンドラ: 結果取得 → 的中判定 → 収支計算 → Discord通知"""
+    race_no = event["race_no"]
+    jcd = event["jcd"]
+    venue_name = event["venue_name"]
+    date = event["date"]
+    player_name = event["player_name"]
+    total_races = event["total_races"]
+    race_index = event["race_index"]
+
+    logger.info(f"Post-race handler: race_no={race_no}, venue={venue_name}, date={date}")
+
+    # 1. DynamoDB から予想を読み出し
+    pred_item = get_prediction(date, race_no)
+    if not pred_item:
+        msg = f"⚠️ {race_no}R の予想データがありません"
+        send_discord_message(msg)
+        return {"statusCode": 200, "body": msg}
+
+    prediction = pred_item["prediction"]
+
+    # 取り直しを待つ間に一括精算（settle）で結果が保存されていれば何もしない
+    if event.get("retry") and get_result(date, race_no):
+        logger.info(f"Result for {race_no}R already settled — skipping retry")
+        return {"statusCode": 200, "body": "already settled"}
+
+    # 2. boatrace.jp から個別レース結果を取得（まだ出ていなければ取り直す）
+    race_result, validators = poll_race_result(race_no, jcd, date, event)
+    if race_result is None:
+        retry = event.get("retry", 0) + 1
+        if retry <= RESULT_MAX_RETRIES:
+            reschedule_post_race(event, retry, validators)
+            return {"statusCode": 200, "body": f"result pending (retry {retry})"}
+        msg = f"⚠️ {race_no}R の結果を取得できませんでした（レース中止またはデータ未反映の可能性）"
+        send_discord_message(msg)
+        return {"statusCode": 200, "body": msg}
+    logger.info(f"Race result: trifecta={race_result['trifecta']}, payout={race_result['payout']}")
+
+    # 3. 予想と結果を照合
+    results, total_bet, total_return = settle_bets(race_no, prediction, race_result)
     race_pnl = total_return - total_bet
     logger.info(f"Race {race_no}R: bet={total_bet}, return={total_return}, pnl={race_pnl}")
 
-    # 4. DynamoDB に結果保存
-    save_result(date, race_no, results, total_bet, total_return, race_pnl)
+    # 4. DynamoDB に結果保存 + 集計アイテムに加算
+    # （Lambda のリトライで同じレースを2回加算しないよう、結果を新規作成したときだけ加算する）
+    created = save_result(date, race_no, results, total_bet, total_return, race_pnl)
+    if created:
+        add_result_to_aggregates(date, jcd, venue_name, event.get("course_info"), results)
+    else:
+        logger.info(f"Result for {race_no}R already saved — skipping aggregate update")
 
-    # 5. 最終レースの場合、日次集計 + 累計収支更新
+    # 5. 最終レース、または最終レースより後に結果が出たレース（審議・やり直しなど）の場合、日次集計 + 累計収支を反映
+    # （反映済みの値との差分だけ加算するので、Lambda のリトライや一括精算と重なっても二重にならない）
     daily_summary = None
-    is_last_race = race_index == total_races
-
-    if is_last_race:
-        logger.info("Last race of the day — computing daily summary")
-        schedule = get_schedule(date)
-        if schedule:
-            race_nos = [int(r["race_no"]) for r in schedule["races"]]
-            all_results = get_all_results_for_day(date, race_nos)
-
-            day_total_bet = sum(int(r["total_bet"]) for r in all_results)
-            day_total_return = sum(int(r["total_return"]) for r in all_results)
-            day_pnl = day_total_return - day_total_bet
-            day_hit_count = sum(sum(1 for bet in r["results"] if bet["hit"]) for r in all_results)
-            day_total_bet_count = sum(len(r["results"]) for r in all_results)
-
-            cumulative = update_cumulative(date, day_total_bet, day_total_return, day_pnl)
-
-            daily_summary = {
-                "total_bet": day_total_bet,
-                "total_return": day_total_return,
-                "daily_pnl": day_pnl,
-                "hit_count": day_hit_count,
-                "total_bet_count": day_total_bet_count,
-                "cumulative": cumulative,
-            }
+    if race_index == total_races or is_day_closed(date):
+        logger.info("Closing the day — computing daily summary")
+        daily_summary = compute_daily_summary(date, event.get("schedule_version"))
 
     # 6. Discord通知
     msg = build_post_race_message(
@@ -1269,25 +2207,337 @@ def post_race_handler(event, context):
     return {"statusCode": 200, "body": msg}
 
 
+def predict_races(date: str, jcd: str, venue_name: str, label: str, races: list[dict], total_races: int) -> list[str]:
+    """複数レースの予想をまとめて行う（会場モード）。Discord 用のメッセージをレース順に返す。
+
+    出走表（出走カードがなければ）・直前情報・オッズは boatrace_limiter の間隔を守って並列に取得し、
+    Bedrock の予想は VENUE_BEDROCK_WORKERS 本まで並列に投げる（予算は governor が締切の近さでレーンを分けて確保する）。
+    1レースの失敗は他のレースを止めない。処理時間は1レース単位ではないので latency_model には記録しない。
+
+    Args:
+        races: [{race_no, race_index, deadline(JST datetime)}, ...]
+    """
+    page_types = ["racelist", "beforeinfo", "oddstf"] + (["odds3t"] if ODDS_REFRESH_ENABLED else [])
+    texts: dict[int, dict] = {race["race_no"]: {} for race in races}
+    urls: dict[str, tuple[int, str]] = {}
+    for race in races:
+        race_no = race["race_no"]
+        racelist_text = get_race_card(date, race_no)
+        if racelist_text is not None:
+            texts[race_no]["racelist"] = racelist_text
+        for page_type in page_types:
+            if page_type not in texts[race_no]:
+                urls[f"{BOATRACE_BASE}/{page_type}?rno={race_no}&jcd={jcd}&hd={date}"] = (race_no, page_type)
+
+    pool = http_pool.HttpPool(fetch_page, max_workers=CARD_PREFETCH_WORKERS, limiter=boatrace_limiter)
+    for url, html, error in pool.map(urls):
+        race_no, page_type = urls[url]
+        if error:
+            logger.warning(f"Failed to fetch {page_type} for {race_no}R: {error}")
+        elif page_type == "odds3t":
+            with timed("ParseDuration", PageType="odds3t"):
+                texts[race_no]["odds3t"] = parse_odds3t(html)
+        else:
+            texts[race_no][page_type] = extract_text(html, url, max_length=8000 if page_type == "oddstf" else 6000)
+            if page_type == "racelist":
+                cache.put(date, "racelist", f"{partition_key}#{race_no}", texts[race_no]["racelist"])
+
+    def predict(race: dict) -> str:
+        race_no = race["race_no"]
+        pages = texts[race_no]
+        missing = [t for t in ("racelist", "beforeinfo", "oddstf") if t not in pages]
+        if missing:
+            raise RuntimeError(f"{race_no}R のページを取得できませんでした: {', '.join(missing)}")
+        lane = bedrock_governor.lane_for_deadline((race["deadline"] - datetime.now(JST)).total_seconds())
+        prediction = invoke_bedrock_prediction(
+            player_name=label,
+            venue_name=venue_name,
+            date=date,
+            race_no=race_no,
+            course_info="",
+            racelist_text=pages["racelist"],
+            beforeinfo_text=pages["beforeinfo"],
+            odds_text=pages["oddstf"],
+            lane=lane,
+        )
+        save_prediction(date, race_no, prediction, venue_name, jcd, label, odds=pages.get("odds3t"))
+        return build_pre_race_message(label, venue_name, race_no, prediction, race["race_index"], total_races)
+
+    messages: dict[int, str] = {}
+    failed = 0
+    with timed("VenuePredictDuration") as m:
+        with ThreadPoolExecutor(max_workers=VENUE_BEDROCK_WORKERS) as executor:
+            futures = {executor.submit(predict, race): race["race_no"] for race in races}
+            for future in as_completed(futures):
+                race_no = futures[future]
+                try:
+                    messages[race_no] = future.result()
+                except Exception as e:
+                    logger.error(f"Prediction failed for {race_no}R: {type(e).__name__}: {e}")
+                    messages[race_no] = f"⚠️ {race_no}R の予想に失敗しました（{type(e).__name__}）"
+                    failed += 1
+        m["RacesPredicted"] = (len(races) - failed, "Count")
+        m["RacesFailed"] = (failed, "Count")
+    return [messages[race["race_no"]] for race in races]
+
+
+def venue_label(venue_name: str) -> str:
+    """会場モードのメッセージ見出し・player_name に使うラベル"""
+    return f"{venue_name} 全レース"
+
+
+def venue_schedule_handler(event, context):
+    """会場スケジュールハンドラ: レース一覧取得 → 全レースの動的スケジュール作成 → 出走表の先読み → Discord通知
+
+    event: {"mode": "venue_schedule", "jcd": "12"}。朝の時点で pre_race の発火時刻を過ぎているレース
+    （途中から会場モードを始めた場合）は、締切前ならこの場でまとめて予想する。
+    """
+    today = event.get("date") or datetime.now(JST).strftime("%Y%m%d")
+    jcd = event["jcd"]
+    venue_name = VENUE_NAME_BY_CODE.get(jcd, jcd)
+    label = venue_label(venue_name)
+    logger.info(f"Venue schedule handler: jcd={jcd}, date={today}")
+
+    # 1. boatrace.jp の会場別レース一覧から全レースの締切予定時刻を取得
+    html = fetch_page(f"{BOATRACE_BASE}/raceindex?jcd={jcd}&hd={today}")
+    with timed("ParseDuration", PageType="raceindex"):
+        index = parse_race_index(html)
+    if not index["races"]:
+        msg = f"🌅 {label}\n\n本日は開催がありません。"
+        send_discord_message(msg)
+        return {"statusCode": 200, "body": msg}
+    races = [{"race_no": r["race_no"], "course": "", "deadline": r["deadline"]} for r in index["races"]]
+    logger.info(f"Found {len(races)} races at {venue_name}")
+
+    # 2. 各レースのスケジュールを venue-{jcd}- の名前空間で作成（選手モードのスケジュールとは別に管理する）
+    name_prefix = f"venue-{jcd}-"
+    common = {
+        "scope": "venue",
+        "jcd": jcd,
+        "venue_name": venue_name,
+        "date": today,
+        "player_name": label,
+        "schedule_version": schedule_version(races),
+    }
+    desired, prediction_times = plan_race_schedules(today, races, common, name_prefix=name_prefix)
+    counts = sync_schedules(desired, prefixes=schedule_prefixes(today, name_prefix))
+
+    # 3. DynamoDB に保存（パーティションは venue#{jcd}）
+    save_schedule(today, {"player_name": label, "race_title": index["race_title"]}, venue_name, jcd, races)
+
+    # 4. 全レースの出走表を先に取得しておく
+    prefetch_race_cards(today, jcd, [race["race_no"] for race in races])
+
+    # 5. pre_race の発火時刻を過ぎたがまだ締切前のレースは、通知のあといまの情報でまとめて予想する
+    now_jst = datetime.now(JST)
+    missed = []
+    for idx, race in enumerate(races):
+        deadline_dt = parse_deadline_time(race["deadline"], today)
+        if deadline_dt and deadline_dt > now_jst and race["race_no"] not in prediction_times:
+            missed.append({"race_no": race["race_no"], "race_index": idx + 1, "deadline": deadline_dt})
+            prediction_times[race["race_no"]] = now_jst
+
+    # 6. Discord通知
+    msg = build_schedule_message({"player_name": label, "race_title": index["race_title"]}, races, prediction_times)
+    send_discord_message(msg)
+
+    if missed:
+        logger.info(f"Predicting {len(missed)} races whose pre_race time has passed")
+        for text in predict_races(today, jcd, venue_name, label, missed, len(races)):
+            send_discord_message(text)
+
+    logger.info(
+        f"Venue schedule handler completed. {len(desired)} schedules "
+        f"({counts['created']} created, {counts['updated']} updated, {counts['deleted']} deleted), "
+        f"{len(missed)} predicted now."
+    )
+    return {"statusCode": 200, "body": msg}
+
+
+def venue_predict_handler(event, context):
+    """会場一括予想ハンドラ: 締切前の全レースをまとめて予想する（手動実行・やり直し用）
+
+    event: {"mode": "venue_predict", "jcd": "12"}。venue_schedule で保存したスケジュールを使う。
+    """
+    date = event.get("date") or datetime.now(JST).strftime("%Y%m%d")
+    jcd = event["jcd"]
+    schedule = get_schedule(date)
+    if not schedule:
+        msg = f"⚠️ {VENUE_NAME_BY_CODE.get(jcd, jcd)} のスケジュールがありません（先に venue_schedule を実行してください）"
+        send_discord_message(msg)
+        return {"statusCode": 200, "body": msg}
+
+    now_jst = datetime.now(JST)
+    races = []
+    for idx, race in enumerate(schedule["races"]):
+        deadline_dt = parse_deadline_time(race["deadline"], date)
+        if deadline_dt and deadline_dt > now_jst:
+            races.append({"race_no": int(race["race_no"]), "race_index": idx + 1, "deadline": deadline_dt})
+    logger.info(f"Venue predict handler: jcd={jcd}, date={date}, races={[r['race_no'] for r in races]}")
+
+    messages = predict_races(date, jcd, schedule["venue_name"], schedule["player_name"], races, len(schedule["races"]))
+    for text in messages:
+        send_discord_message(text)
+    return {"statusCode": 200, "body": "\n\n".join(messages) or "no races left"}
+
+
+def digest_handler(event, context):
+    """全場まとめハンドラ: 全会場の結果一覧を並列取得 → 1号艇の1着率・高配当を集計 → Discord通知
+
+    event: {"mode": "digest"}（date を省略すると当日）。開催のない会場は結果一覧が空なので集計に入らない。
+    """
+    date = event.get("date") or datetime.now(JST).strftime("%Y%m%d")
+    jcds = sorted(VENUE_NAME_BY_CODE)
+    logger.info(f"Digest handler: date={date}, venues={len(jcds)}")
+
+    with timed("DigestDuration") as m:
+        results = fetch_result_lists(date, jcds)
+        summary = digest.summarize(results)
+        m["VenuesWithResults"] = (summary["venue_count"], "Count")
+        m["DigestRaces"] = (summary["race_count"], "Count")
+
+    msg = build_digest_message(date, summary)
+    send_discord_message(msg)
+    logger.info(f"Digest handler completed: {summary['venue_count']} venues, {summary['race_count']} races")
+    return {"statusCode": 200, "body": msg}
+
+
+def settle_handler(event, context):
+    """一括精算ハンドラ: 結果一覧1ページで、その日の未精算の予想をまとめて照合・保存 → Discord通知
+
+    event: {"mode": "settle"}（会場モードは "scope": "venue", "jcd": ...、日付を遡るときは "date"）。
+    post_race が結果を取れなかったレースの深夜の取りこぼし回収にも使う。結果一覧にないレースだけ個別ページを取得する。
+    """
+    date = event.get("date") or datetime.now(JST).strftime("%Y%m%d")
+    schedule = get_schedule(date)
+    if not schedule:
+        logger.info(f"Settle handler: no schedule for {date} (partition={partition_key})")
+        return {"statusCode": 200, "body": "no schedule"}
+
+    jcd = schedule["venue_code"]
+    venue_name = schedule["venue_name"]
+    update_dimensions(Venue=jcd)
+    races = schedule["races"]
+    race_nos = [int(r["race_no"]) for r in races]
+
+    # 1. 予想があって結果がまだなく、締切を過ぎたレースを集める（予想・結果とも Query 1 回ずつ）
+    predictions = get_predictions_for_day(date)
+    settled_nos = {int(r["race_no"]) for r in get_all_results_for_day(date, race_nos)}
+    now_jst = datetime.now(JST)
+    pending = []
+    for idx, race in enumerate(races):
+        race_no = int(race["race_no"])
+        deadline_dt = parse_deadline_time(race["deadline"], date)
+        if race_no in predictions and race_no not in settled_nos and deadline_dt and deadline_dt < now_jst:
+            pending.append({"race_no": race_no, "race_index": idx + 1, "course": race.get("course")})
+    logger.info(f"Settle handler: date={date}, jcd={jcd}, pending={[r['race_no'] for r in pending]}")
+    if not pending:
+        return {"statusCode": 200, "body": "nothing to settle"}
+
+    with timed("SettleDuration") as m:
+        # 2. 結果一覧を1回だけ取得し、載っていないレースだけ個別ページで補う
+        html = fetch_page(f"{BOATRACE_BASE}/resultlist?jcd={jcd}&hd={date}")
+        with timed("ParseDuration", PageType="resultlist"):
+            listed = {race["race_no"]: race for race in parse_result_list(html)}
+        fallbacks = 0
+        race_results: dict[int, dict] = {}
+        for race in pending:
+            race_no = race["race_no"]
+            if race_no in listed:
+                race_results[race_no] = listed[race_no]
+                continue
+            fallbacks += 1
+            if fallbacks > 1:
+                time.sleep(1)
+            race_html = fetch_page(f"{BOATRACE_BASE}/raceresult?rno={race_no}&jcd={jcd}&hd={date}")
+            with timed("ParseDuration", PageType="raceresult"):
+                race_result = parse_race_result(race_html)
+            if race_result["trifecta"]:
+                race_results[race_no] = race_result
+            else:
+                logger.warning(f"No result for {race_no}R yet — leaving it pending")
+
+        # 3. 照合して保存し、集計アイテムに加算する（同じレースを post_race のやり直しが先に保存していたら加算しない）
+        settled = []
+        for race in pending:
+            race_no = race["race_no"]
+            if race_no not in race_results:
+                continue
+            results, total_bet, total_return = settle_bets(race_no, predictions[race_no]["prediction"], race_results[race_no])
+            if save_result(date, race_no, results, total_bet, total_return, total_return - total_bet):
+                add_result_to_aggregates(date, jcd, venue_name, race["course"], results)
+            else:
+                logger.info(f"Result for {race_no}R was saved concurrently — skipping aggregate update")
+            settled.append(
+                {
+                    **race,
+                    "results": results,
+                    "total_bet": total_bet,
+                    "total_return": total_return,
+                    "race_pnl": total_return - total_bet,
+                }
+            )
+        m["RacesSettled"] = (len(settled), "Count")
+        m["ResultFallbacks"] = (fallbacks, "Count")
+        m["RacesPending"] = (len(pending) - len(settled), "Count")
+
+    if not settled:
+        return {"statusCode": 200, "body": "no results yet"}
+
+    # 4. 最終レースを精算した場合、またはその日がすでに締められている場合は日次集計 + 累計収支を反映（post_race と同じ）
+    daily_summary = None
+    if any(race["race_index"] == len(races) for race in settled) or is_day_closed(date):
+        daily_summary = compute_daily_summary(date)
+
+    msg = build_settlement_message(schedule["player_name"], venue_name, date, settled, daily_summary)
+    send_discord_message(msg)
+    logger.info(f"Settle handler completed: {len(settled)}/{len(pending)} races ({fallbacks} fallback fetches)")
+    return {"statusCode": 200, "body": msg}
+
+
 def handler(event, context):
     """EventBridge → Lambda エントリポイント (mode で切り替え)"""
-    global SCRAPER_FUNCTION_ARN
+    global SCRAPER_FUNCTION_ARN, partition_key, boatrace_limiter
     if not SCRAPER_FUNCTION_ARN and context:
         SCRAPER_FUNCTION_ARN = context.invoked_function_arn
 
     mode = event.get("mode", "schedule")
-    logger.info(f"Scraper invoked. mode={mode}, RACER_NO={RACER_NO}")
+    # 会場モードのイベント（scope: "venue"）は venue#{jcd} のパーティションに読み書きする
+    if event.get("scope") == "venue" or mode.startswith("venue_"):
+        partition_key = f"{VENUE_PARTITION_PREFIX}{event['jcd']}"
+    else:
+        partition_key = RACER_NO
+    logger.info(f"Scraper invoked. mode={mode}, RACER_NO={RACER_NO}, partition={partition_key}")
+    set_dimensions(Mode=mode, Venue=event.get("jcd", "-"))
+    cache.reset_counters()
+    boatrace_limiter = http_pool.HostRateLimiter(CARD_PREFETCH_INTERVAL)
 
     try:
-        if mode == "schedule":
-            return schedule_handler(event, context)
-        elif mode == "pre_race":
-            return pre_race_handler(event, context)
-        elif mode == "post_race":
-            return post_race_handler(event, context)
-        else:
-            logger.error(f"Unknown mode: {mode}")
-            return {"statusCode": 400, "body": f"Unknown mode: {mode}"}
+        with timed("HandlerDuration") as m:
+            m["race_no"] = event.get("race_no")
+            try:
+                if mode == "schedule":
+                    return schedule_handler(event, context)
+                elif mode == "pre_race":
+                    return pre_race_handler(event, context)
+                elif mode == "odds_refresh":
+                    return odds_refresh_handler(event, context)
+                elif mode == "post_race":
+                    return post_race_handler(event, context)
+                elif mode == "venue_schedule":
+                    return venue_schedule_handler(event, context)
+                elif mode == "venue_predict":
+                    return venue_predict_handler(event, context)
+                elif mode == "digest":
+                    return digest_handler(event, context)
+                elif mode == "settle":
+                    return settle_handler(event, context)
+                else:
+                    logger.error(f"Unknown mode: {mode}")
+                    return {"statusCode": 400, "body": f"Unknown mode: {mode}"}
+            finally:
+                # ウォームキャッシュのヒット率（この呼び出し分）
+                m.update(cache.metrics())
     except Exception as e:
         logger.error(f"Handler error (mode={mode}): {e}", exc_info=True)
         try:
@@ -0,0 +1,185 @@
+"""
+収支の事前集計（日・月・会場・コース別）と統計クエリ
+
+post_race でレース結果を保存するたびに、集計アイテムへ UpdateItem の ADD で加算する。
+統計の問い合わせは集計アイテムだけを読むので、履歴が何年分に増えても読み出し量は変わらない。
+
+集計アイテム（PK は選手番号、SK は以下）:
+  agg#all                 全期間
+  agg#day#{YYYYMMDD}      日別
+  agg#month#{YYYYMM}      月別
+  agg#venue#{jcd}         会場別（label に会場名）
+  agg#course#{course}     進入コース別
+
+各アイテムの属性:
+  total_bet / total_return / race_count / bet_count / hit_count / hit_race_count
+  rank{n}_bet / rank{n}_return / rank{n}_hits  予想の n 番目の買い目（本線=1）ごとの内訳
+"""
+
+from decimal import Decimal
+
+AGG_PREFIX = "agg#"
+SCOPES = ("all", "day", "month", "venue", "course")
+MAX_RANKS = 10  # 買い目順位の内訳を持つ上限
+
+
+def bucket_keys(date: str, jcd: str, course: str | None) -> list[str]:
+    """1レースの結果を加算する集計アイテムの SK 一覧を返す"""
+    keys = [
+        f"{AGG_PREFIX}all",
+        f"{AGG_PREFIX}day#{date}",
+        f"{AGG_PREFIX}month#{date[:6]}",
+        f"{AGG_PREFIX}venue#{jcd}",
+    ]
+    if course and str(course).isdigit():
+        keys.append(f"{AGG_PREFIX}course#{course}")
+    return keys
+
+
+def race_increments(results: list[dict]) -> dict[str, int]:
+    """1レース分の結果（post_race の results）から集計アイテムへの加算値を作る"""
+    increments = {
+        "total_bet": 0,
+        "total_return": 0,
+        "race_count": 1,
+        "bet_count": len(results),
+        "hit_count": 0,
+        "hit_race_count": 0,
+    }
+    for rank, bet in enumerate(results[:MAX_RANKS], start=1):
+        hit = 1 if bet["hit"] else 0
+        increments[f"rank{rank}_bet"] = int(bet["bet_amount"])
+        increments[f"rank{rank}_return"] = int(bet["return_amount"])
+        increments[f"rank{rank}_hits"] = hit
+    for bet in results:
+        increments["total_bet"] += int(bet["bet_amount"])
+        increments["total_return"] += int(bet["return_amount"])
+        increments["hit_count"] += 1 if bet["hit"] else 0
+    increments["hit_race_count"] = 1 if increments["hit_count"] else 0
+    return increments
+
+
+def add_race(
+    table, racer_no: str, date: str, jcd: str, venue_name: str, course: str | None, results: list[dict]
+) -> None:
+    """1レース分の結果を日・月・会場・コース・全期間の集計アイテムに加算する。
+
+    同じレースを2回加算しないよう、呼び出し側は結果アイテムを新規作成したときだけ呼ぶこと。
+    """
+    increments = race_increments(results)
+    names = sorted(increments)
+    add_expr = ", ".join(f"{name} :{name}" for name in names)
+    values = {f":{name}": value for name, value in increments.items()}
+
+    for key in bucket_keys(date, jcd, course):
+        set_expr = "last_updated = :date"
+        item_values = {**values, ":date": date}
+        if key.startswith(f"{AGG_PREFIX}venue#"):
+            set_expr += ", label = :label"
+            item_values[":label"] = venue_name
+        table.update_item(
+            Key={"racer_no": racer_no, "date_type": key},
+            UpdateExpression=f"ADD {add_expr} SET {set_expr}",
+            ExpressionAttributeValues=item_values,
+        )
+
+
+# =============================================
+# 統計クエリ
+# =============================================
+def _int(value) -> int:
+    return int(value) if isinstance(value, (int, Decimal)) else 0
+
+
+def summarize(item: dict) -> dict:
+    """集計アイテムを表示用の統計値（収支・回収率・的中率・買い目順位別）に変換する"""
+    total_bet = _int(item.get("total_bet"))
+    total_return = _int(item.get("total_return"))
+    bet_count = _int(item.get("bet_count"))
+    race_count = _int(item.get("race_count"))
+
+    ranks = []
+    for rank in range(1, MAX_RANKS + 1):
+        bet = _int(item.get(f"rank{rank}_bet"))
+        if not bet:
+            break
+        ret = _int(item.get(f"rank{rank}_return"))
+        ranks.append({"rank": rank, "bet": bet, "return": ret, "hits": _int(item.get(f"rank{rank}_hits"))})
+
+    return {
+        "key": item["date_type"][len(AGG_PREFIX) :],
+        "label": item.get("label", ""),
+        "total_bet": total_bet,
+        "total_return": total_return,
+        "pnl": total_return - total_bet,
+        "roi": total_return / total_bet * 100 if total_bet else 0.0,
+        "race_count": race_count,
+        "bet_count": bet_count,
+        "hit_count": _int(item.get("hit_count")),
+        "hit_race_count": _int(item.get("hit_race_count")),
+        "hit_rate": _int(item.get("hit_race_count")) / race_count * 100 if race_count else 0.0,
+        "ranks": ranks,
+        "last_updated": item.get("last_updated", ""),
+    }
+
+
+def get_stats(table, racer_no: str, scope: str = "all", key: str = "") -> list[dict]:
+    """集計アイテムから統計を返す。
+
+    scope="all" は全期間の1件。それ以外は key を指定すればその1件（例: month / 202610）、
+    省略すればその scope の全バケット（key が前方一致するもの）を SK 順で返す。
+    どの場合も読むのは集計アイテムだけ（会場は最大24件、コースは最大6件）。
+    """
+    if scope not in SCOPES:
+        raise ValueError(f"Unknown scope: {scope}")
+
+    if scope == "all":
+        response = table.get_item(Key={"racer_no": racer_no, "date_type": f"{AGG_PREFIX}all"})
+        return [summarize(response["Item"])] if "Item" in response else []
+
+    items = []
+    kwargs = {
+        "KeyConditionExpression": "racer_no = :pk AND begins_with(date_type, :prefix)",
+        "ExpressionAttributeValues": {":pk": racer_no, ":prefix": f"{AGG_PREFIX}{scope}#{key}"},
+    }
+    while True:
+        response = table.query(**kwargs)
+        items.extend(response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            break
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    return [summarize(item) for item in items]
+
+
+def build_stats_message(player_name: str, scope: str, stats: list[dict]) -> str:
+    """統計を Discord 用のテキストに整形する"""
+    scope_label = {"all": "全期間", "day": "日別", "month": "月別", "venue": "会場別", "course": "コース別"}[scope]
+    lines = [f"📊 {player_name} 収支統計（{scope_label}）", ""]
+
+    if not stats:
+        lines.append("集計データがありません。")
+        return "\n".join(lines)
+
+    for s in stats:
+        name = s["key"].split("#", 1)[-1]
+        if scope == "venue" and s["label"]:
+            name = f"{s['label']}({name})"
+        elif scope == "course":
+            name = f"{name}コース"
+        elif scope == "all":
+            name = "全期間"
+        pnl_sign = "+" if s["pnl"] >= 0 else ""
+        lines.append(
+            f"**{name}** {s['race_count']}R 収支 {pnl_sign}{s['pnl']:,}円 "
+            f"回収率 {s['roi']:.1f}% 的中 {s['hit_race_count']}/{s['race_count']}R"
+        )
+
+    # 1件だけのときは買い目順位別の内訳も出す
+    if len(stats) == 1 and stats[0]["ranks"]:
+        lines.append("")
+        lines.append("買い目順位別:")
+        for r in stats[0]["ranks"]:
+            roi = r["return"] / r["bet"] * 100 if r["bet"] else 0.0
+            lines.append(f"  {r['rank']}番手 投資 {r['bet']:,}円 回収率 {roi:.1f}% 的中 {r['hits']}回")
+
+    return "\n".join(lines)
@@ -0,0 +1,68 @@
+"""
+/ask リクエスト単位のレイテンシトレース
+
+webhook の handler で発行した trace_id を、自己非同期呼び出し → invoke_agent_runtime の
+ペイロード → エージェント（agent/tracing.py）まで引き回し、区間（span）ごとの所要時間を
+1行1レコードの構造化 JSON として標準出力に書き出す。
+
+  {"type": "span", "trace_id": "...", "span": "discord_edit", "duration_ms": 312.5, ...}
+
+CloudWatch Logs にそのまま流れるので、ログをエクスポートして
+scripts/trace_report.py で区間別のパーセンタイルを集計する。
+"""
+
+import json
+import time
+import uuid
+from contextlib import contextmanager
+
+SPAN_RECORD_TYPE = "span"
+
+# 現在処理中の trace_id（Lambda は1コンテナ1リクエストなのでモジュール変数で保持する）
+_current_trace_id: str | None = None
+
+
+def new_trace_id() -> str:
+    """新しい trace_id を発行する"""
+    return uuid.uuid4().hex
+
+
+def set_trace_id(trace_id: str | None) -> None:
+    """以降の span に付与する trace_id を設定する"""
+    global _current_trace_id
+    _current_trace_id = trace_id
+
+
+def get_trace_id() -> str | None:
+    """現在の trace_id を返す"""
+    return _current_trace_id
+
+
+def emit_span(name: str, duration_ms: float, **attrs) -> None:
+    """計測済みの区間を1レコード出力する"""
+    record = {
+        "type": SPAN_RECORD_TYPE,
+        "trace_id": attrs.pop("trace_id", None) or _current_trace_id,
+        "span": name,
+        "duration_ms": round(duration_ms, 2),
+        "ts": round(time.time(), 3),
+    }
+    record.update(attrs)
+    print(json.dumps(record, ensure_ascii=False), flush=True)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """with ブロックの所要時間を span として出力する。
+
+    yield した dict に値を入れると span の属性として一緒に出力される。
+    例外発生時は error 属性に例外名を入れて再送出する。
+    """
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except Exception as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        emit_span(name, (time.perf_counter() - start) * 1000, **attrs)
@@ -0,0 +1,73 @@
+"""
+ウォームコンテナで使い回すその日の静的データのキャッシュ
+
+同じ会場・同じ日の pre_race / post_race は同じ Lambda コンテナに続けて入ることが多い。
+その日の間は変わらないもの（スケジュールアイテム・出走表のテキスト）をモジュールレベルに保持し、
+2回目以降の DynamoDB 読み出しを省く。スケジュールアイテムは schedule の再実行で書き換わるので、
+イベントが持つ版（schedule_version）をキーに含め、版が分からない読み出しではキャッシュを使わない。選手ページは、出走予定が変わったときに schedule を
+再実行して取り直すので保持しない。
+
+- キーは (種類, キー)。日付が変わったら（別の日付で読み書きしたら）全体を捨てる
+- 件数の上限を超えたら古く使われたものから捨てる（LRU）
+- ヒット・ミスは呼び出し単位で数え、handler の最後に WarmCacheHits / WarmCacheMisses /
+  WarmCacheHitRatio として出力する
+"""
+
+import threading
+from collections import OrderedDict
+
+MAX_ENTRIES = 128
+
+
+class WarmCache:
+    """日付単位で自動的に無効化される LRU キャッシュ（スレッドセーフ）"""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.date: str | None = None
+        self._entries: OrderedDict[tuple[str, str], object] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _switch_date(self, date: str) -> None:
+        if date != self.date:
+            self._entries.clear()
+            self.date = date
+
+    def get(self, date: str, kind: str, key) -> object | None:
+        """キャッシュされた値を返す（なければ None）"""
+        with self._lock:
+            self._switch_date(date)
+            value = self._entries.get((kind, str(key)))
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((kind, str(key)))
+            self.hits += 1
+            return value
+
+    def put(self, date: str, kind: str, key, value) -> None:
+        """値を保持する（None は保持しない）"""
+        if value is None:
+            return
+        with self._lock:
+            self._switch_date(date)
+            self._entries[(kind, str(key))] = value
+            self._entries.move_to_end((kind, str(key)))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def reset_counters(self) -> None:
+        """呼び出し単位のヒット・ミス数を 0 に戻す（handler の開始時）"""
+        self.hits = 0
+        self.misses = 0
+
+    def metrics(self) -> dict[str, tuple[float, str]]:
+        """この呼び出しのヒット・ミス数とヒット率（EMF 用）"""
+        lookups = self.hits + self.misses
+        return {
+            "WarmCacheHits": (self.hits, "Count"),
+            "WarmCacheMisses": (self.misses, "Count"),
+            "WarmCacheHitRatio": (round(self.hits / lookups * 100, 1) if lookups else 0.0, "Percent"),
+        }
@@ -8,15 +8,22 @@ import boto3
 from nacl.signing import VerifyKey
 from nacl.exceptions import BadSignatureError
 
+import stats
+from tracing import emit_span, get_trace_id, new_trace_id, set_trace_id, span
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 DISCORD_PUBLIC_KEY = os.environ["DISCORD_PUBLIC_KEY"]
 DISCORD_APPLICATION_ID = os.environ["DISCORD_APPLICATION_ID"]
 AGENTCORE_RUNTIME_ARN = os.environ["AGENTCORE_RUNTIME_ARN"]
+DYNAMODB_TABLE = os.environ.get("DYNAMODB_TABLE", "BoatRacePredictions")
+RACER_NO = os.environ.get("RACER_NO", "3941")
 
 agentcore_client = boto3.client("bedrock-agentcore", region_name="us-east-1")
 lambda_client = boto3.client("lambda")
+dynamodb = boto3.resource("dynamodb")
+db_table = dynamodb.Table(DYNAMODB_TABLE)
 
 TOOL_STATUS_MAP = {
     "current_time": "⏰ 現在時刻を確認しています...",
@@ -55,10 +62,12 @@ def edit_original_message(interaction_token: str, content: str) -> None:
         },
         method="PATCH",
     )
-    try:
-        urllib.request.urlopen(req, timeout=10)
-    except Exception as e:
-        logger.error(f"Failed to edit message: {e}")
+    with span("discord_edit", chars=len(content)) as attrs:
+        try:
+            urllib.request.urlopen(req, timeout=10)
+        except Exception as e:
+            attrs["error"] = type(e).__name__
+            logger.error(f"Failed to edit message: {e}")
 
 
 def send_followup_message(interaction_token: str, content: str) -> None:
@@ -78,10 +87,12 @@ def send_followup_message(interaction_token: str, content: str) -> None:
         },
         method="POST",
     )
-    try:
-        urllib.request.urlopen(req, timeout=10)
-    except Exception as e:
-        logger.error(f"Failed to send followup: {e}")
+    with span("discord_followup", chars=len(content)) as attrs:
+        try:
+            urllib.request.urlopen(req, timeout=10)
+        except Exception as e:
+            attrs["error"] = type(e).__name__
+            logger.error(f"Failed to send followup: {e}")
 
 
 def process_sse_stream(interaction_token: str, response) -> None:
@@ -93,10 +104,17 @@ def process_sse_stream(interaction_token: str, response) -> None:
 
     ツール実行ステータスは deferred message の編集でリアルタイム表示し、
     最終テキストブロックのみ deferred message の編集で送信する。
+
+    トレース用に最初のテキストチャンク到着（model_first_token）と、
+    ツール開始から次のブロック開始までの区間（sse_tool）を span として出力する。
     """
     text_buffer = ""
     last_text_block = ""
     last_edit_time = 0.0
+    stream_start = time.perf_counter()
+    first_token_seen = False
+    event_count = 0
+    open_tool: tuple[str, float] | None = None  # (ツール名, 開始時刻)
     MIN_EDIT_INTERVAL = 2.0  # Discord API レート制限を考慮した最低間隔（秒）
 
     def throttled_edit(text: str) -> None:
@@ -108,6 +126,14 @@ def process_sse_stream(interaction_token: str, response) -> None:
         edit_original_message(interaction_token, text)
         last_edit_time = time.time()
 
+    def close_open_tool() -> None:
+        """実行中のツール区間があれば span として出力する"""
+        nonlocal open_tool
+        if open_tool:
+            tool_name, started = open_tool
+            emit_span("sse_tool", (time.perf_counter() - started) * 1000, tool=tool_name)
+            open_tool = None
+
     try:
         for line in response["response"].iter_lines(chunk_size=64):
             if not line:
@@ -135,6 +161,7 @@ def process_sse_stream(interaction_token: str, response) -> None:
             inner_event = event.get("event")
             if not isinstance(inner_event, dict):
                 continue
+            event_count += 1
 
             # テキストチャンク
             content_block_delta = inner_event.get("contentBlockDelta")
@@ -142,6 +169,9 @@ def process_sse_stream(interaction_token: str, response) -> None:
                 delta = content_block_delta.get("delta", {})
                 text = delta.get("text", "")
                 if text:
+                    if not first_token_seen:
+                        first_token_seen = True
+                        emit_span("model_first_token", (time.perf_counter() - stream_start) * 1000)
                     text_buffer += text
                 continue
 
@@ -150,9 +180,11 @@ def process_sse_stream(interaction_token: str, response) -> None:
             if content_block_start:
                 start = content_block_start.get("start", {})
                 tool_use = start.get("toolUse", {})
+                close_open_tool()
                 if tool_use:
                     text_buffer = ""
                     tool_name = tool_use.get("name", "unknown")
+                    open_tool = (tool_name, time.perf_counter())
                     status_text = next(
                         (msg for key, msg in TOOL_STATUS_MAP.items() if key in tool_name),
                         f"🔧 {tool_name} を実行しています...",
@@ -172,6 +204,8 @@ def process_sse_stream(interaction_token: str, response) -> None:
         edit_original_message(interaction_token, "❌ エラーが発生しました。もう一度お試しください。")
         return
     finally:
+        close_open_tool()
+        emit_span("sse_stream", (time.perf_counter() - stream_start) * 1000, events=event_count)
         response["response"].close()
 
     # 最終テキストブロックを deferred message に反映（2000文字上限）
@@ -185,6 +219,12 @@ def process_interaction(event: dict) -> dict:
     token = interaction["token"]
     channel_id = interaction.get("channel_id", "")
 
+    # handler で発行した trace_id を引き継ぎ、自己非同期呼び出しの待ち時間を記録する
+    set_trace_id(event.get("trace_id") or new_trace_id())
+    received_at = event.get("received_at")
+    if received_at:
+        emit_span("self_invoke_delay", (time.time() - received_at) * 1000)
+
     # スラッシュコマンドのオプションからユーザーメッセージを取得
     options = interaction.get("data", {}).get("options", [])
     user_message = ""
@@ -210,23 +250,55 @@ def process_interaction(event: dict) -> dict:
     # AgentCore は runtimeSessionId に最低33文字を要求するためプレフィックスを付与
     raw_session_id = channel_id or user_id
     session_id = f"discord-session-{raw_session_id}"
-    payload = json.dumps({"prompt": user_message, "session_id": session_id})
+    payload = json.dumps({"prompt": user_message, "session_id": session_id, "trace_id": get_trace_id()})
 
     try:
-        response = agentcore_client.invoke_agent_runtime(
-            agentRuntimeArn=AGENTCORE_RUNTIME_ARN,
-            runtimeSessionId=session_id,
-            payload=payload.encode("utf-8"),
-            qualifier="DEFAULT",
-        )
+        # invoke_agent_runtime はレスポンスヘッダー受信で戻るため、コールドスタートを含む
+        with span("agentcore_invoke"):
+            response = agentcore_client.invoke_agent_runtime(
+                agentRuntimeArn=AGENTCORE_RUNTIME_ARN,
+                runtimeSessionId=session_id,
+                payload=payload.encode("utf-8"),
+                qualifier="DEFAULT",
+            )
         process_sse_stream(token, response)
     except Exception as e:
         logger.error(f"AgentCore invocation failed: {e}")
         edit_original_message(token, "❌ エラーが発生しました。もう一度お試しください。")
 
+    if received_at:
+        emit_span("ask_total", (time.time() - received_at) * 1000)
+
     return {"statusCode": 200}
 
 
+def handle_stats_command(interaction: dict) -> dict:
+    """/stats コマンド: 集計アイテムだけを読んで即時応答する（AgentCore は呼ばない）"""
+    options = {opt["name"]: opt["value"] for opt in interaction.get("data", {}).get("options", [])}
+    scope = options.get("scope", "all")
+    key = str(options.get("key", ""))
+
+    with span("stats_query", scope=scope) as attrs:
+        try:
+            results = stats.get_stats(db_table, RACER_NO, scope, key)
+            content = stats.build_stats_message(f"選手{RACER_NO}", scope, results)
+            attrs["buckets"] = len(results)
+        except Exception as e:
+            attrs["error"] = type(e).__name__
+            logger.error(f"Stats query failed: {e}")
+            content = "❌ 統計を取得できませんでした。"
+
+    if len(content) > 2000:
+        content = content[:1997] + "..."
+
+    # CHANNEL_MESSAGE_WITH_SOURCE (type 4) で即時応答
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps({"type": 4, "data": {"content": content}}),
+    }
+
+
 def handler(event, context):
     """Lambda handler - API Gatewayから同期呼び出し or 自己非同期呼び出し"""
     logger.info(f"Received event: {json.dumps(event)[:1000]}")
@@ -236,6 +308,7 @@ def handler(event, context):
         return process_interaction(event)
 
     # 同期パス: API Gateway 経由の Discord インタラクション
+    received_at = time.time()
     body_str = event.get("body", "")
     headers = event.get("headers", {})
 
@@ -244,7 +317,10 @@ def handler(event, context):
     timestamp = headers.get("x-signature-timestamp", "") or headers.get("X-Signature-Timestamp", "")
 
     # Discord 署名検証
-    if not verify_discord_signature(body_str, signature, timestamp):
+    set_trace_id(new_trace_id())
+    with span("signature_verify"):
+        verified = verify_discord_signature(body_str, signature, timestamp)
+    if not verified:
         logger.error("Invalid Discord signature")
         return {"statusCode": 401, "body": "Invalid signature"}
 
@@ -259,19 +335,26 @@ def handler(event, context):
             "body": json.dumps({"type": 1}),
         }
 
+    # /stats は DynamoDB の集計アイテムを読むだけなので同期で応答
+    if interaction_type == 2 and interaction.get("data", {}).get("name") == "stats":
+        return handle_stats_command(interaction)
+
     # APPLICATION_COMMAND (type 2) → Deferred + 非同期処理
     if interaction_type == 2:
         # 自身を非同期で呼び出して処理を開始
-        lambda_client.invoke(
-            FunctionName=os.environ["AWS_LAMBDA_FUNCTION_NAME"],
-            InvocationType="Event",
-            Payload=json.dumps(
-                {
-                    "source": "async_process",
-                    "interaction": interaction,
-                }
-            ),
-        )
+        with span("self_invoke"):
+            lambda_client.invoke(
+                FunctionName=os.environ["AWS_LAMBDA_FUNCTION_NAME"],
+                InvocationType="Event",
+                Payload=json.dumps(
+                    {
+                        "source": "async_process",
+                        "interaction": interaction,
+                        "trace_id": get_trace_id(),
+                        "received_at": received_at,
+                    }
+                ),
+            )
         # Deferred Channel Message With Source（「Botが考え中...」を表示）
         return {
             "statusCode": 200,
@@ -6,7 +6,9 @@ import * as events from "aws-cdk-lib/aws-events";
 import * as targets from "aws-cdk-lib/aws-events-targets";
 import * as iam from "aws-cdk-lib/aws-iam";
 import * as lambda from "aws-cdk-lib/aws-lambda";
+import * as lambdaEventSources from "aws-cdk-lib/aws-lambda-event-sources";
 import * as scheduler from "aws-cdk-lib/aws-scheduler";
+import * as sqs from "aws-cdk-lib/aws-sqs";
 import * as agentcore from "@aws-cdk/aws-bedrock-agentcore-alpha";
 import { Construct } from "constructs";
 
@@ -26,6 +28,14 @@ export class AgentcoreDiscordChatbotStack extends cdk.Stack {
         agentcore.RuntimeNetworkConfiguration.usingPublicNetwork(),
       environmentVariables: {
         TAVILY_API_KEY: process.env.TAVILY_API_KEY || "",
+        MODEL_ID: process.env.MODEL_ID || "us.anthropic.claude-sonnet-4-6",
+        FAST_MODEL_ID:
+          process.env.FAST_MODEL_ID ||
+          "us.anthropic.claude-haiku-4-5-20251001-v1:0",
+        // Scraper と共有する Bedrock の予算（下の PredictionTable に置く）
+        DYNAMODB_TABLE: "BoatRacePredictions",
+        BEDROCK_RPM_LIMIT: process.env.BEDROCK_RPM_LIMIT || "50",
+        BEDROCK_TPM_LIMIT: process.env.BEDROCK_TPM_LIMIT || "200000",
         AGENT_OBSERVABILITY_ENABLED: "true",
         OTEL_PYTHON_DISTRO: "aws_distro",
         OTEL_PYTHON_CONFIGURATOR: "aws_configurator",
@@ -108,6 +118,8 @@ export class AgentcoreDiscordChatbotStack extends cdk.Stack {
       partitionKey: { name: "racer_no", type: dynamodb.AttributeType.STRING },
       sortKey: { name: "date_type", type: dynamodb.AttributeType.STRING },
       billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      // Bedrock の分単位の予算アイテム（bedrock_governor.py）は1時間で消す
+      timeToLiveAttribute: "expires_at",
       removalPolicy: cdk.RemovalPolicy.RETAIN,
     });
 
@@ -150,7 +162,8 @@ export class AgentcoreDiscordChatbotStack extends cdk.Stack {
           ],
         },
       }),
-      timeout: cdk.Duration.seconds(180),
+      // 会場モードは1回の呼び出しで複数レースを予想するので余裕を持たせる
+      timeout: cdk.Duration.seconds(300),
       memorySize: 512,
       environment: {
         DISCORD_WEBHOOK_URL: process.env.DISCORD_WEBHOOK_URL || "",
@@ -158,6 +171,15 @@ export class AgentcoreDiscordChatbotStack extends cdk.Stack {
         DYNAMODB_TABLE: predictionTable.tableName,
         SCHEDULER_ROLE_ARN: schedulerRole.roleArn,
         SCHEDULER_GROUP_NAME: schedulerGroup.name!,
+        PRE_RACE_SAFETY_MARGIN: process.env.PRE_RACE_SAFETY_MARGIN || "120",
+        ODDS_REFRESH_ENABLED: process.env.ODDS_REFRESH_ENABLED || "false",
+        MODEL_ID: process.env.MODEL_ID || "us.anthropic.claude-sonnet-4-6",
+        FALLBACK_MODEL_ID:
+          process.env.FALLBACK_MODEL_ID ||
+          "us.anthropic.claude-haiku-4-5-20251001-v1:0",
+        BEDROCK_RPM_LIMIT: process.env.BEDROCK_RPM_LIMIT || "50",
+        BEDROCK_TPM_LIMIT: process.env.BEDROCK_TPM_LIMIT || "200000",
+        VENUE_BEDROCK_WORKERS: process.env.VENUE_BEDROCK_WORKERS || "3",
       },
     });
 
@@ -167,6 +189,19 @@ export class AgentcoreDiscordChatbotStack extends cdk.Stack {
     // Scraper → DynamoDB 読み書き権限
     predictionTable.grantReadWriteData(scraperFn);
 
+    // Agent → DynamoDB 更新権限（Bedrock の予算アイテムへの加算のみ）
+    runtime.addToRolePolicy(
+      new iam.PolicyStatement({
+        actions: ["dynamodb:UpdateItem"],
+        resources: [predictionTable.tableArn],
+      }),
+    );
+
+    // Webhook → DynamoDB 読み取り権限（/stats で集計アイテムを読む）
+    predictionTable.grantReadData(webhookFn);
+    webhookFn.addEnvironment("DYNAMODB_TABLE", predictionTable.tableName);
+    webhookFn.addEnvironment("RACER_NO", process.env.RACER_NO || "3941");
+
     // Scraper → Bedrock モデル呼び出し権限
     scraperFn.addToRolePolicy(
       new iam.PolicyStatement({
@@ -193,6 +228,7 @@ export class AgentcoreDiscordChatbotStack extends cdk.Stack {
       new iam.PolicyStatement({
         actions: [
           "scheduler:CreateSchedule",
+          "scheduler:UpdateSchedule",
           "scheduler:DeleteSchedule",
           "scheduler:GetSchedule",
         ],
@@ -201,6 +237,13 @@ export class AgentcoreDiscordChatbotStack extends cdk.Stack {
         ],
       }),
     );
+    // ListSchedules はリソースレベルの制限に対応していない
+    scraperFn.addToRolePolicy(
+      new iam.PolicyStatement({
+        actions: ["scheduler:ListSchedules"],
+        resources: ["*"],
+      }),
+    );
 
     // Scraper → iam:PassRole (Scheduler 用ロールを渡す権限)
     scraperFn.addToRolePolicy(
@@ -222,6 +265,57 @@ export class AgentcoreDiscordChatbotStack extends cdk.Stack {
       }),
     );
 
+    // ========================================
+    // Discord 通知アウトボックス (SQS + Dispatcher Lambda)
+    // Scraper は SQS に積むだけで戻り、Dispatcher がまとめて Discord に送る
+    // ========================================
+    const outboxDlq = new sqs.Queue(this, "DiscordOutboxDLQ", {
+      retentionPeriod: cdk.Duration.days(14),
+    });
+    const outboxQueue = new sqs.Queue(this, "DiscordOutboxQueue", {
+      // Dispatcher のタイムアウト（60 秒）の 6 倍（AWS の推奨）
+      visibilityTimeout: cdk.Duration.seconds(360),
+      deadLetterQueue: { queue: outboxDlq, maxReceiveCount: 5 },
+    });
+
+    const dispatcherFn = new lambda.Function(this, "DispatcherFunction", {
+      runtime: lambda.Runtime.PYTHON_3_13,
+      architecture: lambda.Architecture.ARM_64,
+      handler: "dispatcher.handler",
+      code: lambda.Code.fromAsset(path.join(__dirname, "../lambda"), {
+        bundling: {
+          image: lambda.Runtime.PYTHON_3_13.bundlingImage,
+          platform: "linux/arm64",
+          command: [
+            "bash",
+            "-c",
+            "pip install -r requirements.txt -t /asset-output && cp *.py /asset-output",
+          ],
+        },
+      }),
+      timeout: cdk.Duration.seconds(60),
+      memorySize: 256,
+      environment: {
+        METRICS_NAMESPACE: "BoatRaceScraper",
+      },
+    });
+    dispatcherFn.addEventSource(
+      new lambdaEventSources.SqsEventSource(outboxQueue, {
+        batchSize: 25,
+        maxBatchingWindow: cdk.Duration.seconds(5),
+        reportBatchItemFailures: true,
+        // 同時実行は最小の 2 に絞る（予約同時実行で絞るとスロットリングされたバッチが
+        // 受信回数を消費して DLQ に落ちるため、イベントソース側で制限する）
+        maxConcurrency: 2,
+      }),
+    );
+
+    outboxQueue.grantSendMessages(scraperFn);
+    scraperFn.addEnvironment("OUTBOX_QUEUE_URL", outboxQueue.queueUrl);
+    // 途中まで送れたメッセージの残りを積み直す
+    outboxQueue.grantSendMessages(dispatcherFn);
+    dispatcherFn.addEnvironment("OUTBOX_QUEUE_URL", outboxQueue.queueUrl);
+
     // EventBridge Rule: 毎朝 JST 8:00 (= UTC 23:00 前日) にスケジュール生成
     const morningRule = new events.Rule(this, "MorningScraperRule", {
       ruleName: "boat-race-morning-schedule",
@@ -241,6 +335,91 @@ export class AgentcoreDiscordChatbotStack extends cdk.Stack {
       }),
     );
 
+    // EventBridge Rule: 毎晩 JST 21:30 (= UTC 12:30) に全場まとめ
+    const digestRule = new events.Rule(this, "DigestScraperRule", {
+      ruleName: "boat-race-daily-digest",
+      schedule: events.Schedule.cron({
+        minute: "30",
+        hour: "12",
+        day: "*",
+        month: "*",
+        year: "*",
+      }),
+      description: "毎日 JST 21:30 に全24会場の結果一覧を集計して Discord 通知",
+    });
+    digestRule.addTarget(
+      new targets.LambdaFunction(scraperFn, {
+        event: events.RuleTargetInput.fromObject({ mode: "digest" }),
+      }),
+    );
+
+    // EventBridge Rule: 毎晩 JST 23:30 (= UTC 14:30) に未精算レースの一括精算（取りこぼしの回収）
+    const settleRule = new events.Rule(this, "SettleScraperRule", {
+      ruleName: "boat-race-daily-settle",
+      schedule: events.Schedule.cron({
+        minute: "30",
+        hour: "14",
+        day: "*",
+        month: "*",
+        year: "*",
+      }),
+      description: "毎日 JST 23:30 に結果一覧1ページで未精算の予想をまとめて精算",
+    });
+    settleRule.addTarget(
+      new targets.LambdaFunction(scraperFn, {
+        event: events.RuleTargetInput.fromObject({ mode: "settle" }),
+      }),
+    );
+
+    // EventBridge Rule: VENUE_CODES（例: "12,24"）の会場ごとに、毎朝 JST 8:05 に全レースのスケジュール生成
+    // （毎晩 JST 23:35 に会場モードの一括精算も行う）
+    const venueCodes = (process.env.VENUE_CODES || "")
+      .split(",")
+      .map((code) => code.trim())
+      .filter((code) => code);
+    for (const jcd of venueCodes) {
+      const venueRule = new events.Rule(this, `VenueScraperRule${jcd}`, {
+        ruleName: `boat-race-venue-schedule-${jcd}`,
+        schedule: events.Schedule.cron({
+          minute: "5",
+          hour: "23",
+          day: "*",
+          month: "*",
+          year: "*",
+        }),
+        description: `毎日 JST 8:05 に会場 ${jcd} の全レースの動的スケジュール作成`,
+      });
+      venueRule.addTarget(
+        new targets.LambdaFunction(scraperFn, {
+          event: events.RuleTargetInput.fromObject({
+            mode: "venue_schedule",
+            jcd,
+          }),
+        }),
+      );
+
+      const venueSettleRule = new events.Rule(this, `VenueSettleRule${jcd}`, {
+        ruleName: `boat-race-venue-settle-${jcd}`,
+        schedule: events.Schedule.cron({
+          minute: "35",
+          hour: "14",
+          day: "*",
+          month: "*",
+          year: "*",
+        }),
+        description: `毎日 JST 23:35 に会場 ${jcd} の未精算レースを一括精算`,
+      });
+      venueSettleRule.addTarget(
+        new targets.LambdaFunction(scraperFn, {
+          event: events.RuleTargetInput.fromObject({
+            mode: "settle",
+            scope: "venue",
+            jcd,
+          }),
+        }),
+      );
+    }
+
     // ========================================
     // Outputs
     // ========================================
@@ -0,0 +1,258 @@
+"""
+過去のレース結果の一括取得（バックフィル）
+
+boatrace.jp の結果一覧ページ（resultlist）を 日付範囲 × 24会場 で取得し、
+各レースの3連単結果と払戻金をローカルの CSV か DynamoDB に書き出す。
+戦略の検証用データセットを、実行のたびに boatrace.jp を叩かずに使えるようにするためのもの。
+
+- 取得は lambda/http_pool.py のプールで並列化し、同一ホストへの間隔を --interval 秒以上空ける
+- 完了した 日付×会場 はチェックポイントファイルに記録し、再実行時はスキップする（中断しても再開できる）
+- 取得に失敗したもの、結果が 1 件も読めなかったもの（開催なし・メンテナンス中などの空ページ）は完了扱いにせず次回取り直す
+- 今日（JST）以降はレースが終わっておらず結果一覧が欠けるので、--end に含めても取得しない
+
+使い方:
+  python scripts/backfill.py --start 20240101 --end 20241231 --out history.csv
+  python scripts/backfill.py --start 20240101 --end 20240131 --venues 01,12,24 --workers 2 --interval 2
+  python scripts/backfill.py --start 20240101 --end 20241231 --dynamodb --table BoatRacePredictions
+  python scripts/backfill.py --start 20240101 --end 20241231 --store history   # 列指向ストア（history_store.py）
+
+DynamoDB に書く場合は PK=venue#{jcd}, SK={YYYYMMDD}#history#{race_no} のアイテムを
+BatchWriteItem（boto3 の batch_writer）でまとめて書き込む。
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda")
+
+CSV_FIELDS = ["date", "jcd", "race_no", "trifecta", "payout"]
+
+
+# =============================================
+# チェックポイント
+# =============================================
+class Checkpoint:
+    """完了した 日付#会場 の集合をファイルに保存する（書き込みは一時ファイル経由で置き換え）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: set[str] = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.done = set(json.load(f).get("done", []))
+
+    @staticmethod
+    def key(date: str, jcd: str) -> str:
+        return f"{date}#{jcd}"
+
+    def add(self, date: str, jcd: str) -> None:
+        self.done.add(self.key(date, jcd))
+
+    def save(self) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"done": sorted(self.done)}, f)
+        os.replace(tmp, self.path)
+
+
+# =============================================
+# 書き出し先
+# =============================================
+class CsvSink:
+    """CSV に追記する。既存ファイルにある 日付×会場 は完了済みとして扱う"""
+
+    def __init__(self, path: str):
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self.existing: set[str] = set()
+        if exists:
+            with open(path, encoding="utf-8", newline="") as f:
+                self.existing = {Checkpoint.key(row["date"], row["jcd"]) for row in csv.DictReader(f)}
+        self._f = open(path, "a", encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(self._f, fieldnames=CSV_FIELDS)
+        if not exists:
+            self._writer.writeheader()
+
+    def write(self, date: str, jcd: str, races: list[dict]) -> None:
+        for race in races:
+            self._writer.writerow(
+                {"date": date, "jcd": jcd, "race_no": race["race_no"], "trifecta": race["trifecta"], "payout": race["payout"]}
+            )
+
+    def flush(self) -> None:
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class DynamoDBSink:
+    """flush のたびに batch_writer で BatchWriteItem にまとめて書き込む（25件単位・未処理分の再送は boto3 が行う）"""
+
+    def __init__(self, table):
+        self.table = table
+        self.existing: set[str] = set()
+        self._items: list[dict] = []
+
+    def write(self, date: str, jcd: str, races: list[dict]) -> None:
+        for race in races:
+            self._items.append(
+                {
+                    "racer_no": f"venue#{jcd}",
+                    "date_type": f"{date}#history#{race['race_no']}",
+                    "date": date,
+                    "venue_code": jcd,
+                    "race_no": race["race_no"],
+                    "trifecta": race["trifecta"],
+                    "payout": race["payout"],
+                }
+            )
+
+    def flush(self) -> None:
+        if not self._items:
+            return
+        with self.table.batch_writer(overwrite_by_pkeys=["racer_no", "date_type"]) as batch:
+            for item in self._items:
+                batch.put_item(Item=item)
+        self._items = []
+
+    def close(self) -> None:
+        self.flush()
+
+
+class StoreSink:
+    """history_store.py の列指向ストアに flush ごとにまとめて追記する"""
+
+    def __init__(self, path: str):
+        import numpy as np
+        from history_store import HistoryStore
+
+        self.store = HistoryStore.create(path)
+        self.existing: set[str] = set()
+        if len(self.store):
+            pairs = np.unique(self.store["date"].astype(np.int64) * 100 + self.store["jcd"])
+            self.existing = {Checkpoint.key(str(p // 100), f"{p % 100:02d}") for p in pairs}
+        self._records: list[dict] = []
+
+    def write(self, date: str, jcd: str, races: list[dict]) -> None:
+        self._records.extend({"date": date, "jcd": jcd, **race} for race in races)
+
+    def flush(self) -> None:
+        self.store.append_records(self._records)
+        self._records = []
+
+    def close(self) -> None:
+        self.flush()
+
+
+# =============================================
+# メイン
+# =============================================
+def date_range(start: str, end: str) -> list[str]:
+    d = datetime.strptime(start, "%Y%m%d")
+    last = datetime.strptime(end, "%Y%m%d")
+    dates = []
+    while d <= last:
+        dates.append(d.strftime("%Y%m%d"))
+        d += timedelta(days=1)
+    return dates
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="boatrace.jp の過去結果を一括取得する")
+    parser.add_argument("--start", required=True, help="開始日 YYYYMMDD")
+    parser.add_argument("--end", required=True, help="終了日 YYYYMMDD（この日を含む）")
+    parser.add_argument("--venues", help="会場コードをカンマ区切りで（省略時は全24会場）")
+    parser.add_argument("--workers", type=int, default=4, help="同時リクエスト数")
+    parser.add_argument("--interval", type=float, default=1.0, help="同一ホストへのリクエスト間隔（秒）")
+    parser.add_argument("--out", default="history.csv", help="CSV の出力先")
+    parser.add_argument("--dynamodb", action="store_true", help="CSV の代わりに DynamoDB に書き込む")
+    parser.add_argument("--store", help="CSV の代わりに列指向ストア（ディレクトリ）に追記する")
+    parser.add_argument("--table", default=os.environ.get("DYNAMODB_TABLE", "BoatRacePredictions"))
+    parser.add_argument("--checkpoint", help="チェックポイントファイル（省略時は出力先 + .checkpoint.json）")
+    parser.add_argument("--checkpoint-every", type=int, default=24, help="何件完了ごとにチェックポイントを保存するか")
+    args = parser.parse_args()
+
+    # scraper.py の import 時に参照される環境変数。DynamoDB に書く場合は本物の boto3 を使う
+    if args.dynamodb:
+        os.environ.setdefault("DISCORD_WEBHOOK_URL", "")
+        sys.path.insert(0, LAMBDA_DIR)
+        import boto3
+
+        sink = DynamoDBSink(boto3.resource("dynamodb").Table(args.table))
+        checkpoint_path = args.checkpoint or f"backfill-{args.table}.checkpoint.json"
+    else:
+        from offline import install_stubs
+
+        install_stubs()
+        if args.store:
+            sink = StoreSink(args.store)
+            checkpoint_path = args.checkpoint or os.path.join(args.store, "backfill.checkpoint.json")
+        else:
+            sink = CsvSink(args.out)
+            checkpoint_path = args.checkpoint or f"{args.out}.checkpoint.json"
+
+    import scraper
+    from http_pool import HttpPool
+
+    venues = args.venues.split(",") if args.venues else sorted(scraper.VENUE_CODE_MAP.values())
+    checkpoint = Checkpoint(checkpoint_path)
+    done = checkpoint.done | sink.existing
+
+    # 今日以降は途中までの結果を完了扱いにしてしまうので対象にしない
+    today = datetime.now(scraper.JST).strftime("%Y%m%d")
+    dates = [date for date in date_range(args.start, args.end) if date < today]
+    if len(dates) < len(date_range(args.start, args.end)):
+        print(f"Skipping {today} and later (results are not final yet)")
+
+    targets = {}
+    for date in dates:
+        for jcd in venues:
+            if Checkpoint.key(date, jcd) not in done:
+                targets[f"{scraper.BOATRACE_BASE}/resultlist?jcd={jcd}&hd={date}"] = (date, jcd)
+    skipped = len(dates) * len(venues) - len(targets)
+    print(f"{len(targets)} venue-days to fetch ({skipped} already done)  checkpoint: {checkpoint_path}")
+
+    pool = HttpPool(scraper.fetch_page, max_workers=args.workers, min_interval=args.interval)
+    started = time.perf_counter()
+    completed = races_total = errors = empty = 0
+    try:
+        for url, html, error in pool.map(targets):
+            date, jcd = targets[url]
+            if error:
+                errors += 1
+                print(f"  ✗ {date} jcd={jcd}: {error}")
+                continue
+            races = scraper.parse_result_list(html)
+            completed += 1
+            if not races:
+                empty += 1
+                continue
+            sink.write(date, jcd, races)
+            checkpoint.add(date, jcd)
+            races_total += len(races)
+            if completed % args.checkpoint_every == 0:
+                sink.flush()
+                checkpoint.save()
+                rate = completed / (time.perf_counter() - started)
+                print(f"  {completed}/{len(targets)} venue-days  {races_total} races  ({rate:.1f} venue-days/s)")
+    finally:
+        sink.flush()
+        checkpoint.save()
+        sink.close()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"✅ {completed} venue-days, {races_total} races in {elapsed:.1f}s"
+        f"（失敗 {errors} 件・結果なし {empty} 件は次回再試行）"
+    )
+
+
+if __name__ == "__main__":
+    main()
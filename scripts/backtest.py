@@ -0,0 +1,257 @@
+"""
+ベクトル化バックテスト — 買い目戦略を過去の結果に当てて収支を評価する
+
+history_store.py の列指向ストアに対し、戦略が作った買い目（疎な配列: レース行・組み合わせ・金額）を
+まとめて照合する。的中・払戻は post_race_handler と同じ (amount // 100) * payout を全買い目に一括で適用し、
+収支・回収率・的中率・最大ドローダウンを表示する。
+
+戦略は「ストアと対象行のマスクを受け取って Bets を返す関数」。組み込み:
+  fixed        指定した組み合わせを毎レース同額で買う（--combos 1-2-3,1-3-2）
+  favorites    odds3t 列のオッズが低い順に --top 点を買う（--weighting equal / inverse）
+  predictions  保存済みの AI 予想（DynamoDB か、アイテムの JSON Lines）をそのまま再生する
+  module:func  任意の関数（例: mystrategies:inside_only）
+
+使い方:
+  python scripts/backtest.py --store history --strategy fixed --combos 1-2-3,1-3-2,1-2-4
+  python scripts/backtest.py --store history --strategy favorites --top 5 --weighting inverse --from 20240101
+  python scripts/backtest.py --store history --strategy predictions --racer-no 3941
+  python scripts/backtest.py --store history --strategy predictions --predictions-file predictions.jsonl
+  python scripts/backtest.py --synthetic 500000 --strategy favorites   # 合成データで速度確認
+"""
+
+import argparse
+import base64
+import importlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from history_store import HistoryStore, synthetic_rows, trifecta_index
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda"))
+
+import item_codec  # noqa: E402
+
+RACE_BUDGET = 5000  # scraper.RACE_BUDGET と同じ（1レースあたりの予算）
+
+
+class Bets:
+    """買い目の疎な表現。i 番目の買い目はストアの race[i] 行に combo[i] を amount[i] 円"""
+
+    def __init__(self, race, combo, amount):
+        self.race = np.asarray(race, dtype=np.int64)
+        self.combo = np.asarray(combo, dtype=np.int16)
+        self.amount = np.asarray(amount, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.race)
+
+
+# =============================================
+# 照合と集計
+# =============================================
+def settle(store: HistoryStore, bets: Bets) -> dict:
+    """全買い目を一括で照合し、レース単位の投資・払戻と集計値を返す"""
+    trifecta = np.asarray(store["trifecta"])
+    payout = np.asarray(store["payout"], dtype=np.int64)
+
+    hit = bets.combo == trifecta[bets.race]
+    returns = np.where(hit, (bets.amount // 100) * payout[bets.race], 0)
+
+    # レース単位に集約（買い目のあるレースだけ）
+    races, inverse = np.unique(bets.race, return_inverse=True)
+    race_bet = np.bincount(inverse, weights=bets.amount).astype(np.int64)
+    race_return = np.bincount(inverse, weights=returns).astype(np.int64)
+    race_hit = np.bincount(inverse, weights=hit) > 0
+
+    # 時系列順（date, jcd, race_no）に並べて累積収支とドローダウンを出す
+    order = np.lexsort((store["race_no"][races], store["jcd"][races], store["date"][races]))
+    pnl = np.cumsum((race_return - race_bet)[order])
+    peak = np.maximum.accumulate(np.concatenate(([0], pnl)))[1:]
+    drawdown = peak - pnl
+
+    total_bet = int(race_bet.sum())
+    total_return = int(race_return.sum())
+    return {
+        "races": len(races),
+        "bets": len(bets),
+        "total_bet": total_bet,
+        "total_return": total_return,
+        "pnl": total_return - total_bet,
+        "roi": total_return / total_bet * 100 if total_bet else 0.0,
+        "hit_races": int(race_hit.sum()),
+        "hit_rate": race_hit.mean() * 100 if len(races) else 0.0,
+        "bet_hit_rate": hit.mean() * 100 if len(bets) else 0.0,
+        "max_drawdown": int(drawdown.max()) if len(drawdown) else 0,
+        "pnl_curve": pnl,
+        "race_rows": races[order],
+        "race_pnl": (race_return - race_bet)[order],
+    }
+
+
+def monthly_breakdown(store: HistoryStore, result: dict) -> list[tuple[int, int, int]]:
+    """(YYYYMM, レース数, 収支) の一覧"""
+    months = store["date"][result["race_rows"]] // 100
+    keys, inverse = np.unique(months, return_inverse=True)
+    counts = np.bincount(inverse)
+    pnl = np.bincount(inverse, weights=result["race_pnl"]).astype(np.int64)
+    return list(zip(keys.tolist(), counts.tolist(), pnl.tolist()))
+
+
+# =============================================
+# 組み込み戦略
+# =============================================
+def strategy_fixed(store: HistoryStore, mask: np.ndarray, args) -> Bets:
+    """毎レース同じ組み合わせを予算の等分で買う"""
+    combos = [trifecta_index(c) for c in args.combos.split(",")]
+    if min(combos) < 0:
+        raise ValueError(f"Invalid combination in {args.combos}")
+    rows = np.flatnonzero(mask)
+    amount = (args.budget // len(combos)) // 100 * 100
+    return Bets(np.repeat(rows, len(combos)), np.tile(combos, len(rows)), np.full(len(rows) * len(combos), amount))
+
+
+def strategy_favorites(store: HistoryStore, mask: np.ndarray, args) -> Bets:
+    """オッズの低い順に top 点を買う（equal: 等分 / inverse: オッズの逆数に比例）"""
+    if "odds3t" not in store.columns:
+        raise ValueError("favorites 戦略には odds3t 列が必要です")
+    rows = np.flatnonzero(mask)
+    odds = np.asarray(store["odds3t"][rows])
+    valid = ~np.isnan(odds).all(axis=1)
+    rows, odds = rows[valid], np.nan_to_num(odds[valid], nan=np.inf)
+
+    top = np.argpartition(odds, args.top - 1, axis=1)[:, : args.top]
+    if args.weighting == "inverse":
+        weight = 1.0 / np.take_along_axis(odds, top, axis=1)
+        weight /= weight.sum(axis=1, keepdims=True)
+    else:
+        weight = np.full(top.shape, 1.0 / args.top)
+    amount = (args.budget * weight // 100 * 100).astype(np.int64)
+    keep = amount.ravel() > 0
+    return Bets(np.repeat(rows, args.top)[keep], top.ravel()[keep], amount.ravel()[keep])
+
+
+def load_prediction_items(args) -> list[dict]:
+    """保存済みの予想アイテムを読む（--predictions-file の JSON Lines か DynamoDB）"""
+    if args.predictions_file:
+        with open(args.predictions_file, encoding="utf-8") as f:
+            items = [json.loads(line) for line in f if line.strip()]
+        # JSON では Binary を持てないので、v2 の bets は base64 文字列で書き出しておく
+        for item in items:
+            if isinstance(item.get("bets"), str):
+                item["bets"] = base64.b64decode(item["bets"])
+        return items
+
+    import boto3
+
+    table = boto3.resource("dynamodb").Table(args.table)
+    items = []
+    kwargs = {"KeyConditionExpression": "racer_no = :pk", "ExpressionAttributeValues": {":pk": args.racer_no}}
+    while True:
+        response = table.query(**kwargs)
+        items.extend(item for item in response.get("Items", []) if "#prediction#" in item["date_type"])
+        if "LastEvaluatedKey" not in response:
+            break
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    return items
+
+
+def strategy_predictions(store: HistoryStore, mask: np.ndarray, args) -> Bets:
+    """保存済みの AI 予想の買い目をそのまま再生する（ストアにないレースは数えて捨てる）"""
+    keys = store.keys()
+    order = np.argsort(keys)
+    race, combo, amount = [], [], []
+    missing = 0
+    for item in load_prediction_items(args):
+        prediction = item_codec.decode_prediction(item)
+        key = int(item["date"]) * 10000 + int(item["venue_code"]) * 100 + int(item["race_no"])
+        pos = np.searchsorted(keys, key, sorter=order)
+        if pos >= len(keys) or keys[order[pos]] != key or not mask[order[pos]]:
+            missing += 1
+            continue
+        for bet in prediction.get("bets", []):
+            race.append(order[pos])
+            combo.append(trifecta_index(bet["combination"]))
+            amount.append(int(bet["amount"]))
+    if missing:
+        print(f"(ストアに結果がない予想 {missing} 件はスキップ)")
+    return Bets(race, combo, amount)
+
+
+STRATEGIES = {
+    "fixed": strategy_fixed,
+    "favorites": strategy_favorites,
+    "predictions": strategy_predictions,
+}
+
+
+def resolve_strategy(name: str):
+    if name in STRATEGIES:
+        return STRATEGIES[name]
+    module_name, _, func_name = name.partition(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+# =============================================
+# CLI
+# =============================================
+def print_report(store: HistoryStore, result: dict, elapsed: dict, months: bool) -> None:
+    sign = "+" if result["pnl"] >= 0 else ""
+    print(f"races: {result['races']:,}  bets: {result['bets']:,}")
+    print(f"投資: {result['total_bet']:,}円  払戻: {result['total_return']:,}円  収支: {sign}{result['pnl']:,}円")
+    print(f"回収率: {result['roi']:.1f}%  的中率: {result['hit_rate']:.1f}%（レース） / {result['bet_hit_rate']:.2f}%（買い目）")
+    print(f"最大ドローダウン: {result['max_drawdown']:,}円")
+    if months:
+        print(f"\n{'month':<8} {'races':>7} {'pnl':>12}")
+        for month, count, pnl in monthly_breakdown(store, result):
+            print(f"{month:<8} {count:>7} {pnl:>+12,}")
+    print("\n" + "  ".join(f"{k}: {v * 1000:.1f}ms" for k, v in elapsed.items()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="買い目戦略のバックテスト")
+    parser.add_argument("--store", help="history_store.py のストア")
+    parser.add_argument("--synthetic", type=int, help="ストアの代わりに合成データ（レース数）を使う")
+    parser.add_argument("--strategy", default="fixed", help="fixed / favorites / predictions / module:func")
+    parser.add_argument("--from", dest="date_from", type=int, help="開始日 YYYYMMDD")
+    parser.add_argument("--to", dest="date_to", type=int, help="終了日 YYYYMMDD")
+    parser.add_argument("--venues", help="会場コードをカンマ区切りで")
+    parser.add_argument("--budget", type=int, default=RACE_BUDGET, help="1レースあたりの予算（円）")
+    parser.add_argument("--combos", default="1-2-3,1-3-2,1-2-4,1-4-2", help="fixed 戦略の組み合わせ")
+    parser.add_argument("--top", type=int, default=5, help="favorites 戦略の点数")
+    parser.add_argument("--weighting", choices=["equal", "inverse"], default="equal")
+    parser.add_argument("--racer-no", default=os.environ.get("RACER_NO", "3941"))
+    parser.add_argument("--table", default=os.environ.get("DYNAMODB_TABLE", "BoatRacePredictions"))
+    parser.add_argument("--predictions-file", help="予想アイテムの JSON Lines（DynamoDB の代わり）")
+    parser.add_argument("--months", action="store_true", help="月別の収支も表示する")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.synthetic:
+            store = HistoryStore.create(tmp, extra_columns={"odds3t": ("float32", 120)})
+            store.append(synthetic_rows(args.synthetic, odds=True))
+        elif args.store:
+            store = HistoryStore(args.store)
+        else:
+            parser.error("--store か --synthetic を指定してください")
+
+        elapsed = {}
+        started = time.perf_counter()
+        venues = [int(v) for v in args.venues.split(",")] if args.venues else None
+        mask = store.select(date_from=args.date_from, date_to=args.date_to, jcd=venues)
+        bets = resolve_strategy(args.strategy)(store, mask, args)
+        elapsed["strategy"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        result = settle(store, bets)
+        elapsed["settle"] = time.perf_counter() - started
+
+        print_report(store, result, elapsed, args.months)
+
+
+if __name__ == "__main__":
+    main()
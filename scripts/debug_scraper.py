@@ -7,71 +7,11 @@
 """
 
 import sys
-import os
-import types
 
+from offline import install_stubs
 
-# nacl をダミーモジュールとしてスタブし、ImportError を回避する
-def _install_stub(name):
-    """ドット区切りの各レベルにダミーモジュールを挿入"""
-    parts = name.split(".")
-    for i in range(len(parts)):
-        mod_name = ".".join(parts[: i + 1])
-        if mod_name not in sys.modules:
-            sys.modules[mod_name] = types.ModuleType(mod_name)
-
-
-for stub in [
-    "nacl",
-    "nacl.signing",
-    "nacl.exceptions",
-]:
-    _install_stub(stub)
-
-# ダミー属性
-mod = sys.modules["nacl.signing"]
-mod2 = sys.modules["nacl.exceptions"]
-
-
-class _DummyClass:
-    def __init__(self, *args, **kwargs):
-        pass
-
-
-setattr(mod, "VerifyKey", _DummyClass)
-setattr(mod2, "BadSignatureError", Exception)
-
-
-# boto3 をダミーモジュールとしてスタブ
-_install_stub("boto3")
-boto3_mod = sys.modules["boto3"]
-
-
-class _DummyResource:
-    def __init__(self, *args, **kwargs):
-        pass
-
-    def Table(self, name):
-        return _DummyClass()
-
-
-class _DummyClient:
-    def __init__(self, *args, **kwargs):
-        pass
-
-    def invoke_model(self, **kwargs):
-        return _DummyClass()
-
-
-boto3_mod.resource = lambda *a, **kw: _DummyResource()
-boto3_mod.client = lambda *a, **kw: _DummyClient()
-
-
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambda"))
-
-# 環境変数のダミー（モジュール読み込み時に参照される）
-os.environ.setdefault("DISCORD_WEBHOOK_URL", "https://discord.com/api/webhooks/dummy/dummy")
-os.environ.setdefault("DYNAMODB_TABLE", "dummy")
+# boto3 / nacl をスタブに差し替えて lambda/ を import パスに追加
+install_stubs()
 
 from scraper import (
     fetch_racer_page,
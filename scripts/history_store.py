@@ -0,0 +1,287 @@
+"""
+ローカルの列指向レース履歴ストア — バックテスト用に数年分の結果・オッズを高速に走査する
+
+1列 = 1ファイル（生のバイナリ）で、読み出しは np.memmap で行う。追記は各列ファイルの末尾に
+書き足してから meta.json の行数を更新するので、途中で落ちても meta.json の行数までは常に整合している。
+
+  store/
+    meta.json         {"version": 1, "count": N, "columns": {"date": ["int32", 1], ...}}
+    date.bin          int32   YYYYMMDD
+    jcd.bin           int8    会場コード
+    race_no.bin       int8    レース番号
+    trifecta.bin      int16   3連単の組み合わせインデックス（item_codec.COMBINATIONS、不明は -1）
+    payout.bin        int32   3連単払戻金（100円あたり）
+    odds3t.bin        float32 × 120  3連単オッズ（任意列、未取得は NaN）
+
+行のキーは (date, jcd, race_no)。追記時に既存のキーと重なる行は捨てる。
+任意列（オッズや艇ごとの特徴量など）は create() の extra_columns で幅付きで定義する。
+
+使い方（ライブラリ）:
+  store = HistoryStore.create("history", extra_columns={"odds3t": ("float32", 120)})
+  store.append({"date": [...], "jcd": [...], "race_no": [...], "trifecta": [...], "payout": [...]})
+  store = HistoryStore("history")
+  mask = store.select(date_from=20240101, jcd=12)
+  store["payout"][mask].mean()
+
+使い方（CLI）:
+  python scripts/history_store.py import history.csv --store history   # backfill.py の CSV を取り込む
+  python scripts/history_store.py info --store history
+  python scripts/history_store.py bench --rows 1000000                  # 合成データで走査速度を確認
+  python scripts/history_store.py bench --rows 200000 --odds           # オッズ列込み
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda"))
+
+from item_codec import COMBINATION_INDEX, COMBINATIONS  # noqa: E402
+
+STORE_VERSION = 1
+
+# 列名 → (dtype, 幅)
+BASE_COLUMNS = {
+    "date": ("int32", 1),
+    "jcd": ("int8", 1),
+    "race_no": ("int8", 1),
+    "trifecta": ("int16", 1),
+    "payout": ("int32", 1),
+}
+
+# 任意列の欠損値
+_FILL = {"f": np.nan, "i": -1, "u": 0, "b": False}
+
+
+def trifecta_index(combo: str) -> int:
+    """"1-2-3" → 組み合わせインデックス（解釈できなければ -1）"""
+    return COMBINATION_INDEX.get(combo, -1)
+
+
+def trifecta_label(index: int) -> str:
+    return COMBINATIONS[index] if 0 <= index < len(COMBINATIONS) else "-"
+
+
+class HistoryStore:
+    """列ごとのバイナリファイル + meta.json からなる追記専用ストア"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported store version: {meta.get('version')}")
+        self.columns: dict[str, tuple[str, int]] = {name: (dtype, width) for name, (dtype, width) in meta["columns"].items()}
+        self.count: int = meta["count"]
+        self._maps: dict[str, np.ndarray] = {}
+
+    @classmethod
+    def create(cls, path: str, extra_columns: dict[str, tuple[str, int]] | None = None) -> "HistoryStore":
+        """空のストアを作る（既にあればそのまま開く）"""
+        if os.path.exists(os.path.join(path, "meta.json")):
+            return cls(path)
+        os.makedirs(path, exist_ok=True)
+        columns = {**BASE_COLUMNS, **(extra_columns or {})}
+        for name in columns:
+            open(os.path.join(path, f"{name}.bin"), "wb").close()
+        cls._write_meta(path, columns, 0)
+        return cls(path)
+
+    @staticmethod
+    def _write_meta(path: str, columns: dict, count: int) -> None:
+        tmp = os.path.join(path, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": STORE_VERSION, "count": count, "columns": columns}, f, indent=1)
+        os.replace(tmp, os.path.join(path, "meta.json"))
+
+    def __len__(self) -> int:
+        return self.count
+
+    # --- 読み出し ---
+    def __getitem__(self, name: str) -> np.ndarray:
+        """列を memmap で返す（幅 1 の列は1次元、それ以外は (行数, 幅)）"""
+        if name not in self._maps:
+            dtype, width = self.columns[name]
+            shape = (self.count,) if width == 1 else (self.count, width)
+            if self.count == 0:
+                self._maps[name] = np.empty(shape, dtype=dtype)
+            else:
+                self._maps[name] = np.memmap(os.path.join(self.path, f"{name}.bin"), dtype=dtype, mode="r", shape=shape)
+        return self._maps[name]
+
+    def keys(self) -> np.ndarray:
+        """行のキー date * 10000 + jcd * 100 + race_no（int64）"""
+        return self["date"].astype(np.int64) * 10000 + self["jcd"].astype(np.int64) * 100 + self["race_no"]
+
+    def select(
+        self,
+        date_from: int | None = None,
+        date_to: int | None = None,
+        jcd: int | list[int] | None = None,
+        race_no: int | list[int] | None = None,
+    ) -> np.ndarray:
+        """条件に合う行の真偽値マスクを返す（date_to はその日を含む）"""
+        mask = np.ones(self.count, dtype=bool)
+        if date_from is not None:
+            mask &= self["date"] >= date_from
+        if date_to is not None:
+            mask &= self["date"] <= date_to
+        if jcd is not None:
+            mask &= np.isin(self["jcd"], np.atleast_1d(jcd))
+        if race_no is not None:
+            mask &= np.isin(self["race_no"], np.atleast_1d(race_no))
+        return mask
+
+    # --- 追記 ---
+    def append(self, rows: dict) -> int:
+        """列ごとの配列を追記し、追記した行数を返す（既存キー・同一バッチ内の重複は捨てる）。
+
+        基本列（date / jcd / race_no / trifecta / payout）は必須、任意列は省略すると欠損値で埋める。
+        """
+        n = len(rows["date"])
+        if n == 0:
+            return 0
+        data = {}
+        for name, (dtype, width) in self.columns.items():
+            if name in rows:
+                arr = np.asarray(rows[name], dtype=dtype)
+            elif name in BASE_COLUMNS:
+                raise KeyError(f"Missing column: {name}")
+            else:
+                shape = (n,) if width == 1 else (n, width)
+                arr = np.full(shape, _FILL[np.dtype(dtype).kind], dtype=dtype)
+            data[name] = arr.reshape((n,) if width == 1 else (n, width))
+
+        new_keys = data["date"].astype(np.int64) * 10000 + data["jcd"].astype(np.int64) * 100 + data["race_no"]
+        _, first = np.unique(new_keys, return_index=True)
+        keep = np.zeros(n, dtype=bool)
+        keep[first] = True
+        if self.count:
+            keep &= ~np.isin(new_keys, self.keys())
+        added = int(keep.sum())
+        if not added:
+            return 0
+
+        for name, arr in data.items():
+            dtype, width = self.columns[name]
+            path = os.path.join(self.path, f"{name}.bin")
+            with open(path, "r+b") as f:
+                # meta.json の行数より後ろ（前回の中断で残った書きかけ）は切り捨ててから書く
+                f.truncate(self.count * width * np.dtype(dtype).itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(np.ascontiguousarray(arr[keep]).tobytes())
+        self.count += added
+        self._write_meta(self.path, self.columns, self.count)
+        self._maps.clear()
+        return added
+
+    def append_records(self, records: list[dict]) -> int:
+        """{date, jcd, race_no, trifecta("1-2-3"), payout, ...} の dict 列を追記する"""
+        if not records:
+            return 0
+        rows = {
+            "date": [int(r["date"]) for r in records],
+            "jcd": [int(r["jcd"]) for r in records],
+            "race_no": [int(r["race_no"]) for r in records],
+            "trifecta": [trifecta_index(r["trifecta"]) for r in records],
+            "payout": [int(r["payout"]) for r in records],
+        }
+        for name in self.columns:
+            if name not in rows and all(name in r for r in records):
+                rows[name] = [r[name] for r in records]
+        return self.append(rows)
+
+
+# =============================================
+# CLI
+# =============================================
+def synthetic_rows(n: int, odds: bool = False, seed: int = 0) -> dict:
+    """ベンチマーク用の合成データ（n レース分）"""
+    rng = np.random.default_rng(seed)
+    days = n // (12 * 12) + 1
+    race = np.arange(n)
+    dates = np.array([int(d.strftime("%Y%m%d")) for d in (np.datetime64("2015-01-01") + np.arange(days)).astype(object)])
+    rows = {
+        "date": dates[race // (12 * 12)],
+        "jcd": (race // 12) % 12 + 1,
+        "race_no": race % 12 + 1,
+        "trifecta": rng.integers(0, 120, n),
+        "payout": (rng.lognormal(8.0, 1.0, n) // 10 * 10).astype(np.int32) + 100,
+    }
+    if odds:
+        rows["odds3t"] = rng.lognormal(4.0, 1.0, (n, 120)).astype(np.float32)
+    return rows
+
+
+def cmd_import(args) -> None:
+    store = HistoryStore.create(args.store, extra_columns={"odds3t": ("float32", 120)} if args.odds else None)
+    with open(args.csv, encoding="utf-8", newline="") as f:
+        records = list(csv.DictReader(f))
+    added = store.append_records(records)
+    print(f"{len(records)} rows read, {added} appended → {len(store)} races in {args.store}")
+
+
+def cmd_info(args) -> None:
+    store = HistoryStore(args.store)
+    print(f"races: {len(store)}")
+    for name, (dtype, width) in store.columns.items():
+        print(f"  {name:<10} {dtype:<8} × {width}")
+    if len(store):
+        dates = store["date"]
+        print(f"dates: {dates.min()} – {dates.max()}  venues: {len(np.unique(store['jcd']))}")
+
+
+def cmd_bench(args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        store = HistoryStore.create(tmp, extra_columns={"odds3t": ("float32", 120)} if args.odds else None)
+        started = time.perf_counter()
+        store.append(synthetic_rows(args.rows, odds=args.odds))
+        print(f"append {len(store):,} races: {time.perf_counter() - started:.2f}s")
+
+        store = HistoryStore(tmp)
+        started = time.perf_counter()
+        mask = store.select(date_from=20160101, jcd=[1, 12, 24])
+        payout = store["payout"][mask]
+        hit_rate = (store["trifecta"][mask] == trifecta_index("1-2-3")).mean()
+        print(
+            f"scan (filter + payout mean + hit rate) over {len(store):,} races: "
+            f"{(time.perf_counter() - started) * 1000:.1f}ms  → {mask.sum():,} rows, "
+            f"mean payout {payout.mean():.0f}, 1-2-3 rate {hit_rate * 100:.2f}%"
+        )
+
+        if not args.odds:
+            return
+        started = time.perf_counter()
+        odds = store["odds3t"]
+        implied = (1.0 / odds[np.arange(len(store)), store["trifecta"]]).mean()
+        print(f"odds gather (actual trifecta odds) over {len(store):,} races: {(time.perf_counter() - started) * 1000:.1f}ms  (mean 1/odds {implied:.4f})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="列指向のレース履歴ストア")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imp = sub.add_parser("import", help="backfill.py の CSV を取り込む")
+    imp.add_argument("csv")
+    imp.add_argument("--store", required=True)
+    imp.add_argument("--odds", action="store_true", help="新規作成時に odds3t 列を持たせる")
+
+    info = sub.add_parser("info", help="ストアの概要を表示する")
+    info.add_argument("--store", required=True)
+
+    bench = sub.add_parser("bench", help="合成データで追記・走査の速度を測る")
+    bench.add_argument("--rows", type=int, default=1_000_000)
+    bench.add_argument("--odds", action="store_true", help="odds3t 列（1レース 480 バイト）も含める")
+
+    args = parser.parse_args()
+    {"import": cmd_import, "info": cmd_info, "bench": cmd_bench}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
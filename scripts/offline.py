@@ -0,0 +1,311 @@
+"""オフライン実行用のスタブ — boto3 / botocore / PyNaCl なしで lambda/*.py を import できるようにする
+
+debug_scraper.py やベンチマークなど、AWS に接続せずに Lambda のコードを動かすスクリプトから使う。
+
+  from offline import install_stubs
+  stubs = install_stubs()
+  import scraper
+  stubs.table.items  # put_item された内容を確認できる
+
+DynamoDB テーブル・Bedrock・EventBridge Scheduler はインメモリの簡易実装に置き換わる。
+"""
+
+import copy
+import io
+import json
+import os
+import re
+import sys
+import threading
+import types
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda")
+
+
+# =============================================
+# DynamoDB
+# =============================================
+class FakeTable:
+    """racer_no / date_type をキーとするインメモリの DynamoDB Table"""
+
+    def __init__(self, name: str = "dummy"):
+        self.name = name
+        self.items: dict[tuple[str, str], dict] = {}
+
+    @staticmethod
+    def _key(key: dict) -> tuple[str, str]:
+        return (key["racer_no"], key["date_type"])
+
+    def put_item(self, Item: dict, **kwargs) -> dict:
+        key = self._key(Item)
+        old = self.items.get(key)
+        self.items[key] = copy.deepcopy(Item)
+        if kwargs.get("ReturnValues") == "ALL_OLD" and old is not None:
+            return {"Attributes": copy.deepcopy(old)}
+        return {}
+
+    def get_item(self, Key: dict, **kwargs) -> dict:
+        item = self.items.get(self._key(Key))
+        return {"Item": copy.deepcopy(item)} if item is not None else {}
+
+    def query(self, KeyConditionExpression: str, ExpressionAttributeValues: dict, **kwargs) -> dict:
+        """racer_no = :pk [AND begins_with(date_type, :p) | AND date_type BETWEEN :a AND :b] のみ対応"""
+        values = ExpressionAttributeValues
+        m = re.match(r"racer_no = (:\w+)(?: AND (.+))?$", KeyConditionExpression.strip())
+        pk, sk_cond = values[m.group(1)], m.group(2)
+
+        def sk_match(sk: str) -> bool:
+            if not sk_cond:
+                return True
+            b = re.match(r"begins_with\(date_type, (:\w+)\)", sk_cond)
+            if b:
+                return sk.startswith(values[b.group(1)])
+            b = re.match(r"date_type BETWEEN (:\w+) AND (:\w+)", sk_cond)
+            if b:
+                return values[b.group(1)] <= sk <= values[b.group(2)]
+            b = re.match(r"date_type = (:\w+)", sk_cond)
+            return sk == values[b.group(1)]
+
+        items = [copy.deepcopy(item) for (p, sk), item in sorted(self.items.items()) if p == pk and sk_match(sk)]
+        return {"Items": items, "Count": len(items)}
+
+    def update_item(self, Key: dict, UpdateExpression: str, ExpressionAttributeValues: dict, **kwargs) -> dict:
+        """ADD a :x, ... / SET a = :x, b = if_not_exists(b, :y), c = list_append(c, :z) の組み合わせのみ対応"""
+        values = ExpressionAttributeValues
+        key = self._key(Key)
+        item = self.items.setdefault(key, copy.deepcopy(Key))
+        for action, body in re.findall(r"(ADD|SET)\s+(.+?)(?=\s+(?:ADD|SET)\s+|$)", UpdateExpression.strip()):
+            for clause in _split_top_level(body):
+                if action == "ADD":
+                    name, placeholder = clause.split()
+                    item[name] = item.get(name, 0) + values[placeholder]
+                    continue
+                name, expr = (x.strip() for x in clause.split("=", 1))
+                item[name] = _evaluate(expr, item, values)
+        if kwargs.get("ReturnValues") == "ALL_NEW":
+            return {"Attributes": copy.deepcopy(item)}
+        return {}
+
+
+def _split_top_level(body: str) -> list[str]:
+    """括弧の外側のカンマで区切る"""
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(body):
+        depth += {"(": 1, ")": -1}.get(ch, 0)
+        if ch == "," and depth == 0:
+            parts.append(body[start:i].strip())
+            start = i + 1
+    parts.append(body[start:].strip())
+    return parts
+
+
+def _evaluate(expr: str, item: dict, values: dict):
+    """SET の右辺（:x / 属性名 / if_not_exists / list_append）を評価する"""
+    m = re.fullmatch(r"(if_not_exists|list_append)\((.*)\)", expr.strip())
+    if not m:
+        return values[expr] if expr.startswith(":") else item.get(expr)
+    first, second = _split_top_level(m.group(2))
+    if m.group(1) == "if_not_exists":
+        return item[first] if first in item else _evaluate(second, item, values)
+    return list(_evaluate(first, item, values)) + list(_evaluate(second, item, values))
+
+
+class FakeDynamoDBResource:
+    def __init__(self, table: FakeTable):
+        self._table = table
+
+    def Table(self, name: str) -> FakeTable:
+        self._table.name = name
+        return self._table
+
+
+# =============================================
+# Bedrock
+# =============================================
+class FakeBedrockClient:
+    """invoke_model に対してプロンプト中のレース番号で固定の予想 JSON を返す。
+
+    cache_control 付きの system ブロックは2回目以降キャッシュ読み出しとして usage に計上する
+    （トークン数は文字数で代用）。
+    """
+
+    def __init__(self):
+        self.calls: list[dict] = []
+        self.response_text: str | None = None  # 指定した場合はこのテキストをそのまま返す
+        self._cached: set[str] = set()
+
+    def invoke_model(self, **kwargs) -> dict:
+        self.calls.append(kwargs)
+        body = json.loads(kwargs.get("body", "{}"))
+        text = self.response_text or json.dumps(self._default_prediction(body), ensure_ascii=False)
+        usage = {"input_tokens": 4200, "output_tokens": 310}
+        for block in body.get("system", []) if isinstance(body.get("system"), list) else []:
+            if "cache_control" not in block:
+                continue
+            key = "cache_read_input_tokens" if block["text"] in self._cached else "cache_creation_input_tokens"
+            usage[key] = usage.get(key, 0) + len(block["text"])
+            self._cached.add(block["text"])
+        result = {"content": [{"type": "text", "text": text}], "usage": usage}
+        return {"body": io.BytesIO(json.dumps(result).encode("utf-8"))}
+
+    @staticmethod
+    def _default_prediction(body: dict) -> dict:
+        prompt = json.dumps(body, ensure_ascii=False)
+        m = re.search(r"(\d+)Rの3連単予想", prompt)
+        race_no = int(m.group(1)) if m else 1
+        return {
+            "race_no": race_no,
+            "analysis": "1号艇のイン逃げ本線、3号艇のまくり差しを警戒",
+            "bets": [
+                {"combination": "1-3-2", "amount": 2000, "reasoning": "イン逃げ本線"},
+                {"combination": "1-3-4", "amount": 1500, "reasoning": "3号艇の差し残り"},
+                {"combination": "1-2-3", "amount": 1000, "reasoning": "堅め"},
+                {"combination": "3-1-2", "amount": 500, "reasoning": "まくり差し"},
+            ],
+        }
+
+
+# =============================================
+# EventBridge Scheduler / その他クライアント
+# =============================================
+class _ConflictException(Exception):
+    pass
+
+
+class _ResourceNotFoundException(Exception):
+    pass
+
+
+class FakeSchedulerClient:
+    """スケジュールの作成・更新・削除・一覧を記録する（グループは区別しない）"""
+
+    def __init__(self):
+        self.schedules: dict[str, dict] = {}
+        self.calls: list[str] = []
+        self.exceptions = types.SimpleNamespace(
+            ConflictException=_ConflictException,
+            ResourceNotFoundException=_ResourceNotFoundException,
+        )
+        self._lock = threading.Lock()
+
+    def create_schedule(self, **kwargs) -> dict:
+        with self._lock:
+            self.calls.append("create_schedule")
+            if kwargs["Name"] in self.schedules:
+                raise _ConflictException(kwargs["Name"])
+            self.schedules[kwargs["Name"]] = kwargs
+        return {}
+
+    def update_schedule(self, **kwargs) -> dict:
+        with self._lock:
+            self.calls.append("update_schedule")
+            self.schedules[kwargs["Name"]] = kwargs
+        return {}
+
+    def delete_schedule(self, Name: str, **kwargs) -> dict:
+        with self._lock:
+            self.calls.append("delete_schedule")
+            if self.schedules.pop(Name, None) is None:
+                raise _ResourceNotFoundException(Name)
+        return {}
+
+    def get_schedule(self, Name: str, **kwargs) -> dict:
+        with self._lock:
+            self.calls.append("get_schedule")
+            if Name not in self.schedules:
+                raise _ResourceNotFoundException(Name)
+            return {"State": "ENABLED", **self.schedules[Name]}
+
+    def list_schedules(self, **kwargs) -> dict:
+        with self._lock:
+            self.calls.append("list_schedules")
+            prefix = kwargs.get("NamePrefix", "")
+            return {"Schedules": [{"Name": n, "State": "ENABLED"} for n in self.schedules if n.startswith(prefix)]}
+
+
+class FakeGenericClient:
+    """呼び出しを記録するだけのクライアント（lambda / bedrock-agentcore など）"""
+
+    def __init__(self, service: str):
+        self.service = service
+        self.calls: list[tuple[str, dict]] = []
+
+    def __getattr__(self, name):
+        def _call(**kwargs):
+            self.calls.append((name, kwargs))
+            return {}
+
+        return _call
+
+
+# =============================================
+# インストール
+# =============================================
+class Stubs:
+    """install_stubs() が返すスタブ一式"""
+
+    def __init__(self):
+        self.table = FakeTable()
+        self.bedrock = FakeBedrockClient()
+        self.scheduler = FakeSchedulerClient()
+        self.clients: dict[str, object] = {}
+
+    def client(self, service: str, *args, **kwargs):
+        if service == "bedrock-runtime":
+            return self.bedrock
+        if service == "scheduler":
+            return self.scheduler
+        return self.clients.setdefault(service, FakeGenericClient(service))
+
+    def resource(self, service: str, *args, **kwargs):
+        return FakeDynamoDBResource(self.table)
+
+
+def _install_module(name: str) -> types.ModuleType:
+    """ドット区切りの各レベルにダミーモジュールを挿入して最下層を返す"""
+    parts = name.split(".")
+    for i in range(len(parts)):
+        mod_name = ".".join(parts[: i + 1])
+        if mod_name not in sys.modules:
+            sys.modules[mod_name] = types.ModuleType(mod_name)
+    return sys.modules[name]
+
+
+class _DummyVerifyKey:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def verify(self, *args, **kwargs):
+        return b""
+
+
+_stubs: Stubs | None = None
+
+
+def install_stubs() -> Stubs:
+    """boto3 / nacl をスタブに差し替え、lambda/ を import パスに追加する（2回目以降は同じスタブを返す）"""
+    global _stubs
+    if _stubs is not None:
+        return _stubs
+    _stubs = Stubs()
+
+    _install_module("nacl.signing").VerifyKey = _DummyVerifyKey
+    _install_module("nacl.exceptions").BadSignatureError = Exception
+
+    boto3_mod = _install_module("boto3")
+    boto3_mod.client = _stubs.client
+    boto3_mod.resource = _stubs.resource
+    _install_module("botocore.config").Config = lambda **kwargs: kwargs
+
+    if LAMBDA_DIR not in sys.path:
+        sys.path.insert(0, LAMBDA_DIR)
+
+    # 環境変数のダミー（モジュール読み込み時に参照される）
+    os.environ.setdefault("DISCORD_WEBHOOK_URL", "https://discord.com/api/webhooks/dummy/dummy")
+    os.environ.setdefault("DYNAMODB_TABLE", "dummy")
+    os.environ.setdefault("DISCORD_PUBLIC_KEY", "00" * 32)
+    os.environ.setdefault("DISCORD_APPLICATION_ID", "dummy")
+    os.environ.setdefault("AGENTCORE_RUNTIME_ARN", "arn:aws:bedrock-agentcore:us-east-1:000000000000:runtime/dummy")
+    os.environ.setdefault("AWS_LAMBDA_FUNCTION_NAME", "dummy")
+
+    return _stubs
@@ -0,0 +1,100 @@
+"""
+集計アイテム（agg#...）を既存のレース結果から作り直すスクリプト。
+
+集計アイテムは post_race が結果を保存するたびに加算していくため、
+導入前の結果は含まれない。このスクリプトで選手の全アイテムを1回だけ読み、
+スケジュールから会場・進入コースを引いて集計し直して上書きする。
+
+使い方:
+  python scripts/rebuild_stats.py --racer-no 3941               # 集計結果の表示のみ
+  python scripts/rebuild_stats.py --racer-no 3941 --write       # DynamoDB に書き込む
+"""
+
+import argparse
+import os
+import sys
+from collections import defaultdict
+
+import boto3
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda"))
+
+import item_codec  # noqa: E402
+import stats  # noqa: E402
+
+
+def load_items(table, racer_no: str) -> list[dict]:
+    """選手の全アイテムを Query で読み出す"""
+    items = []
+    kwargs = {"KeyConditionExpression": "racer_no = :pk", "ExpressionAttributeValues": {":pk": racer_no}}
+    while True:
+        response = table.query(**kwargs)
+        items.extend(response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            break
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    return items
+
+
+def rebuild(items: list[dict]) -> dict[str, dict]:
+    """結果アイテムから集計アイテムの中身（SK → 属性）を作る"""
+    schedules = {item["date"]: item for item in items if item["date_type"].endswith("#schedule")}
+    buckets: dict[str, dict] = defaultdict(lambda: defaultdict(int))
+    labels: dict[str, str] = {}
+    last_updated: dict[str, str] = {}
+
+    for item in items:
+        if "#result#" not in item["date_type"]:
+            continue
+        date = item["date"]
+        schedule = schedules.get(date, {})
+        jcd = schedule.get("venue_code", "-")
+        course = next(
+            (r.get("course") for r in schedule.get("races", []) if int(r["race_no"]) == int(item["race_no"])),
+            None,
+        )
+        increments = stats.race_increments(item_codec.decode_results(item))
+        for key in stats.bucket_keys(date, jcd, course):
+            for name, value in increments.items():
+                buckets[key][name] += value
+            last_updated[key] = max(last_updated.get(key, ""), date)
+            if key.startswith(f"{stats.AGG_PREFIX}venue#"):
+                labels[key] = schedule.get("venue_name", "")
+
+    result = {}
+    for key, values in buckets.items():
+        result[key] = {**values, "last_updated": last_updated[key]}
+        if key in labels:
+            result[key]["label"] = labels[key]
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="既存のレース結果から集計アイテムを作り直す")
+    parser.add_argument("--racer-no", default=os.environ.get("RACER_NO", "3941"))
+    parser.add_argument("--table", default=os.environ.get("DYNAMODB_TABLE", "BoatRacePredictions"))
+    parser.add_argument("--write", action="store_true", help="DynamoDB に書き込む（省略時は表示のみ）")
+    args = parser.parse_args()
+
+    table = boto3.resource("dynamodb").Table(args.table)
+    items = load_items(table, args.racer_no)
+    buckets = rebuild(items)
+    print(f"{len(items)} items → {len(buckets)} aggregate items")
+
+    summary = buckets.get(f"{stats.AGG_PREFIX}all")
+    if summary:
+        s = stats.summarize({"date_type": f"{stats.AGG_PREFIX}all", **summary})
+        print(f"全期間: {s['race_count']}R 収支 {s['pnl']:+,}円 回収率 {s['roi']:.1f}%")
+
+    if not args.write:
+        print("--write を付けると DynamoDB に書き込みます。")
+        return
+
+    with table.batch_writer() as batch:
+        for key, values in buckets.items():
+            batch.put_item(Item={"racer_no": args.racer_no, "date_type": key, **values})
+    print("✅ 書き込み完了")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ Discord スラッシュコマンドの登録スクリプト。
 使い方:
   1. .env.local に DISCORD_APPLICATION_ID と DISCORD_BOT_TOKEN を設定
   2. python scripts/register_commands.py を実行
-  3. 登録完了後、Discord サーバーで /ask コマンドが使えるようになる
+  3. 登録完了後、Discord サーバーで /ask・/stats コマンドが使えるようになる
 
 ※ グローバルコマンドの反映には最大1時間かかる場合がある。
   即座にテストしたい場合は DISCORD_GUILD_ID を設定してギルドコマンドとして登録する。
@@ -43,38 +43,68 @@ else:
     url = f"https://discord.com/api/v10/applications/{APP_ID}/commands"
     print("グローバルコマンドとして登録します（反映に最大1時間かかります）")
 
-command = {
-    "name": "ask",
-    "description": "競艇AIアシスタントに質問する",
-    "options": [
-        {
-            "name": "question",
-            "description": "質問内容（例: 明日の桐生の予想は？）",
-            "type": 3,  # STRING
-            "required": True,
-        }
-    ],
-}
+STATS_SCOPE_CHOICES = [
+    {"name": "全期間", "value": "all"},
+    {"name": "日別", "value": "day"},
+    {"name": "月別", "value": "month"},
+    {"name": "会場別", "value": "venue"},
+    {"name": "コース別", "value": "course"},
+]
 
-data = json.dumps(command).encode("utf-8")
-req = urllib.request.Request(
-    url,
-    data=data,
-    headers={
-        "Authorization": f"Bot {BOT_TOKEN}",
-        "Content-Type": "application/json",
-        "User-Agent": "DiscordBot (https://github.com/agentcore-line-chatbot, 1.0)",
+commands = [
+    {
+        "name": "ask",
+        "description": "競艇AIアシスタントに質問する",
+        "options": [
+            {
+                "name": "question",
+                "description": "質問内容（例: 明日の桐生の予想は？）",
+                "type": 3,  # STRING
+                "required": True,
+            }
+        ],
     },
-    method="POST",
-)
+    {
+        "name": "stats",
+        "description": "自動予想の収支統計を表示する",
+        "options": [
+            {
+                "name": "scope",
+                "description": "集計の単位",
+                "type": 3,  # STRING
+                "required": False,
+                "choices": STATS_SCOPE_CHOICES,
+            },
+            {
+                "name": "key",
+                "description": "絞り込み（例: 月別なら 202610、会場別なら 12、日別なら 202610 でその月の日別）",
+                "type": 3,  # STRING
+                "required": False,
+            },
+        ],
+    },
+]
 
-try:
-    with urllib.request.urlopen(req, timeout=30) as resp:
-        result = json.loads(resp.read().decode("utf-8"))
-        print("\n✅ コマンド登録成功!")
-        print(json.dumps(result, indent=2, ensure_ascii=False))
-except urllib.error.HTTPError as e:
-    body = e.read().decode("utf-8")
-    print(f"\n❌ 登録失敗: {e.code}")
-    print(body)
-    sys.exit(1)
+for command in commands:
+    data = json.dumps(command).encode("utf-8")
+    req = urllib.request.Request(
+        url,
+        data=data,
+        headers={
+            "Authorization": f"Bot {BOT_TOKEN}",
+            "Content-Type": "application/json",
+            "User-Agent": "DiscordBot (https://github.com/agentcore-line-chatbot, 1.0)",
+        },
+        method="POST",
+    )
+
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            result = json.loads(resp.read().decode("utf-8"))
+            print(f"\n✅ /{command['name']} コマンド登録成功!")
+            print(json.dumps(result, indent=2, ensure_ascii=False))
+    except urllib.error.HTTPError as e:
+        body = e.read().decode("utf-8")
+        print(f"\n❌ /{command['name']} 登録失敗: {e.code}")
+        print(body)
+        sys.exit(1)
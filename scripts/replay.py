@@ -0,0 +1,274 @@
+"""HTTP の record/replay レイヤー — 実サイトに触れずにハンドラ・エージェントツールを動かす
+
+fetch_page / fetch_race_info / web_search / Discord 送信はすべて urllib.request.urlopen を
+通るので、その1点を差し替えて以下を実現する。
+
+- record: 実際に HTTP を送り、レスポンスをフィクスチャストアに保存する
+- replay: ストアからレスポンスを返す。遅延（固定 + ジッター）とエラー率を注入できる
+- Discord への送信（discord.com）はどちらのモードでも実際には送らず、内容を記録して 204 を返す
+
+使い方（ライブラリ）:
+  from replay import FixtureStore, ReplayTransport
+  store = FixtureStore("fixtures/replay", ignore_params=("hd",))
+  with ReplayTransport(store, latency_ms=300, jitter_ms=200, error_rate=0.02) as transport:
+      scraper.handler(event, None)
+  transport.discord_messages  # 送信されるはずだったメッセージ
+
+使い方（CLI）:
+  python scripts/replay.py record --store fixtures/replay URL [URL ...]   # 実ページを記録
+  python scripts/replay.py list --store fixtures/replay                   # 記録済み一覧
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import time
+import urllib.error
+import urllib.request
+from email.message import Message
+from unittest import mock
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Discord への送信はどのモードでも記録のみ
+SINK_HOSTS = ("discord.com", "discordapp.com")
+
+_real_urlopen = urllib.request.urlopen
+
+
+class FixtureMissing(LookupError):
+    """replay モードでストアに該当レスポンスがない"""
+
+
+# =============================================
+# フィクスチャストア
+# =============================================
+class FixtureStore:
+    """リクエスト → レスポンスをディレクトリに1件1ファイルの JSON で保存する。
+
+    ignore_params に指定したクエリパラメータ（hd など）はキーから除外するので、
+    日付違いのリクエストを同じ記録で再生できる。
+    """
+
+    def __init__(self, directory: str, ignore_params: tuple[str, ...] = ()):
+        self.directory = directory
+        self.ignore_params = ignore_params
+        self._cache: dict[str, dict] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def normalize_url(self, url: str) -> str:
+        parts = urlsplit(url)
+        query = sorted((k, v) for k, v in parse_qsl(parts.query) if k not in self.ignore_params)
+        return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+    def key(self, method: str, url: str, body: bytes | None = None) -> str:
+        normalized = self.normalize_url(url)
+        digest = hashlib.sha1(f"{method} {normalized}".encode("utf-8"))
+        if body:
+            digest.update(body)
+        slug = re.sub(r"[^0-9A-Za-z]+", "_", urlsplit(normalized).path).strip("_")[-40:]
+        return f"{slug}-{digest.hexdigest()[:12]}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def put(self, method: str, url: str, body: bytes | None, status: int, headers: dict, content: bytes) -> str:
+        """レスポンスを保存してキーを返す"""
+        key = self.key(method, url, body)
+        try:
+            encoded = {"text": content.decode("utf-8")}
+        except UnicodeDecodeError:
+            encoded = {"base64": base64.b64encode(content).decode("ascii")}
+        entry = {"method": method, "url": url, "status": status, "headers": headers, **encoded}
+        with open(self._path(key), "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, indent=1)
+        self._cache[key] = entry
+        return key
+
+    def get(self, method: str, url: str, body: bytes | None = None) -> dict | None:
+        key = self.key(method, url, body)
+        if key in self._cache:
+            return self._cache[key]
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+        self._cache[key] = entry
+        return entry
+
+    def entries(self) -> list[dict]:
+        result = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".json"):
+                with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                    result.append(json.load(f))
+        return result
+
+
+# =============================================
+# urlopen の差し替え
+# =============================================
+class ReplayResponse:
+    """urlopen の戻り値相当（read / status / headers / with 文）"""
+
+    def __init__(self, url: str, status: int, headers: dict, content: bytes):
+        self.url = url
+        self.status = status
+        self.code = status
+        self._content = content
+        self.headers = Message()
+        for k, v in headers.items():
+            self.headers[k] = v
+
+    def read(self) -> bytes:
+        return self._content
+
+    def getcode(self) -> int:
+        return self.status
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class ReplayTransport:
+    """urllib.request.urlopen を record / replay 実装に差し替えるコンテキストマネージャ。
+
+    Args:
+        store: フィクスチャストア
+        mode: "replay" または "record"
+        latency_ms / jitter_ms: replay 時に注入する遅延（latency_ms + U(0, jitter_ms)）
+        error_rate: replay 時に URLError / HTTP 503 を注入する確率（Discord 送信にも適用）
+        sleep: False の場合は実際には待たず、注入した遅延を virtual_elapsed_ms に積算する
+        seed: 乱数シード（再現性のため）
+    """
+
+    def __init__(
+        self,
+        store: FixtureStore,
+        mode: str = "replay",
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        sleep: bool = False,
+        seed: int | None = None,
+    ):
+        if mode not in ("replay", "record"):
+            raise ValueError(f"Unknown mode: {mode}")
+        self.store = store
+        self.mode = mode
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.sleep = sleep
+        self._random = random.Random(seed)
+        self._patch = mock.patch("urllib.request.urlopen", self.urlopen)
+
+        # 統計
+        self.requests = 0
+        self.injected_errors = 0
+        self.virtual_elapsed_ms = 0.0
+        self.discord_messages: list[dict] = []
+
+    def __enter__(self):
+        self._patch.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._patch.stop()
+        return False
+
+    def _inject(self, url: str) -> None:
+        """遅延とエラーを注入する"""
+        delay = self.latency_ms + self._random.uniform(0, self.jitter_ms)
+        if delay:
+            if self.sleep:
+                time.sleep(delay / 1000)
+            else:
+                self.virtual_elapsed_ms += delay
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.injected_errors += 1
+            if self._random.random() < 0.5:
+                raise urllib.error.URLError("injected connection error")
+            raise urllib.error.HTTPError(url, 503, "injected Service Unavailable", Message(), None)
+
+    def urlopen(self, req, data=None, timeout=None, **kwargs):
+        if isinstance(req, str):
+            req = urllib.request.Request(req, data=data)
+        url = req.full_url
+        method = req.get_method()
+        body = req.data
+        self.requests += 1
+
+        host = urlsplit(url).hostname or ""
+        if host.endswith(SINK_HOSTS):
+            self._inject(url)
+            payload = json.loads(body.decode("utf-8")) if body else {}
+            self.discord_messages.append({"method": method, "url": url, "payload": payload})
+            return ReplayResponse(url, 204, {}, b"")
+
+        if self.mode == "record":
+            with _real_urlopen(req, timeout=timeout) as resp:
+                content = resp.read()
+                status = getattr(resp, "status", 200)
+                headers = {k: v for k, v in resp.headers.items() if k.lower() in ("content-type", "etag", "last-modified")}
+            self.store.put(method, url, body, status, headers, content)
+            return ReplayResponse(url, status, headers, content)
+
+        self._inject(url)
+        entry = self.store.get(method, url, body)
+        if entry is None:
+            raise FixtureMissing(f"{method} {self.store.normalize_url(url)}")
+        content = entry["text"].encode("utf-8") if "text" in entry else base64.b64decode(entry["base64"])
+        if entry["status"] >= 400:
+            raise urllib.error.HTTPError(url, entry["status"], "recorded error", Message(), None)
+        return ReplayResponse(url, entry["status"], entry.get("headers", {}), content)
+
+
+# =============================================
+# CLI
+# =============================================
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HTTP フィクスチャの記録・一覧")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="実ページを取得してストアに保存する")
+    rec.add_argument("--store", required=True, help="フィクスチャストアのディレクトリ")
+    rec.add_argument("--ignore-param", action="append", default=[], help="キーから除外するクエリパラメータ")
+    rec.add_argument("urls", nargs="+")
+
+    ls = sub.add_parser("list", help="記録済みのレスポンスを一覧表示する")
+    ls.add_argument("--store", required=True)
+
+    args = parser.parse_args()
+
+    if args.command == "record":
+        from offline import install_stubs
+
+        install_stubs()
+        import scraper
+
+        store = FixtureStore(args.store, ignore_params=tuple(args.ignore_param))
+        with ReplayTransport(store, mode="record"):
+            for url in args.urls:
+                html = scraper.fetch_page(url)
+                print(f"recorded {len(html):>8} chars  {url}")
+                time.sleep(1)
+    else:
+        store = FixtureStore(args.store)
+        for entry in store.entries():
+            size = len(entry.get("text", "")) or len(entry.get("base64", ""))
+            print(f"{entry['status']}  {size:>8}  {entry['method']} {entry['url']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""レース日シミュレーター — record/replay レイヤー上で Scraper を何日分も回して負荷・耐障害性を確認する
+
+1日ごとに schedule ハンドラを実行し、EventBridge Scheduler（スタブ）に作られたスケジュールを
+発火時刻順に実行していく（実行中に新しく作られたスケジュールも同じ日のうちに実行する）。
+最後に深夜の一括精算（settle）を実行する。
+HTTP は scripts/replay.py で再生し、AWS は scripts/offline.py のスタブを使う。
+
+注入した遅延と time.sleep は実際には待たず仮想時間として積算するので、
+数千日分でも短時間で回せる。
+
+使い方:
+  python scripts/simulate.py --days 1000
+  python scripts/simulate.py --days 200 --latency-ms 400 --jitter-ms 600 --error-rate 0.05
+  python scripts/simulate.py --store fixtures/replay --ignore-param hd --ignore-param rno
+  python scripts/simulate.py --days 10 --venue 12   # 住之江の全レースも会場モードで回す
+  (--store を省略すると benchmarks/fixtures/ のページから一時ストアを作る)
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import re
+import statistics
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from offline import install_stubs
+
+stubs = install_stubs()
+
+import scraper  # noqa: E402
+from replay import FixtureStore, ReplayTransport  # noqa: E402
+
+JST = timezone(timedelta(hours=9))
+BENCH_FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks", "fixtures")
+
+# benchmarks/fixtures のページ種別 → ファイル名（一時ストアの種に使う）
+SEED_FIXTURES = {
+    "racelist": "boatrace_racelist.html",
+    "beforeinfo": "boatrace_beforeinfo.html",
+    "oddstf": "boatrace_oddstf.html",
+    "odds3t": "boatrace_odds3t.html",
+    "resultlist": "boatrace_resultlist.html",
+    "raceresult": "boatrace_raceresult.html",
+    "raceindex": "boatrace_raceindex.html",
+}
+
+
+def seed_store(store: FixtureStore, jcd: str = "12") -> None:
+    """benchmarks/fixtures のページをストアに登録する（hd / rno は無視する前提）"""
+    for page_type, name in SEED_FIXTURES.items():
+        with open(os.path.join(BENCH_FIXTURE_DIR, name), "rb") as f:
+            store.put("GET", f"{scraper.BOATRACE_BASE}/{page_type}?jcd={jcd}", None, 200, {}, f.read())
+    with open(os.path.join(BENCH_FIXTURE_DIR, "kyoteibiyori_racer.html"), "rb") as f:
+        store.put("GET", f"{scraper.KYOTEIBIYORI_BASE}/{scraper.RACER_NO}", None, 200, {}, f.read())
+
+
+class _FrozenDatetime(datetime):
+    """datetime.now() がシミュレーション上の時刻を返す datetime"""
+
+    frozen: datetime | None = None
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.frozen.astimezone(tz) if tz else cls.frozen
+
+
+def _fire_time(schedule: dict) -> datetime:
+    m = re.match(r"at\((.+)\)", schedule["ScheduleExpression"])
+    return datetime.fromisoformat(m.group(1)).replace(tzinfo=timezone.utc)
+
+
+class _NullWriter:
+    def write(self, s: str) -> int:
+        return len(s)
+
+    def flush(self) -> None:
+        pass
+
+
+def simulate(days: int, transport: ReplayTransport, start: datetime, venue: str | None = None) -> dict:
+    """days 日分を実行して統計を返す（venue を渡すとその会場の全レースも会場モードで回す）"""
+    latencies: dict[str, list[float]] = defaultdict(list)
+    virtual: dict[str, list[float]] = defaultdict(list)
+    errors: Counter = Counter()
+    invocations: Counter = Counter()
+
+    def fake_sleep(seconds: float) -> None:
+        transport.virtual_elapsed_ms += seconds * 1000
+
+    def run(event: dict, now: datetime) -> None:
+        mode = event.get("mode", "schedule")
+        _FrozenDatetime.frozen = now
+        before = transport.virtual_elapsed_ms
+        started = time.perf_counter()
+        try:
+            scraper.handler(event, None)
+        except Exception as e:
+            errors[(mode, type(e).__name__)] += 1
+        latencies[mode].append((time.perf_counter() - started) * 1000)
+        virtual[mode].append(transport.virtual_elapsed_ms - before)
+        invocations[mode] += 1
+
+    with (
+        mock.patch.object(scraper, "datetime", _FrozenDatetime),
+        mock.patch("time.sleep", fake_sleep),
+        contextlib.redirect_stdout(_NullWriter()),
+    ):
+        for day in range(days):
+            morning = (start + timedelta(days=day)).replace(hour=8, minute=0, second=0, microsecond=0)
+            stubs.scheduler.schedules.clear()
+            run({"mode": "schedule"}, morning)
+            if venue:
+                run({"mode": "venue_schedule", "jcd": venue}, morning)
+
+            # 発火時刻順に実行（完了後削除 = ActionAfterCompletion: DELETE）
+            while stubs.scheduler.schedules:
+                name = min(stubs.scheduler.schedules, key=lambda n: _fire_time(stubs.scheduler.schedules[n]))
+                schedule = stubs.scheduler.schedules.pop(name)
+                run(json.loads(schedule["Target"]["Input"]), _fire_time(schedule))
+
+            # 深夜の一括精算（取りこぼしの回収）
+            night = morning.replace(hour=23, minute=30)
+            run({"mode": "settle"}, night)
+            if venue:
+                run({"mode": "settle", "scope": "venue", "jcd": venue}, night)
+
+    return {"latencies": latencies, "virtual": virtual, "errors": errors, "invocations": invocations}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="record/replay 上でレース日をシミュレーションする")
+    parser.add_argument("--days", type=int, default=100)
+    parser.add_argument("--store", help="フィクスチャストア（省略時は benchmarks/fixtures から一時作成）")
+    parser.add_argument("--ignore-param", action="append", default=None, help="キーから除外するクエリパラメータ")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="注入する遅延（固定分）")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="注入する遅延（一様乱数の上限）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="注入するエラー率")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--venue", help="会場コード（指定するとその会場の全レースも会場モードで回す）")
+    parser.add_argument("--verbose", action="store_true", help="ハンドラのログを表示する")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    ignore = tuple(args.ignore_param) if args.ignore_param is not None else ("hd", "rno")
+    with contextlib.ExitStack() as stack:
+        if args.store:
+            store = FixtureStore(args.store, ignore_params=ignore)
+        else:
+            store = FixtureStore(stack.enter_context(tempfile.TemporaryDirectory()), ignore_params=ignore)
+            seed_store(store)
+
+        transport = stack.enter_context(
+            ReplayTransport(
+                store,
+                latency_ms=args.latency_ms,
+                jitter_ms=args.jitter_ms,
+                error_rate=args.error_rate,
+                seed=args.seed,
+            )
+        )
+        start = datetime.now(JST)
+        wall_start = time.perf_counter()
+        stats = simulate(args.days, transport, start, venue=args.venue)
+        wall = time.perf_counter() - wall_start
+
+    total = sum(stats["invocations"].values())
+    print(f"days: {args.days}  invocations: {total}  wall: {wall:.2f}s  ({args.days / wall:.1f} days/s, {total / wall:.1f} invocations/s)")
+    print(f"HTTP requests: {transport.requests}  injected errors: {transport.injected_errors}  Discord messages: {len(transport.discord_messages)}")
+    print(f"\n{'mode':<14} {'count':>7} {'cpu p50':>9} {'cpu p95':>9} {'sim p50':>9} {'sim p95':>9}  (ms)")
+    for mode in sorted(stats["latencies"]):
+        cpu = sorted(stats["latencies"][mode])
+        sim = sorted(stats["virtual"][mode])
+        print(
+            f"{mode:<14} {len(cpu):>7} {statistics.median(cpu):>9.2f} {cpu[int(len(cpu) * 0.95)]:>9.2f} "
+            f"{statistics.median(sim):>9.0f} {sim[int(len(sim) * 0.95)]:>9.0f}"
+        )
+    if stats["errors"]:
+        print("\nハンドラ失敗:")
+        for (mode, name), count in stats["errors"].most_common():
+            print(f"  {mode:<12} {name:<24} {count:>6}")
+
+
+if __name__ == "__main__":
+    main()
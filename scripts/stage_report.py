@@ -0,0 +1,138 @@
+"""Scraper Lambda のステージ別所要時間レポート — EMF ログからボトルネックを表示
+
+Scraper Lambda のログ（CloudWatch Logs のエクスポートや `aws logs tail` の出力）から
+EMF レコードを拾い、モードごとに各ステージ（ページ取得・パース・Bedrock・DynamoDB・Discord）が
+処理時間のどれだけを占めているかを表示する。pre_race はハンドラ全体の p95 が
+締切前の持ち時間（デフォルト10分）に対してどれだけ余裕があるかも表示する。
+
+使い方:
+  python scripts/stage_report.py scraper.log
+  python scripts/stage_report.py --mode pre_race --budget-sec 600 scraper.log
+  aws logs tail /aws/lambda/<ScraperFunction> --since 7d | python scripts/stage_report.py -
+"""
+
+import argparse
+import json
+import sys
+from collections import defaultdict
+
+from trace_report import percentile
+
+_decoder = json.JSONDecoder()
+
+# ステージ名の表示順（HandlerDuration は全体として別扱い）
+STAGE_ORDER = [
+    "FetchDuration",
+    "ParseDuration",
+    "BedrockDuration",
+    "DynamoDBReadDuration",
+    "DynamoDBWriteDuration",
+    "SchedulerDuration",
+    "DiscordDuration",
+]
+
+
+def iter_emf_records(lines):
+    """ログ行から EMF レコードを取り出す"""
+    for line in lines:
+        idx = line.find("{")
+        if idx == -1 or '"_aws"' not in line:
+            continue
+        try:
+            record, _ = _decoder.raw_decode(line, idx)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(record, dict) and "_aws" in record:
+            yield record
+
+
+def metric_names(record: dict) -> list[str]:
+    """EMF レコードに含まれるメトリクス名を返す"""
+    names = []
+    for directive in record["_aws"].get("CloudWatchMetrics", []):
+        names.extend(m["Name"] for m in directive.get("Metrics", []))
+    return names
+
+
+def _stage_key(name: str) -> tuple:
+    return (STAGE_ORDER.index(name) if name in STAGE_ORDER else len(STAGE_ORDER), name)
+
+
+def report_mode(mode: str, records: list[dict], budget_sec: float) -> None:
+    """1モード分のステージ別レポートを表示する"""
+    durations: dict[str, list[float]] = defaultdict(list)
+    by_page: dict[str, list[float]] = defaultdict(list)
+    counters: dict[str, list[float]] = defaultdict(list)
+
+    for record in records:
+        for name in metric_names(record):
+            value = float(record.get(name, 0))
+            if name.endswith("Duration"):
+                durations[name].append(value)
+                if "PageType" in record and name in ("FetchDuration", "ParseDuration"):
+                    by_page[f"{name[:-8]}:{record['PageType']}"].append(value)
+            else:
+                counters[name].append(value)
+
+    handler = sorted(durations.pop("HandlerDuration", []))
+    invocations = max(len(handler), 1)
+    stage_total = sum(sum(v) for v in durations.values())
+
+    print(f"\n=== mode={mode}  invocations={len(handler)} ===")
+    if handler:
+        p50, p95 = percentile(handler, 50), percentile(handler, 95)
+        print(f"HandlerDuration  p50={p50 / 1000:.1f}s  p95={p95 / 1000:.1f}s  max={handler[-1] / 1000:.1f}s")
+        if mode == "pre_race" and budget_sec:
+            print(f"締切前の持ち時間 {budget_sec:.0f}s に対する p95 の使用率: {p95 / 1000 / budget_sec * 100:.1f}%")
+
+    print(f"\n{'stage':<26} {'count':>6} {'avg/inv':>9} {'p50':>9} {'p95':>9} {'share':>7}")
+    for name in sorted(durations, key=_stage_key):
+        values = sorted(durations[name])
+        share = sum(values) / stage_total * 100 if stage_total else 0.0
+        print(
+            f"{name:<26} {len(values):>6} {sum(values) / invocations:>9.1f} "
+            f"{percentile(values, 50):>9.1f} {percentile(values, 95):>9.1f} {share:>6.1f}%"
+        )
+    for key in sorted(by_page):
+        values = sorted(by_page[key])
+        print(f"  {key:<24} {len(values):>6} {'':>9} {percentile(values, 50):>9.1f} {percentile(values, 95):>9.1f}")
+
+    if durations:
+        top = max(durations, key=lambda n: sum(durations[n]))
+        print(f"\n最も時間を使っているステージ: {top}")
+
+    for name in sorted(counters):
+        values = counters[name]
+        print(f"{name}: 合計 {sum(values):,.0f} / 平均 {sum(values) / len(values):,.0f}")
+    print("\n(単位: ms)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="EMF ログから Scraper のステージ別所要時間を集計する")
+    parser.add_argument("files", nargs="+", help="ログファイル（- で標準入力）")
+    parser.add_argument("--mode", help="対象モードを絞り込む（schedule / pre_race / post_race）")
+    parser.add_argument("--budget-sec", type=float, default=600, help="pre_race の締切前の持ち時間（秒）")
+    args = parser.parse_args()
+
+    by_mode: dict[str, list[dict]] = defaultdict(list)
+    for path in args.files:
+        f = sys.stdin if path == "-" else open(path, encoding="utf-8", errors="replace")
+        try:
+            for record in iter_emf_records(f):
+                by_mode[record.get("Mode", "-")].append(record)
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+    if not by_mode:
+        print("EMF レコードが見つかりませんでした。")
+        return
+
+    for mode in sorted(by_mode):
+        if args.mode and mode != args.mode:
+            continue
+        report_mode(mode, by_mode[mode], args.budget_sec)
+
+
+if __name__ == "__main__":
+    main()
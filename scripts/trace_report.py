@@ -0,0 +1,194 @@
+"""/ask のレイテンシトレース集計スクリプト — span ログから区間別のパーセンタイルを表示
+
+webhook Lambda と AgentCore Runtime のログ（CloudWatch Logs のエクスポートや
+`aws logs tail` の出力）から {"type": "span", ...} レコードを拾い、
+区間ごとの件数・p50/p95/p99・最大値を表示する。
+
+使い方:
+  python scripts/trace_report.py webhook.log agent.log           # 区間別サマリー
+  python scripts/trace_report.py --traces 5 webhook.log agent.log  # ask_total が遅い順に5件の内訳も表示
+  aws logs tail /aws/lambda/<WebhookFunction> --since 1d | python scripts/trace_report.py -
+"""
+
+import argparse
+import json
+import sys
+from collections import defaultdict
+
+# 表示順（/ask の処理順）。ここにない span は末尾に名前順で並べる
+SPAN_ORDER = [
+    "signature_verify",
+    "self_invoke",
+    "self_invoke_delay",
+    "agentcore_invoke",
+    "agent_first_token",
+    "bedrock_governor",
+    "model_first_token",
+    "tool.web_search",
+    "tool.fetch_race_info",
+    "model_fallback",
+    "sse_tool",
+    "discord_edit",
+    "discord_followup",
+    "sse_stream",
+    "agent_total",
+    "ask_total",
+]
+
+_decoder = json.JSONDecoder()
+
+
+def iter_span_records(lines):
+    """ログ行から span レコードを取り出す（行頭のタイムスタンプ等のプレフィックスは読み飛ばす）"""
+    for line in lines:
+        idx = line.find("{")
+        while idx != -1:
+            try:
+                record, _ = _decoder.raw_decode(line, idx)
+            except json.JSONDecodeError:
+                idx = line.find("{", idx + 1)
+                continue
+            if isinstance(record, dict) and record.get("type") == "span":
+                yield record
+            break
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """線形補間でパーセンタイルを求める（sorted_values は昇順ソート済み）"""
+    if not sorted_values:
+        return 0.0
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    rank = (len(sorted_values) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    frac = rank - lower
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * frac
+
+
+def _span_sort_key(name: str):
+    if name in SPAN_ORDER:
+        return (0, SPAN_ORDER.index(name), name)
+    return (1, 0, name)
+
+
+def print_summary(durations: dict[str, list[float]]) -> None:
+    """区間別のパーセンタイル表を表示する"""
+    total_p95 = percentile(sorted(durations.get("ask_total", [])), 95)
+
+    header = f"{'span':<22} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}"
+    if total_p95:
+        header += f" {'p95/total':>9}"
+    print(header)
+    print("-" * len(header))
+
+    for name in sorted(durations, key=_span_sort_key):
+        values = sorted(durations[name])
+        p95 = percentile(values, 95)
+        row = (
+            f"{name:<22} {len(values):>6} {percentile(values, 50):>9.1f} {p95:>9.1f} "
+            f"{percentile(values, 99):>9.1f} {values[-1]:>9.1f}"
+        )
+        if total_p95:
+            row += f" {p95 / total_p95 * 100:>8.1f}%"
+        print(row)
+    print("\n(単位: ms)")
+
+
+def print_slowest_traces(by_trace: dict[str, list[dict]], limit: int) -> None:
+    """ask_total が遅い順に trace の内訳を表示する"""
+    totals = []
+    for trace_id, records in by_trace.items():
+        total = next((r["duration_ms"] for r in records if r["span"] == "ask_total"), None)
+        if total is not None:
+            totals.append((total, trace_id))
+    totals.sort(reverse=True)
+
+    for total, trace_id in totals[:limit]:
+        print(f"\n=== trace {trace_id}  ask_total={total:.1f}ms ===")
+        for r in sorted(by_trace[trace_id], key=lambda r: r.get("ts", 0)):
+            extra = {k: v for k, v in r.items() if k not in ("type", "trace_id", "span", "duration_ms", "ts")}
+            suffix = f"  {extra}" if extra else ""
+            print(f"  {r['span']:<22} {r['duration_ms']:>9.1f}ms{suffix}")
+
+
+def print_cache_summary(by_trace: dict[str, list[dict]]) -> None:
+    """agent_total のトークン使用量からプロンプトキャッシュの効き具合と初回トークンまでの時間を表示する"""
+    first_token: dict[bool, list[float]] = defaultdict(list)
+    totals = defaultdict(int)
+    for records in by_trace.values():
+        usage = next((r for r in records if r["span"] == "agent_total" and "input_tokens" in r), None)
+        if usage is None:
+            continue
+        for key in ("input_tokens", "cache_read_tokens", "cache_write_tokens"):
+            totals[key] += usage.get(key, 0)
+        hit = usage.get("cache_read_tokens", 0) > 0
+        first_token[hit] += [r["duration_ms"] for r in records if r["span"] == "agent_first_token"]
+    if not totals:
+        return
+
+    read, write = totals["cache_read_tokens"], totals["cache_write_tokens"]
+    prompt_tokens = totals["input_tokens"] + read + write
+    print(f"\nプロンプトキャッシュ: 読み出し {read:,} / 書き込み {write:,} / 入力合計 {prompt_tokens:,} tokens", end="")
+    print(f"（読み出し率 {read / prompt_tokens * 100:.1f}%）" if prompt_tokens else "")
+    for hit, label in ((True, "キャッシュあり"), (False, "キャッシュなし")):
+        values = sorted(first_token[hit])
+        if values:
+            print(f"  agent_first_token {label}: n={len(values)} p50={percentile(values, 50):.1f}ms p95={percentile(values, 95):.1f}ms")
+
+
+def print_model_summary(by_trace: dict[str, list[dict]]) -> None:
+    """agent_total の model 属性からモデル別の呼び出し数・フォールバック数・所要時間を表示する"""
+    by_model: dict[str, list[float]] = defaultdict(list)
+    fallbacks = defaultdict(int)
+    for records in by_trace.values():
+        for r in records:
+            if r["span"] == "agent_total" and "model" in r:
+                by_model[r["model"]].append(r["duration_ms"])
+                fallbacks[r["model"]] += bool(r.get("fallback"))
+    if not by_model:
+        return
+
+    print("\nモデル別:")
+    for model, values in sorted(by_model.items()):
+        values.sort()
+        print(
+            f"  {model}: n={len(values)} fallback={fallbacks[model]}"
+            f" p50={percentile(values, 50):.1f}ms p95={percentile(values, 95):.1f}ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="span ログから /ask のレイテンシ内訳を集計する")
+    parser.add_argument("files", nargs="+", help="ログファイル（- で標準入力）")
+    parser.add_argument("--traces", type=int, default=0, help="遅い trace の内訳を表示する件数")
+    args = parser.parse_args()
+
+    durations: dict[str, list[float]] = defaultdict(list)
+    by_trace: dict[str, list[dict]] = defaultdict(list)
+
+    for path in args.files:
+        f = sys.stdin if path == "-" else open(path, encoding="utf-8", errors="replace")
+        try:
+            for record in iter_span_records(f):
+                durations[record["span"]].append(float(record["duration_ms"]))
+                if record.get("trace_id"):
+                    by_trace[record["trace_id"]].append(record)
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+    if not durations:
+        print("span レコードが見つかりませんでした。")
+        return
+
+    print(f"traces: {len(by_trace)}\n")
+    print_summary(durations)
+    print_cache_summary(by_trace)
+    print_model_summary(by_trace)
+    if args.traces:
+        print_slowest_traces(by_trace, args.traces)
+
+
+if __name__ == "__main__":
+    main()
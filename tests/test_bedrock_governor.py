@@ -0,0 +1,64 @@
+"""bedrock_governor のスロットリング時の予算の扱い（scripts/offline.py のインメモリテーブルで確認する）"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "lambda"))
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+import bedrock_governor  # noqa: E402
+from offline import FakeTable  # noqa: E402
+
+
+class ThrottlingException(Exception):
+    pass
+
+
+def _budget(table: FakeTable) -> dict:
+    (item,) = [item for (pk, _), item in table.items.items() if pk == bedrock_governor.GOVERNOR_PK]
+    return item
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(bedrock_governor.time, "sleep", lambda seconds: None)
+
+
+def test_throttled_attempt_releases_its_reservation():
+    table = FakeTable()
+    governor = bedrock_governor.BedrockGovernor(table)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ThrottlingException("rate exceeded")
+        return "ok"
+
+    result, permit = governor.call(fn, "model-a", "race", 1000)
+    governor.settle(permit, 800)
+
+    budget = _budget(table)
+    assert result == "ok"
+    assert permit.retries == 1
+    assert budget["requests"] == 2
+    assert budget["throttles"] == 1
+    assert budget["tokens"] == 800
+
+
+def test_failed_call_releases_its_reservation():
+    table = FakeTable()
+    governor = bedrock_governor.BedrockGovernor(table)
+
+    def fn():
+        raise ThrottlingException("rate exceeded")
+
+    with pytest.raises(ThrottlingException):
+        governor.call(fn, "model-a", "race", 1000)
+
+    budget = _budget(table)
+    assert budget["requests"] == bedrock_governor.MAX_ATTEMPTS
+    assert budget["tokens"] == 0